@@ -0,0 +1,84 @@
+"""
+Benchmarks getting the predictions for one child out of a predict table
+that holds every child and every draw, by reading the whole tables and
+filtering in Pandas against reading only that child's rows from SQLite,
+and checks that both give the same predictions.
+
+Usage:
+    python benchmarks/child_predictions.py --children 40 --samples 100
+"""
+import tempfile
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from cascade_at.dismod.api.dismod_extractor import DismodExtractor
+from cascade_at.dismod.integrand_mappings import PRIMARY_INTEGRANDS_TO_RATES
+
+
+def whole_table_predictions(d, location_id, sex_id):
+    predictions = d.predict.merge(d.avgint, on=['avgint_id'])
+    predictions = predictions.merge(d.integrand, on=['integrand_id'])
+    predictions['rate'] = predictions['integrand_name'].map(PRIMARY_INTEGRANDS_TO_RATES)
+    predictions = predictions.loc[predictions.c_location_id == location_id]
+    return predictions.loc[predictions.c_sex_id == sex_id].reset_index(drop=True)
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--children", type=int, default=40)
+    parser.add_argument("--samples", type=int, default=100)
+    args = parser.parse_args()
+
+    ages = np.arange(0.0, 100.0, 5.0)
+    times = np.arange(1990.0, 2020.0, 5.0)
+    integrands = ['Sincidence', 'remission', 'mtexcess', 'prevalence']
+    grid = pd.DataFrame(
+        [(i, a, t) for i in range(len(integrands)) for a in ages for t in times],
+        columns=['integrand_id', 'age_lower', 'time_lower']
+    )
+    avgint = pd.concat([
+        grid.assign(node_id=child, c_location_id=100 + child, c_sex_id=sex)
+        for child in range(args.children) for sex in (1, 2)
+    ], ignore_index=True)
+    avgint = avgint.assign(
+        age_upper=avgint.age_lower, time_upper=avgint.time_lower, weight_id=0, subgroup_id=0
+    )
+    predict = pd.DataFrame({
+        'sample_index': np.repeat(np.arange(args.samples), len(avgint)),
+        'avgint_id': np.tile(np.arange(len(avgint)), args.samples),
+        'avg_integrand': np.random.RandomState(0).uniform(size=args.samples * len(avgint)),
+    })
+
+    with tempfile.TemporaryDirectory() as directory:
+        d = DismodExtractor(path=Path(directory) / 'dismod.db')
+        d.integrand = pd.DataFrame({'integrand_name': integrands, 'minimum_meas_cv': 0.0})
+        d.avgint = avgint
+        d.write_table('predict', predict)
+
+        start = time.perf_counter()
+        whole = whole_table_predictions(d, location_id=100, sex_id=2)
+        whole_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        pushed = d.get_predictions(location_id=100, sex_id=2)
+        pushed_seconds = time.perf_counter() - start
+
+        d.create_indexes()
+        start = time.perf_counter()
+        indexed = d.get_predictions(location_id=100, sex_id=2)
+        indexed_seconds = time.perf_counter() - start
+
+    pd.testing.assert_frame_equal(pushed, whole)
+    pd.testing.assert_frame_equal(indexed, whole)
+    print(f"{len(whole)} predictions for one child out of {len(predict)}")
+    print(f"whole tables:     {whole_seconds:.2f} s")
+    print(f"filtered reads:   {pushed_seconds:.2f} s ({whole_seconds / pushed_seconds:.1f}x)")
+    print(f"with indexes:     {indexed_seconds:.2f} s ({whole_seconds / indexed_seconds:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmarks CovariateData.complete_covariate_locations against the
+merge-based implementation on a synthetic location hierarchy, where the
+covariate is only available for the countries.
+
+Usage:
+    python benchmarks/covariate_locations.py --countries 200 --subnationals 5
+"""
+import itertools
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+import pandas as pd
+
+from cascade_at.inputs.covariate_data import CovariateData
+
+
+def synthetic_inputs(n_regions, n_countries, n_subnationals, n_ages, n_years):
+    locations = [dict(location_id=1, parent_id=1, level=0)]
+    countries = list()
+    next_id = 2
+    for _ in range(n_regions):
+        region = next_id
+        locations.append(dict(location_id=region, parent_id=1, level=1))
+        next_id += 1
+        for _ in range(n_countries):
+            country = next_id
+            locations.append(dict(location_id=country, parent_id=region, level=2))
+            countries.append(country)
+            next_id += 1
+            for _ in range(n_subnationals):
+                locations.append(dict(location_id=next_id, parent_id=country, level=3))
+                next_id += 1
+    loc_df = pd.DataFrame(locations)
+
+    pop_df = pd.DataFrame(
+        list(itertools.product(loc_df.location_id, range(1990, 1990 + n_years), range(n_ages), [1, 2, 3])),
+        columns=['location_id', 'year_id', 'age_group_id', 'sex_id']
+    )
+    pop_df['population'] = np.random.uniform(1e3, 1e6, size=len(pop_df))
+
+    cov_df = pop_df.loc[pop_df.location_id.isin(countries),
+                        ['location_id', 'year_id', 'age_group_id', 'sex_id']].copy()
+    cov_df['mean_value'] = np.random.uniform(size=len(cov_df))
+    return cov_df, pop_df, loc_df
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--regions", type=int, default=21)
+    parser.add_argument("--countries", type=int, default=10)
+    parser.add_argument("--subnationals", type=int, default=2)
+    parser.add_argument("--ages", type=int, default=23)
+    parser.add_argument("--years", type=int, default=30)
+    args = parser.parse_args()
+
+    cov_df, pop_df, loc_df = synthetic_inputs(
+        n_regions=args.regions, n_countries=args.countries, n_subnationals=args.subnationals,
+        n_ages=args.ages, n_years=args.years
+    )
+    locations = loc_df.location_id.tolist()
+    print(f"{len(loc_df)} locations, {len(pop_df)} population rows, {len(cov_df)} covariate rows.")
+
+    results = dict()
+    for name, function in [
+        ('arrays', CovariateData.complete_covariate_locations),
+        ('merges', CovariateData.complete_covariate_locations_by_merge)
+    ]:
+        start = time.perf_counter()
+        results[name] = function(cov_df=cov_df, pop_df=pop_df, loc_df=loc_df, locations=locations)
+        print(f"{name}: {time.perf_counter() - start:.3f} s")
+
+    pd.testing.assert_frame_equal(
+        results['arrays'].reset_index(drop=True), results['merges'].reset_index(drop=True)
+    )
+    print("Results are identical.")
+
+
+if __name__ == '__main__':
+    main()
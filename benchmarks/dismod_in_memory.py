@@ -0,0 +1,63 @@
+"""
+Benchmarks filling a Dismod-AT file table by table, straight to the file,
+against building it in memory and persisting it with one sqlite3 backup,
+and checks that both make the same database. Point --directory at network
+storage to see the difference there; the default is a local temporary
+directory.
+
+Usage:
+    python benchmarks/dismod_in_memory.py --rows 200000 --directory /path/on/nfs
+"""
+import sqlite3
+import tempfile
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+import pandas as pd
+
+from cascade_at.dismod.api.dismod_io import DismodIO
+
+from dismod_write import synthetic_tables
+
+N_SMALL_TABLES = 20
+"""Small tables written as well, like the age, time and option tables that DismodFiller writes."""
+
+
+def fill(path, tables, in_memory):
+    start = time.perf_counter()
+    dm = DismodIO(path=path, in_memory=in_memory)
+    for name, table in tables.items():
+        dm.write_table(name, table.copy())
+    for i in range(N_SMALL_TABLES):
+        dm.age = pd.DataFrame({'age': [0.0, 1.0, 5.0, 100.0 + i]})
+    if in_memory:
+        dm.persist()
+    dm.close()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--covariates", type=int, default=5)
+    parser.add_argument("--directory", type=str, default=None)
+    args = parser.parse_args()
+
+    tables = synthetic_tables(args.rows, args.covariates)
+    with tempfile.TemporaryDirectory(dir=args.directory) as directory:
+        direct_path = Path(directory) / 'direct.db'
+        memory_path = Path(directory) / 'memory.db'
+        direct_seconds = fill(direct_path, tables, in_memory=False)
+        memory_seconds = fill(memory_path, tables, in_memory=True)
+        same = (list(sqlite3.connect(str(direct_path)).iterdump())
+                == list(sqlite3.connect(str(memory_path)).iterdump()))
+
+    assert same
+    print(f"filled data and avgint with {args.rows} rows and {N_SMALL_TABLES} small tables in {directory}")
+    print(f"direct to file:     {direct_seconds:.2f} s")
+    print(f"in memory, persist: {memory_seconds:.2f} s ({direct_seconds / memory_seconds:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
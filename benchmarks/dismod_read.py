@@ -0,0 +1,51 @@
+"""
+Benchmarks reading a Dismod-AT table with the typed reader against
+Pandas' read_sql_table, on a synthetic sample table like the one
+``sample simulate`` makes, and checks that both give the same frame.
+
+Usage:
+    python benchmarks/dismod_read.py --rows 1000000
+"""
+import tempfile
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from cascade_at.dismod.api.dismod_io import DismodIO
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--n-var", type=int, default=1000)
+    args = parser.parse_args()
+
+    n_samples = args.rows // args.n_var
+    sample = pd.DataFrame({
+        'sample_index': np.repeat(np.arange(n_samples), args.n_var),
+        'var_id': np.tile(np.arange(args.n_var), n_samples),
+        'var_value': np.random.RandomState(0).uniform(size=n_samples * args.n_var),
+    })
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / 'dismod.db'
+        DismodIO(path=path).write_table('sample', sample)
+
+        start = time.perf_counter()
+        reflected = DismodIO(path=path, typed_read=False).read_table('sample')
+        reflected_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        typed = DismodIO(path=path).read_table('sample')
+        typed_seconds = time.perf_counter() - start
+
+    pd.testing.assert_frame_equal(typed, reflected)
+    print(f"sample table with {len(typed)} rows")
+    print(f"read_sql_table: {reflected_seconds:.2f} s")
+    print(f"typed:          {typed_seconds:.2f} s ({reflected_seconds / typed_seconds:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
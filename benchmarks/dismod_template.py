@@ -0,0 +1,90 @@
+"""
+Benchmarks filling the databases for some parents and sexes of a model
+version from scratch against starting them from the model version's
+template database, and checks that both make the same tables. It reads
+the inputs that configure_inputs wrote for the model version, so run it
+where those are. The time to make the template, which configure_inputs
+pays once per model version, is reported separately.
+
+Usage:
+    python benchmarks/dismod_template.py --model-version-id 12345 \
+        --parents 102:1 102:2 555:2 --directory /path/on/nfs
+"""
+import tempfile
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+import pandas as pd
+
+from cascade_at.context.model_context import Context
+from cascade_at.dismod.api.dismod_filler import DismodFiller
+
+
+def fill(inputs, alchemy, settings, parents, directory, template=None):
+    """
+    Fills a database for each parent and sex.
+
+    :return: (float, List[DismodFiller]) seconds and the fillers
+    """
+    fillers = list()
+    start = time.perf_counter()
+    for parent_location_id, sex_id in parents:
+        filler = DismodFiller(
+            path=directory / f'{parent_location_id}_{sex_id}.db',
+            settings_configuration=settings, measurement_inputs=inputs, grid_alchemy=alchemy,
+            parent_location_id=parent_location_id, sex_id=sex_id, template=template
+        )
+        filler.fill_for_parent_child()
+        fillers.append(filler)
+    return time.perf_counter() - start, fillers
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--model-version-id", type=int, required=True)
+    parser.add_argument("--parents", metavar="LOCATION:SEX", nargs="+", required=True)
+    parser.add_argument("--root-directory", type=str, default=None,
+                        help="where the model version's inputs are, if not in the configured cascade directory")
+    parser.add_argument("--directory", type=str, default=None)
+    args = parser.parse_args()
+
+    if args.root_directory:
+        context = Context(model_version_id=args.model_version_id, configure_application=False,
+                          root_directory=args.root_directory)
+    else:
+        context = Context(model_version_id=args.model_version_id)
+    inputs, alchemy, settings = context.read_inputs()
+    parents = [tuple(int(i) for i in parent.split(':')) for parent in args.parents]
+
+    with tempfile.TemporaryDirectory(dir=args.directory) as directory:
+        scratch_dir = Path(directory) / 'scratch'
+        template_dir = Path(directory) / 'template'
+        scratch_dir.mkdir()
+        template_dir.mkdir()
+        template_path = Path(directory) / 'template.db'
+
+        start = time.perf_counter()
+        DismodFiller(
+            path=template_path, settings_configuration=settings, measurement_inputs=inputs,
+            grid_alchemy=alchemy, parent_location_id=parents[0][0], sex_id=parents[0][1]
+        ).fill_template()
+        template_seconds = time.perf_counter() - start
+
+        scratch_seconds, scratch = fill(inputs, alchemy, settings, parents, scratch_dir)
+        templated_seconds, templated = fill(inputs, alchemy, settings, parents, template_dir,
+                                            template=template_path)
+        for one, other in zip(scratch, templated):
+            for table_name in one.fingerprints:
+                pd.testing.assert_frame_equal(one.read_table(table_name), other.read_table(table_name))
+        reused = sum(len(filler.template_tables) for filler in templated) / len(templated)
+
+    print(f"filled {len(parents)} databases in {directory}")
+    print(f"making the template:  {template_seconds:.2f} s, once per model version")
+    print(f"from scratch:         {scratch_seconds / len(parents):.3f} s per database")
+    print(f"from the template:    {templated_seconds / len(parents):.3f} s per database, "
+          f"{reused:.1f} tables reused ({scratch_seconds / templated_seconds:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""
+Benchmarks writing synthetic data and avgint tables with each of the
+validation modes, and reports the time each mode spends validating
+each table.
+
+Usage:
+    python benchmarks/dismod_validate.py --rows 200000 --covariates 5
+"""
+import tempfile
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+from cascade_at.dismod.api.dismod_io import DismodIO
+from cascade_at.dismod.api.dismod_sqlite import VALIDATION_MODES
+
+from dismod_write import synthetic_tables
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--covariates", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in VALIDATION_MODES:
+            tables = synthetic_tables(args.rows, args.covariates)
+            dm = DismodIO(path=Path(directory) / f'{mode}.db', validate=mode)
+            start = time.perf_counter()
+            for name, table in tables.items():
+                dm.write_table(name, table)
+            seconds = time.perf_counter() - start
+            validation = dm.validation_seconds
+            print(f"{mode:12s} write {seconds:.2f} s, validation " + ", ".join(
+                f"{name} {validation[name]:.3f} s" for name in tables))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmarks writing Dismod-AT tables with the bulk writer against
+Pandas' to_sql, on synthetic data and avgint tables like the ones
+DismodFiller writes, and checks that both make the same database.
+
+Usage:
+    python benchmarks/dismod_write.py --rows 200000 --covariates 5
+"""
+import sqlite3
+import tempfile
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from cascade_at.dismod.api.dismod_io import DismodIO
+
+
+def synthetic_tables(n_rows, n_covariates):
+    rng = np.random.RandomState(0)
+    covariates = {f'x_{i}': rng.uniform(size=n_rows) for i in range(n_covariates)}
+    ages = rng.uniform(0, 100, size=n_rows)
+    times = rng.randint(1990, 2020, size=n_rows).astype(float)
+    data = pd.DataFrame(dict(
+        data_name=np.arange(n_rows).astype(str),
+        integrand_id=rng.randint(0, 13, size=n_rows),
+        density_id=1,
+        node_id=rng.randint(0, 200, size=n_rows),
+        weight_id=0,
+        subgroup_id=0,
+        hold_out=0,
+        meas_value=rng.uniform(size=n_rows),
+        meas_std=rng.uniform(size=n_rows),
+        eta=np.nan,
+        nu=np.nan,
+        age_lower=ages,
+        age_upper=ages + 5,
+        time_lower=times,
+        time_upper=times + 1,
+        **covariates
+    ))
+    avgint = pd.DataFrame(dict(
+        integrand_id=rng.randint(0, 13, size=n_rows),
+        node_id=rng.randint(0, 200, size=n_rows),
+        weight_id=0,
+        subgroup_id=0,
+        age_lower=ages,
+        age_upper=ages + 5,
+        time_lower=times,
+        time_upper=times + 1,
+        c_location_id=rng.randint(0, 200, size=n_rows),
+        **covariates
+    ))
+    return dict(data=data, avgint=avgint)
+
+
+def write(path, tables, bulk_write):
+    dm = DismodIO(path=path, bulk_write=bulk_write)
+    start = time.perf_counter()
+    for name, table in tables.items():
+        dm.write_table(name, table.copy())
+    return time.perf_counter() - start
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--covariates", type=int, default=5)
+    args = parser.parse_args()
+
+    tables = synthetic_tables(n_rows=args.rows, n_covariates=args.covariates)
+    with tempfile.TemporaryDirectory() as directory:
+        to_sql_path = Path(directory) / 'to_sql.db'
+        bulk_path = Path(directory) / 'bulk.db'
+        to_sql_seconds = write(to_sql_path, tables, bulk_write=False)
+        bulk_seconds = write(bulk_path, tables, bulk_write=True)
+
+        same = (list(sqlite3.connect(str(to_sql_path)).iterdump())
+                == list(sqlite3.connect(str(bulk_path)).iterdump()))
+
+    print(f"{args.rows} rows of data and avgint with {args.covariates} covariates")
+    print(f"to_sql: {to_sql_seconds:.2f} s")
+    print(f"bulk:   {bulk_seconds:.2f} s ({to_sql_seconds / bulk_seconds:.1f}x)")
+    print(f"same database: {same}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmarks opening many Dismod-AT files and reading a small table from
+each, the way mulcov statistics does, with engines from the shared
+registry against an engine for each object. Also times the deep copy
+of the table metadata that every object used to make.
+
+Usage:
+    python benchmarks/many_databases.py --files 300
+"""
+import tempfile
+import time
+from argparse import ArgumentParser
+from copy import deepcopy
+from pathlib import Path
+
+import pandas as pd
+
+from cascade_at.dismod.api.dismod_io import DismodIO
+from cascade_at.dismod.api.engine_registry import ENGINE_REGISTRY
+from cascade_at.dismod.api.table_metadata import Base
+
+
+def read_all(paths, pooled, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for path in paths:
+            DismodIO(path=path, pooled=pooled).option
+    return time.perf_counter() - start
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--files", type=int, default=300)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = [Path(directory) / f'{i}.db' for i in range(args.files)]
+        for path in paths:
+            DismodIO(path=path).option = pd.DataFrame({
+                'option_name': ['parent_node_id'], 'option_value': ['0']
+            })
+        ENGINE_REGISTRY.dispose()
+
+        start = time.perf_counter()
+        for _ in paths:
+            deepcopy(Base.metadata)
+        copy_seconds = time.perf_counter() - start
+
+        unpooled_seconds = read_all(paths, pooled=False, repeats=args.repeats)
+        pooled_seconds = read_all(paths, pooled=True, repeats=args.repeats)
+        ENGINE_REGISTRY.dispose()
+
+    n_reads = args.files * args.repeats
+    print(f"{n_reads} reads of the option table from {args.files} files")
+    print(f"metadata deep copy:    {copy_seconds / args.files * 1e3:.2f} ms per object")
+    print(f"engine per object:     {unpooled_seconds / n_reads * 1e3:.2f} ms per read")
+    print(f"shared engines:        {pooled_seconds / n_reads * 1e3:.2f} ms per read "
+          f"({unpooled_seconds / pooled_seconds:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
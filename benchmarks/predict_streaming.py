@@ -0,0 +1,77 @@
+"""
+Benchmarks summarizing the draws in a predict table by loading the whole
+table against reading all draws of some avgint rows at a time, on a
+synthetic predict table, and checks that both give the same summaries.
+Peak memory is what tracemalloc sees, which includes numpy arrays.
+
+Usage:
+    python benchmarks/predict_streaming.py --avgint 2000 --samples 1000
+"""
+import tempfile
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from cascade_at.dismod.api.dismod_extractor import DismodExtractor
+
+
+def measure(function):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak / 1e6
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--avgint", type=int, default=2000)
+    parser.add_argument("--samples", type=int, default=1000)
+    parser.add_argument("--chunk-rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    avgint = pd.DataFrame({
+        'integrand_id': 0, 'node_id': 0, 'weight_id': 0, 'subgroup_id': 0,
+        'age_lower': np.arange(args.avgint, dtype=float), 'time_lower': 2000.0,
+        'c_location_id': 1, 'c_sex_id': 2
+    })
+    avgint = avgint.assign(age_upper=avgint.age_lower, time_upper=avgint.time_lower)
+    predict = pd.DataFrame({
+        'sample_index': np.repeat(np.arange(args.samples), args.avgint),
+        'avgint_id': np.tile(np.arange(args.avgint), args.samples),
+        'avg_integrand': np.random.RandomState(0).uniform(size=args.samples * args.avgint),
+    })
+
+    with tempfile.TemporaryDirectory() as directory:
+        d = DismodExtractor(path=Path(directory) / 'dismod.db')
+        d.integrand = pd.DataFrame({'integrand_name': ['prevalence'], 'minimum_meas_cv': 0.0})
+        d.avgint = avgint
+        d.write_table('predict', predict)
+        del predict
+
+        def whole_table():
+            draws = d.predict.groupby('avgint_id')['avg_integrand']
+            return pd.DataFrame({
+                'mean': draws.mean(), 'lower': draws.quantile(0.025), 'upper': draws.quantile(0.975)
+            })
+
+        whole, whole_seconds, whole_mb = measure(whole_table)
+        streamed, streamed_seconds, streamed_mb = measure(
+            lambda: d.summarize_predictions(chunk_rows=args.chunk_rows))
+
+    pd.testing.assert_frame_equal(
+        streamed.set_index('avgint_id')[['mean', 'lower', 'upper']], whole, check_names=False
+    )
+    print(f"summaries of {args.samples} draws for {args.avgint} avgint rows")
+    print(f"whole table: {whole_seconds:.2f} s, peak {whole_mb:.0f} MB")
+    print(f"streamed:    {streamed_seconds:.2f} s, peak {streamed_mb:.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -42,6 +42,7 @@ setup(
         'format_upload=cascade_at.executor.format_upload:main',
         'cleanup=cascade_at.executor.cleanup:main',
         'run_cascade=cascade_at.executor.run:main',
-        'run_dmdismod=cascade_at.executor.run_dmdismod:main'
+        'run_dmdismod=cascade_at.executor.run_dmdismod:main',
+        'export_tables=cascade_at.executor.export_tables:main'
     ]}
 )
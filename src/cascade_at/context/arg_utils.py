@@ -33,3 +33,33 @@ def parse_commands(command_list):
     :return: list of commands that dismod can understand
     """
     return [' '.join(x.split('-')) for x in command_list]
+
+
+def parse_timeouts(timeout_list):
+    """
+    Parse COMMAND=SECONDS command line args, where the command
+    is written like the commands, e.g. fit-both=3600.
+
+    :param timeout_list: List[str]
+    :return: dictionary of seconds by dismod command
+    """
+    d = dict()
+    for t in timeout_list:
+        command, seconds = t.split('=')
+        d.update({parse_commands([command])[0]: float(seconds)})
+    return d
+
+
+def parse_fallbacks(fallback_list):
+    """
+    Parse COMMAND=FALLBACK command line args, e.g. fit-both=fit-fixed.
+    A command can be given more than once for fallbacks to try in turn.
+
+    :param fallback_list: List[str]
+    :return: dictionary of lists of fallback dismod commands by dismod command
+    """
+    d = dict()
+    for f in fallback_list:
+        command, fallback = parse_commands(f.split('='))
+        d.setdefault(command, []).append(fallback)
+    return d
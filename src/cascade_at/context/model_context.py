@@ -6,6 +6,7 @@ from pathlib import Path
 from cascade_at.context.configuration import application_config
 from cascade_at.core.log import get_loggers
 from cascade_at.inputs.covariate_specs import CovariateSpecs
+from cascade_at.inputs.input_store import InputStore
 from cascade_at.model.grid_alchemy import Alchemy
 from cascade_at.settings.settings import load_settings
 from cascade_at.executor.utils.utils import MODEL_STATUS, update_model_status
@@ -57,11 +58,22 @@ class Context:
         self.inputs_dir = self.model_dir / 'inputs'
         self.outputs_dir = self.model_dir / 'outputs'
         self.database_dir = self.model_dir / 'dbs'
+        self.template_db_file = self.database_dir / 'template.db'
         self.draw_dir = self.outputs_dir / 'draws'
+        self.sample_draw_dir = self.outputs_dir / 'sample_draws'
+        self.export_dir = self.outputs_dir / 'tables'
+        self.telemetry_file = self.outputs_dir / 'dismod_telemetry.csv'
 
         self.inputs_file = self.inputs_dir / 'inputs.p'
+        self.input_store_dir = self.inputs_dir / 'store'
         self.settings_file = self.inputs_dir / 'settings.json'
 
+        self.shared_function_cache_dir = (
+            Path(self.root_directory)
+            / self.cascade_dir
+            / 'shared_function_cache'
+        )
+
         self.log_dir = (
             Path(self.root_directory)
             / self.cascade_dir 
@@ -73,6 +85,7 @@ class Context:
             os.makedirs(self.inputs_dir, exist_ok=True)
             os.makedirs(self.outputs_dir, exist_ok=True)
             os.makedirs(self.draw_dir, exist_ok=True)
+            os.makedirs(self.sample_draw_dir, exist_ok=True)
             os.makedirs(self.database_dir, exist_ok=True)
             os.makedirs(self.log_dir, exist_ok=True)
     
@@ -100,12 +113,12 @@ class Context:
 
     def write_inputs(self, inputs=None, settings=None):
         """
-        Write the inputs objects to disk.
+        Write the inputs objects to disk. The inputs go to an input store,
+        one file per component, so that jobs can read just what they need.
         """
         if inputs:
-            with open(self.inputs_file, "wb") as f:
-                LOG.info(f"Writing input obj to {self.inputs_file}.")
-                dill.dump(inputs, f)
+            LOG.info(f"Writing input obj to {self.input_store_dir}.")
+            InputStore(self.input_store_dir).write(inputs)
         if settings:
             with open(self.settings_file, 'w') as f:
                 LOG.info(f"Writing settings obj to {self.settings_file}.")
@@ -113,16 +126,22 @@ class Context:
 
     def read_inputs(self):
         """
-        Read the inputs from disk.
+        Read the inputs from disk. Inputs from an input store are loaded
+        lazily, component by component, as they are accessed. Inputs
+        written as a single pickle by older versions are read all at once.
         :return: (
             cascade_at.collector.measurement_inputs.MeasurementInputs,
             cascade_at.collector.grid_alchemy.Alchemy,
             cascade_at.collector.settings_configuration.SettingsConfiguration
         )
         """
-        with open(self.inputs_file, "rb") as f:
-            LOG.info(f"Reading input obj from {self.inputs_file}.")
-            inputs = dill.load(f)
+        store = InputStore(self.input_store_dir)
+        if store.exists():
+            inputs = store.read()
+        else:
+            with open(self.inputs_file, "rb") as f:
+                LOG.info(f"Reading input obj from {self.inputs_file}.")
+                inputs = dill.load(f)
         with open(self.settings_file) as f:
             settings_json = json.load(f)
         settings = load_settings(settings_json=settings_json)
@@ -23,6 +23,14 @@ with from <module> import BLOCK_SHARED_FUNCTION_ACCESS. You have to
 modify the value as ``module_proxy.BLOCK_SHARED_FUNCTION_ACCESS``.
 """
 
+SHARED_FUNCTION_CACHE = None
+"""
+The :class:`cascade_at.core.shared_function_cache.SharedFunctionCache`
+that wraps the functions handed out by the module proxies, or None to
+call the shared functions directly. Set it with
+:func:`set_shared_function_cache`.
+"""
+
 
 class DatabaseSandboxViolation(CascadeError):
     """Attempted to call a module that is intentionally restricted in the current environment."""
@@ -40,19 +48,23 @@ class ModuleProxy:
             raise ValueError(f"This accepts a module name, not the module itself.")
 
         self.name = module_name
+        self._substitute = None
         try:
             self._module = importlib.import_module(module_name)
         except ModuleNotFoundError:
             self._module = None
 
     def __getattr__(self, name):
+        if self._substitute is not None:
+            return self._cached(name, getattr(self._substitute, name))
+
         if BLOCK_SHARED_FUNCTION_ACCESS:
             raise DatabaseSandboxViolation(
                 f"Illegal access to module {self.name}. Are you trying to use "
                 f"the shared functions in a unit test?")
 
         if self._module:
-            return getattr(self._module, name)
+            return self._cached(name, getattr(self._module, name))
         else:
             raise ModuleNotFoundError(
                 f"The module {self.name} could not be imported in this environment. "
@@ -62,6 +74,79 @@ class ModuleProxy:
     def __dir__(self):
         return dir(self._module)
 
+    def _cached(self, name, attribute):
+        if SHARED_FUNCTION_CACHE is None:
+            return attribute
+        return SHARED_FUNCTION_CACHE.wrap(self.name, name, attribute)
+
+
+def set_shared_function_cache(cache):
+    """
+    Puts a cache in front of the shared functions that the module proxies
+    hand out, or takes it away if cache is None.
+
+    Args:
+        cache: (cascade_at.core.shared_function_cache.SharedFunctionCache)
+
+    Returns:
+        the cache that was in place before
+    """
+    global SHARED_FUNCTION_CACHE
+    previous = SHARED_FUNCTION_CACHE
+    SHARED_FUNCTION_CACHE = cache
+    return previous
+
+
+def static_query(query, conn_def):
+    """
+    Runs a query against a reference table that doesn't change while
+    models run, such as shared.measure. Unlike ``ezfuncs.query``, the
+    result goes through the shared function cache when one is set, so
+    repeated runs don't go back to the database for it.
+
+    Args:
+        query: (str) the SQL query
+        conn_def: (str) the connection definition
+
+    Returns:
+        (pd.DataFrame) the query result
+    """
+    query_function = ezfuncs.query
+    if SHARED_FUNCTION_CACHE is not None:
+        query_function = SHARED_FUNCTION_CACHE.wrap(ezfuncs.name, 'static_query', query_function)
+    return query_function(query, conn_def=conn_def)
+
+
+@contextmanager
+def substitute_modules(**modules):
+    """
+    Temporarily replaces the modules behind the proxies in this module
+    with local stand-ins, so that code that pulls from the shared functions
+    can run without the IHME databases, for instance in tests.
+    Access to a substituted module is allowed even when
+    ``BLOCK_SHARED_FUNCTION_ACCESS`` is set.
+
+    >>> from types import SimpleNamespace
+    >>> with substitute_modules(db_queries=SimpleNamespace(get_ids=lambda table: None)):
+    >>>     db_queries.get_ids(table='sex')
+
+    Args:
+        modules: proxy names in this module (e.g. db_queries, elmo) mapped
+            to the objects to use in their place
+    """
+    proxies = {name: globals()[name] for name in modules}
+    for name, proxy in proxies.items():
+        if not isinstance(proxy, ModuleProxy):
+            raise ValueError(f"{name} is not a module proxy.")
+    previous = {name: proxy._substitute for name, proxy in proxies.items()}
+    try:
+        for name, proxy in proxies.items():
+            proxy._substitute = modules[name]
+        yield
+    finally:
+        for name, proxy in proxies.items():
+            proxy._substitute = previous[name]
+
 
 db_queries = ModuleProxy("db_queries")
 age_spans = ModuleProxy("db_queries.get_age_metadata")
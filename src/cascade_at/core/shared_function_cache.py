@@ -0,0 +1,383 @@
+"""
+An on-disk cache for the results of the shared functions.
+
+Pulling the same envelope, population, or covariate estimates for every
+model version in a GBD round is slow and loads the databases. The cache
+keys each call by the function name and its normalized arguments,
+stores data frames as HDF5 and anything else with dill, and evicts the
+least recently used results when it gets too big.
+
+Functions that resolve the best or latest version of an estimate give
+different results once a newer version is published, so their results
+expire after MAX_AGE_SECONDS. Each result is stored with the versions it
+holds, see VERSION_COLUMNS, and the report says which versions were served.
+To pull everything again now, clear the cache, all of it or one function's
+results, or pass --clear-shared-function-cache to configure_inputs.
+
+>>> from cascade_at.core.db import set_shared_function_cache
+>>> cache = SharedFunctionCache(directory=context.shared_function_cache_dir)
+>>> set_shared_function_cache(cache)
+>>> inputs.get_raw_inputs()
+>>> cache.report()
+>>> cache.clear(function='db_queries.get_covariate_estimates')
+"""
+import hashlib
+import json
+import os
+import uuid
+from collections import defaultdict
+from functools import wraps
+from pathlib import Path
+from threading import Lock
+from time import time
+
+import dill
+import numpy as np
+import pandas as pd
+
+from cascade_at.core.log import get_loggers
+
+LOG = get_loggers(__name__)
+
+CACHED_FUNCTIONS = {
+    'db_queries': {
+        'get_age_metadata',
+        'get_covariate_estimates',
+        'get_demographics',
+        'get_envelope',
+        'get_ids',
+        'get_location_metadata',
+        'get_outputs',
+        'get_population',
+    },
+    'db_tools.ezfuncs': {'static_query'},
+    'elmo': {'get_crosswalk_version'},
+    'gbd.decomp_step': {'decomp_step_from_decomp_step_id'},
+}
+"""
+Functions whose results depend only on their arguments, by module.
+Anything that writes to a database or reads a table that changes
+while a model runs doesn't belong here. Arbitrary queries aren't cached,
+only the reference table lookups made through
+:func:`cascade_at.core.db.static_query`.
+"""
+
+MAX_AGE_SECONDS = {
+    'db_queries.get_covariate_estimates': 24 * 60 * 60,
+    'db_queries.get_envelope': 24 * 60 * 60,
+    'db_queries.get_outputs': 24 * 60 * 60,
+    'db_queries.get_population': 24 * 60 * 60,
+}
+"""
+How long the results of the functions that resolve the best or latest
+version of an estimate are served from the cache, by function, so that
+a newly published best version is pulled within a day. Results of the
+other functions are reference lookups that don't expire.
+"""
+
+VERSION_COLUMNS = ['model_version_id', 'run_id', 'output_version_id', 'version_id']
+"""
+Columns that say which version of an estimate a result is, in the order
+they're looked for. The first one a result has is recorded with it.
+"""
+
+FRAME_SUFFIX = '.h5'
+OBJECT_SUFFIX = '.p'
+
+
+def normalize_arguments(value):
+    """
+    Converts arguments to plain, JSON-serializable values so that calls
+    that ask for the same thing get the same key. Numpy scalars become
+    Python scalars and lists of IDs are sorted, because the shared functions
+    treat them as sets.
+
+    :param value: an argument to a shared function
+    :return: the normalized argument
+    """
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, Path):
+        return str(value)
+    if isinstance(value, dict):
+        return {str(k): normalize_arguments(v) for k, v in sorted(value.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(value, (list, tuple, set, frozenset, np.ndarray, pd.Index, pd.Series)):
+        items = [normalize_arguments(v) for v in value]
+        try:
+            return sorted(items)
+        except TypeError:
+            return items
+    return value
+
+
+def resolved_versions(result):
+    """
+    The versions of an estimate that a result holds, from the first of
+    VERSION_COLUMNS that it has.
+
+    :param result: what a shared function returned
+    :return: (List[str]) empty for results without a version column
+    """
+    if not isinstance(result, pd.DataFrame):
+        return []
+    for column in VERSION_COLUMNS:
+        if column in result.columns:
+            return [f'{column}={v}' for v in sorted(result[column].dropna().unique().tolist())]
+    return []
+
+
+def call_key(module_name, function_name, args, kwargs):
+    """
+    Makes the content address of a call to a shared function.
+
+    :param module_name: (str) the module that the function comes from
+    :param function_name: (str) name of the function
+    :param args: (tuple) positional arguments
+    :param kwargs: (dict) keyword arguments
+    :return: (str) hex digest
+    """
+    call = {
+        'function': f'{module_name}.{function_name}',
+        'args': [normalize_arguments(a) for a in args],
+        'kwargs': normalize_arguments(kwargs),
+    }
+    text = json.dumps(call, sort_keys=True, default=repr)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class SharedFunctionCache:
+    def __init__(self, directory, max_bytes=int(20e9), enabled=True,
+                 cached_functions=None, max_age_seconds=None):
+        """
+        Caches results of the shared functions on disk, so that repeated
+        pulls of the same inputs, across runs and across model versions,
+        don't go back to the databases. Safe to use from the threads that
+        pull raw inputs concurrently.
+
+        :param directory: (pathlib.Path) where to keep the results, usually
+            Context.shared_function_cache_dir
+        :param max_bytes: (int) evict the least recently used results once
+            the cache is bigger than this
+        :param enabled: (bool) set to False to call the shared functions
+            directly
+        :param cached_functions: (Dict[str, Set[str]]) function names by
+            module name that may be cached, defaults to CACHED_FUNCTIONS
+        :param max_age_seconds: (Dict[str, float]) how old a result of a
+            function, by <module>.<function> name, may be before it's pulled
+            again, defaults to MAX_AGE_SECONDS
+        """
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.cached_functions = cached_functions or CACHED_FUNCTIONS
+        self.max_age_seconds = MAX_AGE_SECONDS if max_age_seconds is None else max_age_seconds
+
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+        self.versions = defaultdict(set)
+        self.evictions = 0
+        self.expirations = 0
+        self._lock = Lock()
+
+        if self.enabled:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def wrap(self, module_name, function_name, function):
+        """
+        Returns a function that reads from the cache before calling the
+        shared function, or the function itself if it isn't cacheable.
+
+        :param module_name: (str) name of the module the function comes from
+        :param function_name: (str) name of the function
+        :param function: the attribute that was looked up on the module
+        """
+        if not self.enabled or function_name not in self.cached_functions.get(module_name, ()):
+            return function
+        name = f'{module_name}.{function_name}'
+
+        @wraps(function)
+        def cached_function(*args, **kwargs):
+            key = call_key(module_name, function_name, args, kwargs)
+            found, result = self.get(key, max_age_seconds=self.max_age_seconds.get(name))
+            if found:
+                self._count(self.hits, name)
+                LOG.debug(f"Shared function cache hit for {name}.")
+                return result
+            self._count(self.misses, name)
+            result = function(*args, **kwargs)
+            self.put(key, result, function=name)
+            return result
+
+        return cached_function
+
+    def _count(self, counter, name):
+        with self._lock:
+            counter[name] += 1
+
+    def _path(self, key, suffix):
+        return self.directory / f'{key}{suffix}'
+
+    @staticmethod
+    def _read(path, suffix, data=True):
+        """
+        Reads a result and the entry that describes it, which is None for
+        results cached before entries were recorded.
+        """
+        if suffix == FRAME_SUFFIX:
+            with pd.HDFStore(path, mode='r') as store:
+                if 'result' not in store:
+                    raise KeyError('result')
+                entry = getattr(store.get_storer('result').attrs, 'entry', None)
+                return (store.get('result') if data else None), entry
+        with open(path, 'rb') as f:
+            stored = dill.load(f)
+        if isinstance(stored, dict) and set(stored) == {'entry', 'result'}:
+            return stored['result'], stored['entry']
+        return stored, None
+
+    def get(self, key, max_age_seconds=None):
+        """
+        Reads a result from the cache. A result older than max_age_seconds
+        is deleted rather than returned.
+
+        :param key: (str) call key
+        :param max_age_seconds: (float) how old the result may be, or None
+        :return: (found, result)
+        """
+        for suffix in (FRAME_SUFFIX, OBJECT_SUFFIX):
+            path = self._path(key, suffix)
+            try:
+                with self._lock:
+                    result, entry = self._read(path, suffix)
+                    if max_age_seconds is not None and (
+                            entry is None or time() - entry['cached_at'] > max_age_seconds):
+                        LOG.info(f"The cached result {path.name} of "
+                                 f"{entry['function'] if entry else 'a function'} expired.")
+                        os.remove(path)
+                        self.expirations += 1
+                        return False, None
+                    os.utime(path)
+                    if entry is not None:
+                        self.versions[entry['function']].update(entry['versions'])
+                return True, result
+            except (FileNotFoundError, KeyError):
+                continue
+            except Exception as error:
+                LOG.warning(f"Could not read {path} from the shared function cache: {error!r}.")
+        return False, None
+
+    def put(self, key, result, function=None):
+        """
+        Writes a result to the cache, with an entry that says which function
+        it's from, when it was cached, and the versions it holds, then evicts
+        old results if the cache is over its size limit. Data frames go to
+        HDF5 and everything else is pickled. Results that can't be written
+        are just not cached.
+
+        :param key: (str) call key
+        :param result: what the shared function returned
+        :param function: (str) the <module>.<function> name
+        """
+        suffix = FRAME_SUFFIX if isinstance(result, pd.DataFrame) else OBJECT_SUFFIX
+        path = self._path(key, suffix)
+        temporary = self.directory / f'{key}.{uuid.uuid4().hex}.tmp'
+        entry = {'function': function, 'cached_at': time(), 'versions': resolved_versions(result)}
+        try:
+            with self._lock:
+                if suffix == FRAME_SUFFIX:
+                    with pd.HDFStore(temporary, mode='w') as store:
+                        store.put('result', result)
+                        store.get_storer('result').attrs.entry = entry
+                else:
+                    with open(temporary, 'wb') as f:
+                        dill.dump({'entry': entry, 'result': result}, f)
+                os.replace(temporary, path)
+                self.versions[function].update(entry['versions'])
+        except Exception as error:
+            LOG.warning(f"Could not write to the shared function cache: {error!r}.")
+            if temporary.exists():
+                temporary.unlink()
+            return
+        self.evict()
+
+    def entries(self):
+        """
+        The files in the cache, least recently used first.
+
+        :return: (List[os.DirEntry])
+        """
+        if not self.directory.exists():
+            return []
+        entries = [
+            entry for entry in os.scandir(self.directory)
+            if entry.name.endswith(FRAME_SUFFIX) or entry.name.endswith(OBJECT_SUFFIX)
+        ]
+        return sorted(entries, key=lambda entry: entry.stat().st_mtime)
+
+    def size_bytes(self):
+        """
+        :return: (int) total size of the cached results
+        """
+        return sum(entry.stat().st_size for entry in self.entries())
+
+    def evict(self):
+        """
+        Deletes the least recently used results until the cache fits
+        in max_bytes.
+        """
+        with self._lock:
+            entries = self.entries()
+            sizes = [entry.stat().st_size for entry in entries]
+            total = sum(sizes)
+            for entry, size in zip(entries, sizes):
+                if total <= self.max_bytes:
+                    break
+                LOG.debug(f"Evicting {entry.name} from the shared function cache.")
+                os.remove(entry.path)
+                total -= size
+                self.evictions += 1
+
+    def clear(self, function=None):
+        """
+        Deletes everything in the cache, or only the results of one
+        function, for instance to pull a newly published best version
+        before the cached one expires.
+
+        :param function: (str) a <module>.<function> name, like
+            'db_queries.get_covariate_estimates', or None for everything
+        """
+        with self._lock:
+            for entry in self.entries():
+                if function is not None:
+                    suffix = FRAME_SUFFIX if entry.name.endswith(FRAME_SUFFIX) else OBJECT_SUFFIX
+                    try:
+                        _, cached = self._read(entry.path, suffix, data=False)
+                    except Exception:
+                        cached = None
+                    if cached is not None and cached['function'] != function:
+                        continue
+                os.remove(entry.path)
+
+    def report(self):
+        """
+        Logs and returns the cache hits and misses for each function,
+        and the versions of the estimates that were served.
+
+        :return: (pd.DataFrame) with columns function, hits, misses, versions
+        """
+        names = sorted(set(self.hits) | set(self.misses))
+        df = pd.DataFrame({
+            'function': names,
+            'hits': [self.hits[n] for n in names],
+            'misses': [self.misses[n] for n in names],
+            'versions': [', '.join(sorted(self.versions[n])) for n in names],
+        }, columns=['function', 'hits', 'misses', 'versions'])
+        LOG.info(
+            f"Shared function cache: {df.hits.sum()} hits, {df.misses.sum()} misses, "
+            f"{self.evictions} evictions, {self.expirations} expired, "
+            f"{self.size_bytes() / 1e6:.1f} MB in {self.directory}."
+        )
+        for row in df.itertuples():
+            served = f", served {row.versions}" if row.versions else ""
+            LOG.info(f"  {row.function}: {row.hits} hits, {row.misses} misses{served}.")
+        return df
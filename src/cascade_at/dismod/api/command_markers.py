@@ -0,0 +1,206 @@
+"""
+Lets a sequence of dmdismod commands pick up where it left off.
+
+After each command of a sequence completes, a marker is written to the
+c_command_marker table of the file, with the id of the row that dmdismod
+wrote to its own log table when the command ended, and a fingerprint of
+the input tables after the command. When the same sequence runs on the
+file again, as when a job is retried, the commands it completed are
+skipped, as long as
+
+- every marker's log row is still there, so the file wasn't replaced, and
+- the input tables are the same as after the last completed command,
+  so nothing has changed them since, like filling the database again
+  with different inputs.
+
+Otherwise the whole sequence runs again. Commands in a sequence that
+change the inputs, like set option, are fine, because the fingerprint
+is taken after each command.
+
+>>> sequence = sequence_key(commands)
+>>> skip = completed_commands(DismodIO(path=dm_file), sequence, commands)
+
+A database that was refilled knows which of its tables changed, so
+commands_to_rerun can keep the commands that completed before the refill
+and don't depend on those tables.
+"""
+import hashlib
+from time import time
+
+import pandas as pd
+
+from cascade_at.core.log import get_loggers
+from cascade_at.dismod.api.dismod_filler import PREDICT_ONLY_TABLES, table_fingerprint
+
+LOG = get_loggers(__name__)
+
+INPUT_TABLES = [
+    'age', 'time', 'integrand', 'density', 'covariate', 'node', 'prior', 'weight', 'weight_grid',
+    'smooth', 'smooth_grid', 'nslist', 'nslist_pair', 'rate', 'mulcov', 'option', 'data', 'avgint',
+    'subgroup', 'constraint'
+]
+"""
+The tables that Dismod-AT reads as inputs, which the commands before
+a completed command depended on.
+"""
+
+
+def sequence_key(commands, fallbacks=None):
+    """
+    Identifies a sequence of commands and their fallbacks, so that markers
+    from one sequence aren't used for another.
+
+    :param commands: (List[str])
+    :param fallbacks: (Dict[str, List[str]])
+    :return: (str)
+    """
+    fallbacks = fallbacks or dict()
+    described = repr([(c, list(fallbacks.get(c, []))) for c in commands])
+    return hashlib.sha1(described.encode()).hexdigest()
+
+
+def inputs_fingerprint(db):
+    """
+    A fingerprint of all of the input tables in a file.
+
+    :param db: (cascade_at.dismod.api.dismod_io.DismodIO)
+    :return: (str)
+    """
+    present = set(db.table_names())
+    digest = hashlib.sha1()
+    for table_name in INPUT_TABLES:
+        if table_name in present:
+            digest.update(f"{table_name}:{table_fingerprint(db.read_table(table_name))};".encode())
+    return digest.hexdigest()
+
+
+def last_end_log_id(db, command):
+    """
+    The id of the last row of the log table that says a command ended.
+    dmdismod writes a 'command' message that starts with 'end' and the
+    command's name when a command finishes.
+
+    :param db: (cascade_at.dismod.api.dismod_io.DismodIO)
+    :param command: (str) like 'fit both'
+    :return: (int) the log_id, or None if there isn't one
+    """
+    if 'log' not in db.table_names():
+        return None
+    log = db.read_table('log', columns=['log_id', 'message'], where={'message_type': 'command'})
+    name = command.split()[0]
+    ended = log.loc[log.message.str.split().apply(lambda words: words[:2] == ['end', name])]
+    if ended.empty:
+        return None
+    return int(ended.log_id.max())
+
+
+def _markers(db):
+    if 'c_command_marker' not in db.table_names():
+        return pd.DataFrame(columns=['sequence', 'position'])
+    return db.command_marker.drop(columns='c_command_marker_id')
+
+
+def completed_commands(db, sequence, commands, check_inputs=True):
+    """
+    How many of the commands at the start of a sequence completed on this
+    file, and haven't been made stale since.
+
+    :param db: (cascade_at.dismod.api.dismod_io.DismodIO)
+    :param sequence: (str) from sequence_key
+    :param commands: (List[str]) the commands of the sequence
+    :param check_inputs: (bool) count the commands as stale if the inputs
+        changed after the last of them completed
+    :return: (int) the number of commands to skip
+    """
+    markers = _markers(db)
+    markers = markers.loc[markers.sequence == sequence].set_index('position')
+    if 'log' in db.table_names():
+        log_ids = set(db.read_table('log', columns=['log_id'], where={'message_type': 'command'}).log_id)
+    else:
+        log_ids = set()
+    completed = 0
+    while completed < len(commands) and completed in markers.index:
+        marker = markers.loc[completed]
+        if marker.requested != commands[completed] or marker.log_id not in log_ids:
+            break
+        completed += 1
+    if check_inputs and completed and markers.loc[completed - 1].inputs != inputs_fingerprint(db):
+        LOG.info(f"The inputs in {db.path} have changed since {commands[completed - 1]} ran.")
+        completed = 0
+    return completed
+
+
+def clear_markers(db, sequence):
+    """
+    Drops the markers of a sequence, before it runs from the start.
+
+    :param db: (cascade_at.dismod.api.dismod_io.DismodIO)
+    :param sequence: (str) from sequence_key
+    """
+    markers = _markers(db)
+    if (markers.sequence == sequence).any():
+        db.command_marker = markers.loc[markers.sequence != sequence].reset_index(drop=True)
+
+
+def commands_to_rerun(db, commands, changed_tables, fallbacks=None):
+    """
+    Which commands of a sequence have to run again after the database was
+    refilled, given the tables the refill changed. Only commands that
+    completed the last time the sequence ran on this file, as their markers
+    show, are left out, so a sequence that never finished runs from the first
+    command that didn't complete, even if no tables changed. A change to
+    a table in PREDICT_ONLY_TABLES reruns from the first predict on, and
+    a change to any other table reruns every command.
+
+    The markers of the commands left out are stamped with the refilled inputs
+    and the others are dropped, so that run_dismod_job with resume skips
+    exactly the commands left out.
+
+    :param db: (cascade_at.dismod.api.dismod_io.DismodIO)
+    :param commands: (List[str]) the commands of the sequence
+    :param changed_tables: (List[str]) the tables the refill wrote
+    :param fallbacks: (Dict[str, List[str]]) the fallbacks of the sequence
+    :return: (List[str]) the commands to run, in the same order
+    """
+    sequence = sequence_key(commands, fallbacks)
+    completed = completed_commands(db, sequence, commands, check_inputs=False)
+    changed = set(changed_tables)
+    if changed - set(PREDICT_ONLY_TABLES):
+        keep = 0
+    elif changed:
+        predicts = [i for i, c in enumerate(commands[:completed]) if c.split()[0] == 'predict']
+        keep = predicts[0] if predicts else completed
+    else:
+        keep = completed
+    markers = _markers(db)
+    ours = markers.sequence == sequence
+    if ours.any():
+        markers = markers.loc[~ours | (markers.position < keep)].reset_index(drop=True)
+        markers.loc[markers.sequence == sequence, 'inputs'] = inputs_fingerprint(db)
+        db.command_marker = markers
+    return list(commands[keep:])
+
+
+def mark_completed(db, sequence, position, requested, command):
+    """
+    Writes a marker that a command of a sequence completed, unless
+    dmdismod didn't log that it ended, in which case it can't be
+    told apart from a command that never ran.
+
+    :param db: (cascade_at.dismod.api.dismod_io.DismodIO)
+    :param sequence: (str) from sequence_key
+    :param position: (int) the position of the command in the sequence
+    :param requested: (str) the command of the sequence
+    :param command: (str) the command that ran, which is a fallback
+        if requested didn't succeed
+    """
+    log_id = last_end_log_id(db, command)
+    if log_id is None:
+        LOG.warning(f"dmdismod didn't log the end of {command} in {db.path}, so it can't be skipped on a retry.")
+        return
+    markers = _markers(db)
+    markers = markers.loc[~((markers.sequence == sequence) & (markers.position == position))]
+    db.command_marker = pd.concat([markers, pd.DataFrame([{
+        'sequence': sequence, 'position': position, 'requested': requested, 'command': command,
+        'log_id': log_id, 'inputs': inputs_fingerprint(db), 'unix_time': int(time())
+    }])], ignore_index=True)
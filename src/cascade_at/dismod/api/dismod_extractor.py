@@ -3,6 +3,7 @@ import numpy as np
 
 from cascade_at.core.log import get_loggers
 from cascade_at.dismod.api.dismod_io import DismodIO
+from cascade_at.dismod.api.dismod_sqlite import READ_CHUNK_ROWS
 from cascade_at.dismod.integrand_mappings import reverse_integrand_map
 from cascade_at.dismod.integrand_mappings import PRIMARY_INTEGRANDS_TO_RATES
 
@@ -16,25 +17,24 @@ class DismodExtractor(DismodIO):
     and puts them into the Dismod database tables
     in the correct construction.
     """
-    def __init__(self, path):
-        super().__init__(path=path)
+    def __init__(self, path, cache_reads=False):
+        super().__init__(path=path, cache_reads=cache_reads)
 
     def get_predictions(self, location_id=None, sex_id=None):
         """
         Get the predictions from the predict table for a specific
         location (rather than node) and sex ID.
 
+        Only the avgint rows for the location and sex are read, and
+        then only the predictions for those rows, rather than
+        the whole predict table.
+
         Returns:
             pd.DataFrame
         """
-        predictions = self.predict.merge(self.avgint, on=['avgint_id'])
-        predictions = predictions.merge(self.integrand, on=['integrand_id'])
-        predictions['rate'] = predictions['integrand_name'].map(PRIMARY_INTEGRANDS_TO_RATES)
-        if location_id is not None:
-            predictions = predictions.loc[predictions.c_location_id == location_id].copy()
-        if sex_id is not None:
-            predictions = predictions.loc[predictions.c_sex_id == sex_id].copy()
-        return predictions
+        avgint, predict_where = self._avgint_for(location_id=location_id, sex_id=sex_id)
+        predict = self.read_table('predict', where=predict_where)
+        return self._with_integrands(predict.merge(avgint, on=['avgint_id']), self.integrand)
 
     def gather_draws_for_prior_grid(self, location_id, sex_id, rates, value=True, dage=True, dtime=True):
         """
@@ -103,25 +103,89 @@ class DismodExtractor(DismodIO):
 
         return rate_dict
 
-    def format_predictions_for_ihme(self):
+    def _avgint_for(self, location_id=None, sex_id=None):
+        avgint_where = dict()
+        if location_id is not None:
+            avgint_where['c_location_id'] = location_id
+        if sex_id is not None:
+            avgint_where['c_sex_id'] = sex_id
+        avgint = self.read_table('avgint', where=avgint_where)
+        predict_where = {'avgint_id': avgint.avgint_id.values} if avgint_where else None
+        return avgint, predict_where
+
+    def _with_integrands(self, df, integrand):
+        df = df.merge(integrand, on=['integrand_id'])
+        df['rate'] = df['integrand_name'].map(PRIMARY_INTEGRANDS_TO_RATES)
+        return df
+
+    def iter_predictions(self, location_id=None, sex_id=None, group_by='sample_index',
+                         chunk_rows=READ_CHUNK_ROWS):
         """
-        Gets the predictions from the predict table and transforms them
-        into the GBD ids that we expect.
-        :return:
+        Gets the predictions like get_predictions, a chunk at a time,
+        so that any number of draws fits in memory.
+
+        Args:
+            location_id: (int) only get predictions for this location
+            sex_id: (int) only get predictions for this sex
+            group_by: (str) keep whole groups of this predict column in
+                each chunk, e.g. all of a draw with 'sample_index' or all
+                draws of an avgint row with 'avgint_id'
+            chunk_rows: (int) about how many predictions are in a chunk
+
+        Yields:
+            pd.DataFrame
+        """
+        avgint, predict_where = self._avgint_for(location_id=location_id, sex_id=sex_id)
+        integrand = self.integrand
+        for predict in self.iter_table('predict', chunk_rows=chunk_rows, group_by=group_by,
+                                       where=predict_where):
+            yield self._with_integrands(predict.merge(avgint, on=['avgint_id']), integrand)
+
+    def summarize_predictions(self, location_id=None, sex_id=None, lower=0.025, upper=0.975,
+                              chunk_rows=READ_CHUNK_ROWS):
+        """
+        Summarizes the draws in the predict table for each avgint row, reading
+        all draws of some avgint rows at a time, so the memory this needs
+        doesn't grow with the number of draws.
+
+        Args:
+            location_id: (int) only summarize predictions for this location
+            sex_id: (int) only summarize predictions for this sex
+            lower: (float) quantile for the lower bound
+            upper: (float) quantile for the upper bound
+            chunk_rows: (int) about how many predictions to read at a time
+
+        Returns:
+            pd.DataFrame with the avgint and integrand columns and mean,
+            lower and upper, one row for each avgint row that has predictions
+        """
+        avgint, predict_where = self._avgint_for(location_id=location_id, sex_id=sex_id)
+        summaries = list()
+        for predict in self.iter_table('predict', chunk_rows=chunk_rows, group_by='avgint_id',
+                                       columns=['avgint_id', 'avg_integrand'], where=predict_where):
+            draws = predict.groupby('avgint_id', sort=False)['avg_integrand']
+            summaries.append(pd.DataFrame({
+                'mean': draws.mean(),
+                'lower': draws.quantile(lower),
+                'upper': draws.quantile(upper)
+            }))
+        if summaries:
+            summary = pd.concat(summaries)
+        else:
+            summary = pd.DataFrame({'mean': [], 'lower': [], 'upper': []}, index=pd.Index([], name='avgint_id'))
+        return self._with_integrands(avgint.merge(summary.reset_index(), on=['avgint_id']), self.integrand)
+
+    @staticmethod
+    def _to_ihme_ids(predictions, columns):
+        """
+        Changes the avgint comment columns to GBD IDs and the integrand
+        names to measure IDs, keeping the ID columns and the given columns.
         """
-        predictions = self.get_predictions()[[
-            'c_location_id', 'c_age_group_id', 'c_year_id', 'c_sex_id',
-            'integrand_name', 'time_lower', 'time_upper', 'age_lower', 'age_upper',
-            'avg_integrand'
-        ]]
         gbd_id_cols = ['location_id', 'sex_id', 'age_group_id', 'year_id']
 
-        predictions.rename(columns={'c_' + x: x for x in gbd_id_cols}, inplace=True)
+        predictions = predictions.rename(columns={'c_' + x: x for x in gbd_id_cols})
         for col in gbd_id_cols:
             predictions[col] = predictions[col].astype(int)
-        predictions.rename(columns={'avg_integrand': 'mean'}, inplace=True)
-        predictions['lower'] = predictions['mean']
-        predictions['upper'] = predictions['mean']
 
         integrand_map = reverse_integrand_map()
         predictions['measure_id'] = predictions.integrand_name.apply(lambda x: integrand_map[x])
@@ -130,9 +194,66 @@ class DismodExtractor(DismodIO):
         predictions_2 = predictions.loc[predictions.measure_id == 41].copy()
         predictions_2['measure_id'] = 6
         predictions = pd.concat([predictions, predictions_2], axis=0)
-        
+
         return predictions[[
-            'location_id', 'age_group_id', 'year_id', 'sex_id',
-            'measure_id', 'mean', 'upper', 'lower'
-        ]]
+            'location_id', 'age_group_id', 'year_id', 'sex_id', 'measure_id'
+        ] + columns]
+
+    def format_predictions_for_ihme(self, chunk_rows=READ_CHUNK_ROWS):
+        """
+        Gets the predictions from the predict table and transforms them
+        into the GBD ids that we expect. The mean, lower and upper come
+        from the draws for each prediction, which are read a chunk at a time.
+        With a single draw, as after predict fit_var, they're all the draw.
+        :return:
+        """
+        predictions = self.summarize_predictions(chunk_rows=chunk_rows)
+        return self._to_ihme_ids(predictions, columns=['mean', 'upper', 'lower'])
+
+    def sample_indices(self):
+        """
+        The sample indices in the predict table, in order. There are none
+        when the predictions aren't of samples, as after predict fit_var,
+        which leaves sample_index null.
+
+        Returns:
+            List[int]
+        """
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            return [row[0] for row in cursor.execute(
+                "SELECT DISTINCT sample_index FROM predict WHERE sample_index IS NOT NULL ORDER BY sample_index"
+            ).fetchall()]
+        finally:
+            connection.close()
+
+    def iter_draws_for_ihme(self, chunk_rows=READ_CHUNK_ROWS):
+        """
+        Gets the draws from the predict table with the GBD ids that we expect,
+        with one column draw_<sample_index> for each of the sample_indices,
+        for some predictions at a time. Every chunk has the same draw columns,
+        with NaN for draws that are missing for its predictions. Predictions
+        that aren't of samples have no draws, so nothing is yielded.
+
+        Args:
+            chunk_rows: (int) about how many draws to read at a time
 
+        Yields:
+            pd.DataFrame
+        """
+        samples = self.sample_indices()
+        if not samples:
+            LOG.info(f"The predictions in {self.path} aren't of samples, so there are no draws.")
+            return
+        draw_columns = [f'draw_{i}' for i in samples]
+        for predictions in self.iter_predictions(group_by='avgint_id', chunk_rows=chunk_rows):
+            predictions = predictions.loc[predictions.sample_index.notnull()]
+            draws = predictions.pivot(index='avgint_id', columns='sample_index', values='avg_integrand')
+            draws = draws.reindex(columns=samples)
+            draws.columns = draw_columns
+            ids = predictions.drop_duplicates('avgint_id').drop(
+                columns=['predict_id', 'sample_index', 'avg_integrand'])
+            yield self._to_ihme_ids(
+                ids.merge(draws.reset_index(), on=['avgint_id']), columns=draw_columns
+            )
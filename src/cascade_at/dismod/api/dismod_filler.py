@@ -1,3 +1,8 @@
+import hashlib
+import os
+import shutil
+
+import numpy as np
 import pandas as pd
 
 from cascade_at.core.log import get_loggers
@@ -6,6 +11,64 @@ from cascade_at.dismod.api.fill_extract_helpers import reference_tables, data_ta
 
 LOG = get_loggers(__name__)
 
+TEMPLATE_TABLES = ['density', 'integrand', 'subgroup']
+"""
+Tables that databases for every parent and sex of a model version take
+from the template database as they are, without building them. A table
+belongs here only if it's built from the settings alone, and not from
+the parent, the sex, the node table, child priors, covariate reference
+values or anything else that can differ between databases.
+"""
+
+CHECKED_TEMPLATE_TABLES = ['age', 'time', 'covariate', 'rate', 'prior', 'smooth', 'smooth_grid']
+"""
+Tables that the template database has, but that are built for each
+database and only reused when their fingerprint matches the template's.
+They're usually the same for every parent, but a parent's omega constraint,
+child priors, covariate reference values or children can change them.
+"""
+
+TEMPLATE_WEIGHT_TABLES = ['weight', 'weight_grid']
+"""
+Tables that are built from the model's weights on the age and time
+grids, so they're taken from the template as they are when the age
+and time tables match the template's.
+
+Every other table, like node, data, avgint, option, mulcov, nslist,
+nslist_pair and the constraints, is written for each database.
+"""
+
+FINGERPRINT_TABLE = 'fingerprint'
+"""
+The side table that records a content hash of each table the filler
+wrote, by table name. Dismod-AT ignores tables it doesn't know about.
+"""
+
+PREDICT_ONLY_TABLES = ['avgint']
+"""
+Input tables that Dismod-AT reads only in the predict command, so that
+changing them means re-running predict but not init or the fits.
+A change to any other input table means re-running every command from
+init on, because init copies the inputs into the var, data_subset,
+start_var and scale_var tables that the later commands read.
+"""
+
+
+def table_fingerprint(table):
+    """
+    A content hash of a table, which is the same for tables with the same
+    columns, types and values in the same row order, whatever order
+    the columns are in.
+
+    :param table: (pd.DataFrame)
+    :return: (str) hex digest
+    """
+    columns = sorted(table.columns)
+    digest = hashlib.sha1()
+    digest.update(repr([(c, str(table[c].dtype)) for c in columns]).encode())
+    digest.update(pd.util.hash_pandas_object(table[columns], index=False).values.tobytes())
+    return digest.hexdigest()
+
 
 class DismodFiller(DismodIO):
     """
@@ -21,10 +84,44 @@ class DismodFiller(DismodIO):
         grid_alchemy: (cascade_at.collector.grid_alchemy.GridAlchemy)
         parent_location_id: (int) which parent location to construct the database for
         sex_id: (int) the sex that this database will be run for
+        child_prior: (optional) priors for the children from a previous fit
+        subtree_data: (bool) only put data for the parent and its descendants
+            in the data table, rather than data for every location. Dismod-AT
+            ignores data outside the parent's subtree anyway.
+        subtree_nodes: (bool) only put the parent and its descendants
+            in the node table
+        cache_reads: (bool) keep tables in memory after reading them back,
+            see DismodIO
+        index_tables: (bool) index the location, sex and integrand columns
+            of the avgint and data tables, so that the rows for one child
+            can be read back without scanning the tables
+        validate: (str) how to check the tables before writing them, see
+            cascade_at.dismod.api.dismod_sqlite.VALIDATION_MODES. The tables
+            are built by this class, so they aren't checked by default.
+        in_memory: (bool) build the database in memory and write it to
+            the path in one go at the end of fill_for_parent_child,
+            rather than writing each table to the file
+        template: (pathlib.Path) optional template database made by
+            fill_template, to start from rather than build and write the
+            tables in TEMPLATE_TABLES, CHECKED_TEMPLATE_TABLES and
+            TEMPLATE_WEIGHT_TABLES. Only a new database starts from it,
+            so that a database that's filled again keeps its log and the
+            markers of the commands that completed on it
+        refill: (bool) if the database was filled before, keep the tables
+            whose fingerprints haven't changed rather than writing them
+            again
 
     Attributes:
         self.parent_child_model: (cascade_at.model.model.Model) that was constructed from grid_alchemy parameter
             for one specific parent and its descendents
+        self.subtree_location_ids: (List[int]) the parent location ID and
+            all of its descendants
+        self.template_tables: (List[str]) the tables that were taken from the
+            template rather than written
+        self.fingerprints: (Dict[str, str]) fingerprints of the tables this
+            filled, by table name, see table_fingerprint
+        self.changed_tables: (List[str]) the tables that were written because
+            their fingerprints changed, or all of them without refill
 
     Example:
         >>> from pathlib import Path
@@ -49,8 +146,9 @@ class DismodFiller(DismodIO):
         >>> da.fill_for_parent_child()
     """
     def __init__(self, path, settings_configuration, measurement_inputs, grid_alchemy, parent_location_id, sex_id,
-                 child_prior=None):
-        super().__init__(path=path)
+                 child_prior=None, subtree_data=False, subtree_nodes=False, cache_reads=True,
+                 index_tables=False, validate='off', in_memory=False, template=None, refill=False):
+        super().__init__(path=path, cache_reads=cache_reads, validate=validate, in_memory=in_memory)
 
         self.settings = settings_configuration
         self.inputs = measurement_inputs
@@ -58,6 +156,20 @@ class DismodFiller(DismodIO):
         self.parent_location_id = parent_location_id
         self.sex_id = sex_id
         self.child_prior = child_prior
+        self.subtree_data = subtree_data
+        self.subtree_nodes = subtree_nodes
+        self.index_tables = index_tables
+        self.template = template
+        self.template_tables = list()
+        self.refill = refill
+        self.fingerprints = dict()
+        self.changed_tables = list()
+        self._previous_fingerprints = dict()
+        self._copied_template = False
+
+        self.subtree_location_ids = [self.parent_location_id] + sorted(
+            self.inputs.location_dag.descendants(location_id=self.parent_location_id)
+        )
 
         self.omega_df = self.get_omega_df()
         self.covariate_reference_specs = self.calculate_reference_covariates()
@@ -119,10 +231,181 @@ class DismodFiller(DismodIO):
         table with additional info or to over-ride the defaults.
         """
         LOG.info(f"Filling tables in {self.path.absolute()}")
+        self._copied_template = False
+        self._previous_fingerprints = dict()
+        self.template_tables = list()
+        self.changed_tables = list()
+        if self.refill:
+            self._previous_fingerprints = self.read_fingerprints()
+        if self.template is not None and not self._previous_fingerprints:
+            if self.is_new():
+                self.copy_template()
+                self._copied_template = True
+                self._previous_fingerprints = self.read_fingerprints()
+            else:
+                LOG.info(f"Not starting {self.path} from the template, because it already has tables.")
         self.fill_reference_tables()
         self.fill_grid_tables()
         self.fill_data_tables()
         self.option = self.construct_option_table(**additional_option_kwargs)
+        if self.index_tables:
+            self.create_indexes()
+        if self.validate != 'off':
+            self.validation_report()
+        self.write_fingerprints()
+        if self.template is not None:
+            LOG.info(f"Took tables {self.template_tables} from the template.")
+        if self.refill:
+            LOG.info(f"Refilled tables {self.changed_tables}, the others were unchanged.")
+        if self.in_memory:
+            self.persist()
+
+    def fill_template(self):
+        """
+        Fills the database with only the tables in TEMPLATE_TABLES,
+        CHECKED_TEMPLATE_TABLES and TEMPLATE_WEIGHT_TABLES, for databases
+        of other parents and sexes of this model version to start from.
+        """
+        LOG.info(f"Filling template tables in {self.path.absolute()}")
+        for table_name, build in self.shared_table_builders().items():
+            setattr(self, table_name, build())
+        self.covariate = self.construct_covariate_table()
+        self.weight, self.weight_grid = self.construct_weight_tables()
+        model_tables = self.construct_model_tables(node=self.construct_node_table())
+        for table_name in ['rate', 'smooth', 'smooth_grid', 'prior']:
+            setattr(self, table_name, model_tables[table_name])
+        self.write_fingerprints()
+        if self.in_memory:
+            self.persist()
+
+    def is_new(self):
+        """
+        Whether the database has no tables yet, so that it can start from
+        the template without losing anything.
+        """
+        if not self.in_memory and not self.path.exists():
+            return True
+        return not self.table_names()
+
+    def copy_template(self):
+        """
+        Replaces the database with a copy of the template, see is_new.
+        """
+        LOG.info(f"Starting {self.path} from the template {self.template}.")
+        if self.in_memory:
+            self.load(path=self.template)
+        else:
+            temporary = self.path.parent / f".{self.path.name}.template.tmp"
+            shutil.copyfile(self.template, temporary)
+            os.replace(temporary, self.path)
+        self.clear_read_cache()
+        self.mark_built(self.table_names())
+
+    def shared_table_builders(self):
+        """
+        Functions that build each of the tables that every database builds
+        the same way and that fill_shared_table writes, by table name.
+        """
+        return {
+            'density': reference_tables.construct_density_table,
+            'integrand': lambda: reference_tables.construct_integrand_table(
+                data_cv_from_settings=self.inputs.data_cv_from_settings(settings=self.settings)
+            ),
+            'subgroup': grid_tables.construct_subgroup_table,
+            'age': lambda: reference_tables.construct_age_time_table(
+                variable_name='age', variable=self.parent_child_model.get_age_array(),
+                data_min=self.min_age, data_max=self.max_age
+            ),
+            'time': lambda: reference_tables.construct_age_time_table(
+                variable_name='time', variable=self.parent_child_model.get_time_array(),
+                data_min=self.min_time, data_max=self.max_time
+            ),
+        }
+
+    def take_from_template(self, table_name):
+        """
+        Keeps the template's copy of a table, if this fill started from
+        the template and the template has the table.
+
+        :return: (bool) whether the table was taken from the template
+        """
+        if not self._copied_template or table_name not in self._previous_fingerprints:
+            return False
+        self.fingerprints[table_name] = self._previous_fingerprints[table_name]
+        self.template_tables.append(table_name)
+        return True
+
+    def fill_shared_table(self, table_name):
+        """
+        Writes a table that the template may already have, unless this
+        database started from the template in this fill, in which case
+        tables in TEMPLATE_TABLES aren't even built.
+        """
+        if table_name in TEMPLATE_TABLES and self.take_from_template(table_name):
+            return
+        setattr(self, table_name, self.shared_table_builders()[table_name]())
+
+    def write_table(self, table_name, table):
+        """
+        Writes a table and records its fingerprint. A table whose
+        fingerprint matches the one recorded in the database it's going
+        into, which is the template's right after copying the template,
+        or the one from when the database was last filled with refill,
+        is already there, so it isn't written.
+        """
+        fingerprint = table_fingerprint(table)
+        self.fingerprints[table_name] = fingerprint
+        if self._previous_fingerprints.get(table_name) == fingerprint:
+            if self._copied_template:
+                LOG.debug(f"Table {table_name} is the same as the template's, so not writing it.")
+                self.template_tables.append(table_name)
+            else:
+                LOG.debug(f"Table {table_name} is unchanged, so not writing it.")
+            return
+        if self._copied_template and table_name in CHECKED_TEMPLATE_TABLES:
+            LOG.info(f"The {table_name} table differs from the template's, so writing it.")
+        super().write_table(table_name, table)
+        if table_name not in self.changed_tables:
+            self.changed_tables.append(table_name)
+
+    def read_fingerprints(self):
+        """
+        Reads the fingerprints recorded when the database was last filled.
+
+        :return: (Dict[str, str]) fingerprints by table name, empty if
+            the database has none
+        """
+        if not self.in_memory and not self.path.exists():
+            return dict()
+        if FINGERPRINT_TABLE not in self.table_names():
+            return dict()
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            return dict(cursor.execute(f"SELECT table_name, fingerprint FROM {FINGERPRINT_TABLE}").fetchall())
+        finally:
+            connection.close()
+
+    def write_fingerprints(self):
+        """
+        Records the fingerprints of the tables this filled, keeping
+        those of tables it didn't fill, like the ones from the template.
+        """
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {FINGERPRINT_TABLE} "
+                f"(table_name text primary key, fingerprint text)"
+            )
+            cursor.executemany(
+                f"INSERT OR REPLACE INTO {FINGERPRINT_TABLE} (table_name, fingerprint) VALUES (?, ?)",
+                list(self.fingerprints.items())
+            )
+            connection.commit()
+            cursor.close()
+        finally:
+            connection.close()
 
     def node_id_from_location_id(self, location_id):
         """
@@ -133,26 +416,33 @@ class DismodFiller(DismodIO):
             raise RuntimeError("Problem with the node table -- should only be one node-id for each location_id.")
         return loc_df['node_id'].iloc[0]
 
+    def construct_node_table(self):
+        """
+        The node table for the locations in this database.
+        """
+        return reference_tables.construct_node_table(
+            location_dag=self.inputs.location_dag,
+            location_ids=self.subtree_location_ids if self.subtree_nodes else None
+        )
+
+    def construct_covariate_table(self):
+        """
+        The covariate table, with this parent and sex's reference values.
+        """
+        return reference_tables.construct_covariate_table(covariates=self.parent_child_model.covariates)
+
     def fill_reference_tables(self):
         """
         Fills all of the reference tables including density, node, covariate, age, and time.
 
         :return: self
         """
-        self.density = reference_tables.construct_density_table()
-        self.node = reference_tables.construct_node_table(location_dag=self.inputs.location_dag)
-        self.covariate = reference_tables.construct_covariate_table(covariates=self.parent_child_model.covariates)
-        self.age = reference_tables.construct_age_time_table(
-            variable_name='age', variable=self.parent_child_model.get_age_array(),
-            data_min=self.min_age, data_max=self.max_age
-        )
-        self.time = reference_tables.construct_age_time_table(
-            variable_name='time', variable=self.parent_child_model.get_time_array(),
-            data_min=self.min_time, data_max=self.max_time
-        )
-        self.integrand = reference_tables.construct_integrand_table(
-            data_cv_from_settings=self.inputs.data_cv_from_settings(settings=self.settings)
-        )
+        self.fill_shared_table('density')
+        self.node = self.construct_node_table()
+        self.covariate = self.construct_covariate_table()
+        self.fill_shared_table('age')
+        self.fill_shared_table('time')
+        self.fill_shared_table('integrand')
         return self
 
     def fill_data_tables(self):
@@ -161,8 +451,14 @@ class DismodFiller(DismodIO):
 
         :return: self
         """
+        if self.subtree_data:
+            LOG.info(f"Using data for the {len(self.subtree_location_ids)} locations "
+                     f"in the subtree of {self.parent_location_id}.")
+            dismod_data = self.inputs.dismod_data_for_locations(self.subtree_location_ids)
+        else:
+            dismod_data = self.inputs.dismod_data
         self.data = data_tables.construct_data_table(
-            df=self.inputs.dismod_data,
+            df=dismod_data,
             node_df=self.node,
             covariate_df=self.covariate,
             ages=self.parent_child_model.get_age_array(),
@@ -182,38 +478,56 @@ class DismodFiller(DismodIO):
         )
         return self
 
-    def fill_grid_tables(self):
+    def construct_weight_tables(self):
         """
-        Fills the grid-like tables including weight,
-        rate, smooth, smooth_grid, prior, integrand,
-        mulcov, nslist, nslist_pair.
+        The weight and weight_grid tables, on the age and time tables
+        that are in the database.
 
-        :return: self
+        :return: (pd.DataFrame, pd.DataFrame)
         """
-        self.weight, self.weight_grid = grid_tables.construct_weight_grid_tables(
+        return grid_tables.construct_weight_grid_tables(
             weights=self.parent_child_model.get_weights(),
             age_df=self.age, time_df=self.time
         )
+
+    def construct_model_tables(self, node):
+        """
+        The rate, smooth, smooth_grid, prior, mulcov, nslist and
+        nslist_pair tables, with empty tables in the shape that Dismod-AT
+        needs for the ones that the model doesn't fill.
+
+        :param node: (pd.DataFrame) the node table
+        :return: (Dict[str, pd.DataFrame]) tables by name
+        """
         model_tables = grid_tables.construct_model_tables(
             model=self.parent_child_model,
-            location_df=self.node,
+            location_df=node,
             age_df=self.age, time_df=self.time,
             covariate_df=self.covariate
         )
-        self.rate = model_tables['rate']
-        self.smooth = model_tables['smooth']
-        self.smooth_grid = model_tables['smooth_grid']
-        self.prior = model_tables['prior']
-        self.mulcov = model_tables['mulcov']
-        self.nslist = model_tables['nslist']
-        self.nslist_pair = model_tables['nslist_pair']
-        self.subgroup = model_tables['subgroup']
-
-        # Initialize empty tables that need to be there that may or may not
-        # be filled with relevant info, if they're currently empty.
         for name in ["nslist", "nslist_pair", "mulcov", "smooth_grid", "smooth"]:
-            if getattr(self, name).empty:
-                setattr(self, name, self.empty_table(table_name=name))
+            if model_tables[name].empty:
+                model_tables[name] = self.empty_table(table_name=name)
+        return model_tables
+
+    def fill_grid_tables(self):
+        """
+        Fills the grid-like tables including weight,
+        rate, smooth, smooth_grid, prior, integrand,
+        mulcov, nslist, nslist_pair.
+
+        :return: self
+        """
+        grids_from_template = {'age', 'time'} <= set(self.template_tables)
+        if grids_from_template and all(name in self._previous_fingerprints for name in TEMPLATE_WEIGHT_TABLES):
+            for name in TEMPLATE_WEIGHT_TABLES:
+                self.take_from_template(name)
+        else:
+            self.weight, self.weight_grid = self.construct_weight_tables()
+        model_tables = self.construct_model_tables(node=self.node)
+        for name in ['rate', 'smooth', 'smooth_grid', 'prior', 'mulcov', 'nslist', 'nslist_pair']:
+            setattr(self, name, model_tables[name])
+        self.fill_shared_table('subgroup')
 
     def construct_option_table(self, **kwargs):
         """
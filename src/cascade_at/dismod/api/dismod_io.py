@@ -1,8 +1,74 @@
+import os
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    from pyarrow import feather
+except ImportError:
+    feather = None
+
 from cascade_at.core.log import get_loggers
-from cascade_at.dismod.api.dismod_sqlite import DismodSQLite
+from cascade_at.dismod.api.dismod_sqlite import DismodSQLite, filter_table
 
 LOG = get_loggers(__name__)
 
+EXPORT_FORMATS = {'hdf': '.h5', 'feather': '.feather'}
+"""
+File formats that tables can be exported to, with their file suffixes.
+HDF5 is written with PyTables, which cascade_at depends on, in its table
+format, so that strings are stored as strings rather than pickled.
+Feather is an uncompressed Arrow IPC file, which can be memory-mapped
+and read without copying, and needs pyarrow, which is optional.
+"""
+
+EXPORT_METADATA = {
+    'fit_var': [('var', 'fit_var_id', 'var_id')],
+    'sample': [('var', 'var_id', 'var_id')],
+    'predict': [('avgint', 'avgint_id', 'avgint_id')],
+    'fit_data_subset': [('data_subset', 'fit_data_subset_id', 'data_subset_id'), ('data', 'data_id', 'data_id')],
+    'data_sim': [('data_subset', 'data_subset_id', 'data_subset_id'), ('data', 'data_id', 'data_id')],
+}
+"""
+The tables that results are joined with when they're exported, in order,
+as (table name, column in the result, column in the joined table), so
+that an exported table can be read without opening the database.
+"""
+
+SQLITE_CHANGE_COUNTER_OFFSET = 24
+"""
+Where the file change counter is in the header of an SQLite database,
+as four bytes.
+"""
+
+
+def _require_pyarrow():
+    if feather is None:
+        raise ImportError("The feather format needs pyarrow, which isn't installed.")
+
+
+def read_export(directory, table_name, format='hdf', as_arrow=False):
+    """
+    Reads a table that was written by DismodIO.export. Feather files are
+    memory-mapped, so the columns are read from the file as they're used.
+
+    :param directory: (pathlib.Path) the directory it was exported to
+    :param table_name: (str) the table
+    :param format: (str) one of EXPORT_FORMATS
+    :param as_arrow: (bool) for feather, return the memory-mapped
+        pyarrow.Table, whose columns aren't copied out of the file, rather
+        than converting it to a data frame
+    :return: (pd.DataFrame)
+    """
+    path = Path(directory) / f"{table_name}{EXPORT_FORMATS[format]}"
+    if format == 'hdf':
+        return pd.read_hdf(path, key=table_name)
+    _require_pyarrow()
+    table = feather.read_table(str(path), memory_map=True)
+    if as_arrow:
+        return table
+    return table.to_pandas(split_blocks=True)
+
 
 class DismodIO(DismodSQLite):
     """
@@ -11,9 +77,117 @@ class DismodIO(DismodSQLite):
     just be able to say, e.g. dmfile.data = pd.DataFrame({...}) as the 'setter', and it will
     automatically write it. Likewise, if you want to get one of the tables,
     then you can just do df = dmfile.data as the 'getter' and it will automatically read it.
+
+    With cache_reads=True, a table is kept in memory after it's first read
+    and the getter hands back copies of it. A table's entry is dropped when
+    it's written through its setter. Every entry is dropped when the file
+    changes some other way, for instance when dmdismod runs on it,
+    which is noticed from the file's modification time, its size and the
+    change counter in its header.
+
+    The getters read whole tables. To read some columns, or only the rows
+    that match filters, call read_table with columns and where, e.g.
+    dmfile.read_table('avgint', where={'c_location_id': 70}).
     """
-    def __init__(self, path):
-        super().__init__(path=path)
+    def __init__(self, path, bulk_write=True, typed_read=True, cache_reads=False, pooled=True,
+                 validate='full', in_memory=False):
+        super().__init__(path=path, bulk_write=bulk_write, typed_read=typed_read, pooled=pooled,
+                         validate=validate, in_memory=in_memory)
+        self.cache_reads = cache_reads
+        self._table_cache = dict()
+
+    def _file_state(self):
+        """
+        What the read cache knows the file by. SQLite increments the file
+        change counter in the database header on every commit, which
+        catches writes that the modification time misses, like two in the
+        same clock tick that leave the size the same.
+        """
+        try:
+            stat = os.stat(self.path)
+            with open(self.path, 'rb') as f:
+                f.seek(SQLITE_CHANGE_COUNTER_OFFSET)
+                change_counter = f.read(4)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size, change_counter
+
+    def read_table(self, table_name, columns=None, where=None):
+        if not self.cache_reads:
+            return super().read_table(table_name, columns=columns, where=where)
+        state = self._file_state()
+        cached = self._table_cache.get(table_name)
+        if cached is not None and cached[0] == state:
+            if columns is None and not where:
+                return cached[1].copy()
+            return filter_table(cached[1], columns=columns, where=where).copy()
+        if columns is not None or where:
+            # Parts of tables aren't cached, but they're cheap to read.
+            return super().read_table(table_name, columns=columns, where=where)
+        LOG.debug(f"Reading table {table_name} into the read cache.")
+        table = super().read_table(table_name)
+        self._table_cache[table_name] = (state, table)
+        return table.copy()
+
+    def write_table(self, table_name, table):
+        before = self._file_state()
+        super().write_table(table_name, table)
+        self._table_cache.pop(table_name, None)
+        # This write only changed one table, so entries for the others that
+        # were current before it are still current.
+        after = self._file_state()
+        for name, (state, cached) in self._table_cache.items():
+            if state == before:
+                self._table_cache[name] = (after, cached)
+
+    def clear_read_cache(self):
+        """
+        Drops all of the tables kept by the read cache.
+        """
+        self._table_cache.clear()
+
+    def export(self, tables, directory, format='hdf'):
+        """
+        Writes tables to columnar files in a directory, one file for each
+        table, named for the table. Result tables are joined with the
+        tables in EXPORT_METADATA, like predict with avgint, so that the
+        files say what each row is. Tables that aren't in the database,
+        like predict before predict has run, are skipped.
+
+        >>> dm.export(['fit_var', 'predict'], Path('exported'))
+        >>> read_export(Path('exported'), 'predict')
+
+        :param tables: (List[str]) the tables to export
+        :param directory: (pathlib.Path) where to write the files
+        :param format: (str) one of EXPORT_FORMATS
+        :return: (Dict[str, pathlib.Path]) the file written for each table
+        """
+        if format not in EXPORT_FORMATS:
+            raise ValueError(f"format must be one of {list(EXPORT_FORMATS)}, not {format}.")
+        if format == 'feather':
+            _require_pyarrow()
+        present = set(self.table_names())
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        written = dict()
+        for table_name in tables:
+            if table_name not in present:
+                LOG.warning(f"There is no {table_name} table in {self.path} to export.")
+                continue
+            table = self.read_table(table_name)
+            for metadata_name, left_on, right_on in EXPORT_METADATA.get(table_name, []):
+                if metadata_name in present:
+                    table = table.merge(
+                        self.read_table(metadata_name), left_on=left_on, right_on=right_on, how='left'
+                    )
+            path = directory / f"{table_name}{EXPORT_FORMATS[format]}"
+            LOG.info(f"Exporting {len(table)} rows of {table_name} to {path}.")
+            if format == 'hdf':
+                table.to_hdf(path, key=table_name, mode='w', format='table')
+            else:
+                feather.write_feather(table.reset_index(drop=True), str(path), compression='uncompressed')
+            written[table_name] = path
+        return written
 
     # AGE TABLE
     @property
@@ -42,6 +216,40 @@ class DismodIO(DismodSQLite):
     def covariate(self, df):
         self.write_table('covariate', df)
 
+    # COMMAND OUTCOME TABLE
+    @property
+    def command_outcome(self):
+        return self.read_table('c_command_outcome')
+
+    @command_outcome.setter
+    def command_outcome(self, df):
+        self.write_table('c_command_outcome', df)
+
+    def fit_command(self):
+        """
+        The fit command that made the fit_var table, which may be a fallback
+        that ran in place of the fit that was asked for, from the outcomes
+        recorded by cascade_at.dismod.api.run_dismod.run_dismod_job.
+
+        :return: (str) like 'fit fixed', or None if no fit was recorded
+        """
+        if 'c_command_outcome' not in self.table_names():
+            return None
+        outcome = self.command_outcome
+        fits = outcome.loc[(outcome.outcome == 'succeeded') & outcome.command.str.startswith('fit')]
+        if fits.empty:
+            return None
+        return fits.command.iloc[-1]
+
+    # COMMAND MARKER TABLE
+    @property
+    def command_marker(self):
+        return self.read_table('c_command_marker')
+
+    @command_marker.setter
+    def command_marker(self, df):
+        self.write_table('c_command_marker', df)
+
     # CONSTRAINT TABLE
     @property
     def constraint(self):
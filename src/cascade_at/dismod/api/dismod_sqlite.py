@@ -5,26 +5,173 @@ The file format is sqlite3. This uses a local mapping of database tables
 to create it and add tables.
 
 The object wrapper makes Pandas data frames. They get passed here
-and validated. Then Pandas uses to_csv to write them to the sqlalchemy
-engine, which uses the metadata wrapper (and its custom conversions)
-to write them to a very specific format that Dismod-AT is able to read.
+and validated. Then they are written with a bulk insert, in the same
+schema that Pandas' to_sql makes from the metadata wrapper (and its
+custom conversions), which is a very specific format that Dismod-AT
+is able to read.
 """
-from copy import deepcopy
+import os
+import sqlite3
+import time
+import uuid
+from collections import ChainMap, defaultdict
+from operator import itemgetter
 from textwrap import dedent
+from types import SimpleNamespace
 
 import numpy as np
 import pandas as pd
 from pandas.core.dtypes.base import ExtensionDtype
 from sqlalchemy import Enum, Integer, Float
-from sqlalchemy import create_engine
+from sqlalchemy import MetaData, create_engine
 from sqlalchemy.exc import StatementError
+from sqlalchemy.pool import QueuePool
 
 from cascade_at.core.log import get_loggers
 from cascade_at.core.errors import DismodFileError
+from cascade_at.dismod.api.engine_registry import ENGINE_REGISTRY
 from cascade_at.dismod.api.table_metadata import Base, add_columns_to_table
 
 LOG = get_loggers(__name__)
 
+BULK_WRITE_PRAGMAS = {
+    'journal_mode': 'MEMORY',
+    'synchronous': 'OFF',
+}
+"""
+Pragmas for bulk writes into a file that's being built, see
+DismodSQLite.write_pragmas. The rollback journal stays in memory and sqlite
+doesn't wait for the disk after each write, which is safe enough for files
+that are rebuilt from the inputs if anything goes wrong, but not for files
+that hold results. They only last for the connection that does the write.
+"""
+
+READ_CHUNK_ROWS = 100000
+"""Number of rows to fetch from the cursor at a time when reading a table."""
+
+DECLARED_TYPES = {'integer': int, 'real': float, 'text': str}
+"""Python types for the sqlite column types that Dismod-AT allows."""
+
+MAX_IN_VALUES = 500
+"""
+Longest list of values to bind in an ``IN`` filter. Longer lists are read
+as the range between their smallest and largest value and then filtered
+in Pandas, which keeps under sqlite's limit on bound parameters.
+"""
+
+VALIDATION_MODES = ('full', 'schema-only', 'off')
+"""
+How much to check tables before writing them.
+
+- ``full`` checks the columns and their types, and fills nulls in nullable
+  numeric columns with NaN, which copies those columns.
+- ``schema-only`` makes the same checks but only fills nulls in columns
+  that are stored as objects, where it's needed to find their type.
+- ``off`` skips the checks, for tables that the package just built itself.
+"""
+
+HAS_BACKUP_API = hasattr(sqlite3.Connection, 'backup')
+"""
+Whether sqlite3 connections have the backup API, which came in Python 3.7.
+Without it, in-memory databases are loaded and persisted by replaying a
+dump of the database, which makes the same tables and rows but is slower.
+"""
+
+LOOKUP_INDEXES = {
+    'avgint': ['c_location_id', 'c_sex_id', 'integrand_id'],
+    'data': ['c_location_id', 'c_sex_id', 'integrand_id'],
+}
+"""Columns to index for reading the rows of one location, sex, or integrand."""
+
+
+def _is_range(value):
+    return isinstance(value, slice)
+
+
+def _is_list(value):
+    return isinstance(value, (list, tuple, set, frozenset, np.ndarray, pd.Index, pd.Series))
+
+
+def where_clause(where, quote):
+    """
+    Makes the SQL for filters on the rows of a table. Filters are a
+    dictionary from column name to
+
+    - a value, for rows where the column equals it
+    - a list of values, for rows where the column is one of them
+    - a slice, for rows where the column is between its start and stop,
+      inclusive. Either one can be None.
+
+    Args:
+        where (dict): filters by column name
+        quote: function that quotes an identifier
+
+    Returns:
+        the SQL (an empty string if there are no filters), the parameters
+        to bind to it, and the list filters that are too long to bind, which
+        the caller still has to apply to the rows it reads.
+    """
+    conditions = list()
+    parameters = list()
+    unbound = dict()
+    for column, value in (where or dict()).items():
+        name = quote(column)
+        if _is_range(value):
+            if value.start is not None:
+                conditions.append(f"{name} >= ?")
+                parameters.append(value.start)
+            if value.stop is not None:
+                conditions.append(f"{name} <= ?")
+                parameters.append(value.stop)
+        elif _is_list(value):
+            values = sorted({v.item() if isinstance(v, np.generic) else v for v in value})
+            if not values:
+                conditions.append("0 = 1")
+            elif len(values) > MAX_IN_VALUES:
+                conditions.append(f"{name} BETWEEN ? AND ?")
+                parameters.extend([values[0], values[-1]])
+                unbound[column] = values
+            else:
+                conditions.append(f"{name} IN ({', '.join('?' * len(values))})")
+                parameters.extend(values)
+        else:
+            conditions.append(f"{name} = ?")
+            parameters.append(value.item() if isinstance(value, np.generic) else value)
+    if not conditions:
+        return "", parameters, unbound
+    return " WHERE " + " AND ".join(conditions), parameters, unbound
+
+
+def filter_table(df, columns=None, where=None):
+    """
+    Applies a column list and filters, as described in :func:`where_clause`,
+    to a data frame that has already been read.
+
+    Args:
+        df (pd.DataFrame): the whole table
+        columns (List[str]): columns to keep, in order, or None for all
+        where (dict): filters by column name
+
+    Returns:
+        pd.DataFrame with a new default index if any rows were filtered
+    """
+    if where:
+        mask = np.ones(len(df), dtype=bool)
+        for column, value in where.items():
+            if _is_range(value):
+                if value.start is not None:
+                    mask &= (df[column] >= value.start).values
+                if value.stop is not None:
+                    mask &= (df[column] <= value.stop).values
+            elif _is_list(value):
+                mask &= df[column].isin(list(value)).values
+            else:
+                mask &= (df[column] == value).values
+        df = df.loc[mask].reset_index(drop=True)
+    if columns is not None:
+        df = df[list(columns)]
+    return df
+
 
 def get_engine(file_path):
     if file_path is not None:
@@ -35,6 +182,74 @@ def get_engine(file_path):
     return engine
 
 
+def get_memory_engine():
+    """
+    Makes an engine for a new in-memory database. Every connection from
+    the engine sees the same database, which lasts as long as the
+    connection returned with the engine is open.
+
+    Returns:
+        (sqlalchemy.engine.Engine, sqlite3.Connection, str) the engine,
+        the connection, and the URI of the database
+    """
+    uri = f"file:dismod_{uuid.uuid4().hex}?mode=memory&cache=shared"
+
+    def connect():
+        return sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+    anchor = connect()
+    engine = create_engine("sqlite://", creator=connect, poolclass=QueuePool, pool_size=1, max_overflow=-1)
+    return engine, anchor, uri
+
+
+def copy_database(source, target):
+    """
+    Replaces everything in the target database with the contents of
+    the source database. Without the backup API, the target attaches the
+    source and copies each table with ``INSERT ... SELECT``, which keeps
+    every value as it is stored, including infinities.
+
+    Args:
+        source (str): path or URI of the database to copy
+        target (sqlite3.Connection): the database to copy it to, which
+            has to be opened with ``uri=True`` if source is a URI
+    """
+    if HAS_BACKUP_API:
+        connection = sqlite3.connect(source, uri=True)
+        try:
+            connection.backup(target)
+        finally:
+            connection.close()
+        return
+    isolation_level = target.isolation_level
+    target.isolation_level = None
+    tables = target.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+    ).fetchall()
+    for name, in tables:
+        target.execute(f'DROP TABLE "{name}"')
+    target.execute("ATTACH DATABASE ? AS source", (source,))
+    try:
+        schema = target.execute(
+            "SELECT type, name, sql FROM source.sqlite_master "
+            "WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' "
+            "ORDER BY CASE type WHEN 'table' THEN 0 ELSE 1 END"
+        ).fetchall()
+        target.execute("BEGIN")
+        try:
+            for kind, name, sql in schema:
+                target.execute(sql)
+                if kind == 'table':
+                    target.execute(f'INSERT INTO main."{name}" SELECT * FROM source."{name}"')
+        except sqlite3.Error:
+            target.execute("ROLLBACK")
+            raise
+        target.execute("COMMIT")
+    finally:
+        target.execute("DETACH DATABASE source")
+        target.isolation_level = isolation_level
+
+
 class DismodSQLite:
     """
     Responsible for creation of a Dismod-AT file.
@@ -52,8 +267,12 @@ class DismodSQLite:
     to the avgint and data tables. These arguments are dictionaries from
     column name to column type.
 
-    This uses a deep copy of the metadata module so that, when it adds columns
-    to tables, it doesn't affect the module itself.
+    Table definitions come from the metadata module, which is shared by
+    every file. When columns are added to a table, this file gets its own
+    copy of that table's definition, so the module itself isn't affected.
+    Engines come from the process-wide
+    :data:`~cascade_at.dismod.api.engine_registry.ENGINE_REGISTRY`, which
+    keeps a pool of connections for each file until ``close`` is called.
 
     Example:
     >>> from pathlib import Path
@@ -64,22 +283,145 @@ class DismodSQLite:
     >>> data = dm.read_table('data')
     >>> time = pd.DataFrame({'time': [1997, 2005, 2017]})
     >>> dm.write_table('time', time)
+    >>> dm.close()
+
+    With ``in_memory=True``, the database is kept in an in-memory sqlite
+    database, starting from a copy of the file if there is one. Nothing
+    is written to the file until ``persist`` copies the whole database to
+    it with the sqlite3 backup API, which is one sequential write rather
+    than many small ones, and much faster on network file systems.
+    Without the backup API (before Python 3.7) the copy replays a dump
+    of the database instead, see :func:`copy_database`.
+
+    >>> dm = DismodSQLite(path, in_memory=True)
+    >>> dm.write_table('time', time)
+    >>> dm.persist()
     """
 
-    def __init__(self, path):
+    def __init__(self, path, bulk_write=True, typed_read=True, pooled=True, validate='full',
+                 in_memory=False):
         """
         The columns arguments add columns to the avgint and data
         tables.
 
         Args:
             pathlib.Path: A path to the database
+            bulk_write (bool): write tables with a single-transaction bulk
+                insert rather than with Pandas' to_sql. Both make the same
+                tables and values.
+            typed_read (bool): read tables straight from a sqlite3 cursor
+                into arrays of the types in the table metadata, rather than
+                with Pandas' read_sql_table. Both give the same data frames.
+            pooled (bool): use the shared engine for this path from the
+                engine registry, rather than an engine of its own
+            validate (str): how to check tables before writing them,
+                one of VALIDATION_MODES
+            in_memory (bool): read and write an in-memory copy of the
+                database, which is written to the path by persist
         """
+        if validate not in VALIDATION_MODES:
+            raise ValueError(f"validate must be one of {VALIDATION_MODES}, not {validate}.")
         self.path = path
-        LOG.debug(f"Creating an engine at {path.absolute()}.")
-        self.engine = get_engine(path)
-        self._metadata = deepcopy(Base.metadata)
-        self._table_definitions = self._metadata.tables
-        LOG.debug(f"dmfile tables {self._table_definitions.keys()}")
+        self.bulk_write = bulk_write
+        self.typed_read = typed_read
+        self.pooled = pooled
+        self.validate = validate
+        self.validation_seconds = defaultdict(float)
+        self.in_memory = in_memory
+        self._engine = None
+        self._memory = None
+        self._memory_uri = None
+        self._built_tables = set()
+        if in_memory:
+            self._engine, self._memory, self._memory_uri = get_memory_engine()
+            if path.exists():
+                self.load()
+        elif not pooled:
+            LOG.debug(f"Creating an engine at {path.absolute()}.")
+            self._engine = get_engine(path)
+        # Tables with added columns go in the first map, and
+        # every other table is looked up in the shared metadata.
+        self._table_definitions = ChainMap(dict(), Base.metadata.tables)
+
+    @property
+    def engine(self):
+        if self._engine is not None:
+            return self._engine
+        return ENGINE_REGISTRY.engine(self.path)
+
+    def close(self):
+        """
+        Closes the connections to this file. For a pooled file, this disposes
+        of the shared engine for the path, which is made again if anything
+        reads or writes the file after this. An in-memory database is
+        dropped, so persist it first.
+        """
+        if self.in_memory:
+            self._engine.dispose()
+            self._memory.close()
+        elif self.pooled:
+            ENGINE_REGISTRY.dispose(self.path)
+        else:
+            self._engine.dispose()
+
+    def load(self, path=None):
+        """
+        Copies the file into the in-memory database, replacing
+        what was in memory.
+
+        Args:
+            path (pathlib.Path): the file to load, defaults to
+                the path this was made with
+        """
+        if not self.in_memory:
+            raise RuntimeError("Can only load a file into an in-memory database.")
+        path = self.path if path is None else path
+        start = time.perf_counter()
+        copy_database(str(path), self._memory)
+        LOG.info(f"Loaded {path} into memory in {time.perf_counter() - start:.2f} s.")
+
+    def persist(self, path=None):
+        """
+        Copies the in-memory database to a file with copy_database.
+        The copy is made next to the file and then moved over it, so the
+        file is never left half written.
+
+        Args:
+            path (pathlib.Path): where to write the database, defaults to
+                the path this was made with
+        """
+        if not self.in_memory:
+            raise RuntimeError("Only an in-memory database needs to be persisted.")
+        path = self.path if path is None else path
+        start = time.perf_counter()
+        temporary = path.parent / f".{path.name}.{uuid.uuid4().hex}.tmp"
+        try:
+            target = sqlite3.connect(str(temporary), uri=True)
+            try:
+                copy_database(self._memory_uri, target)
+            finally:
+                target.close()
+            os.replace(temporary, path)
+        finally:
+            if temporary.exists():
+                temporary.unlink()
+        LOG.info(f"Persisted the in-memory database to {path} in {time.perf_counter() - start:.2f} s.")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _own_table_definition(self, table_name):
+        """
+        This file's copy of a table definition, made the first time it's
+        needed, for adding columns to.
+        """
+        own = self._table_definitions.maps[0]
+        if table_name not in own:
+            own[table_name] = self._table_definitions[table_name].to_metadata(MetaData())
+        return own[table_name]
 
     def create_tables(self, tables=None):
         """
@@ -93,7 +435,7 @@ class DismodSQLite:
         Updates the table columns with additional columns like
         c_ which are comments and x_ which are covariates.
         """
-        table_definition = self._table_definitions[table_name]
+        table_definition = self._own_table_definition(table_name)
         new_columns = table.columns.difference(table_definition.c.keys())
         new_column_types = {c: table.dtypes[c] for c in new_columns}
 
@@ -115,11 +457,329 @@ class DismodSQLite:
 
         add_columns_to_table(table_definition, new_column_types)
 
-    def read_table(self, table_name):
+    def read_table(self, table_name, columns=None, where=None):
         """
         Read a table from the database in engine specified.
+
+        Asking for some columns, or for rows that match filters, reads only
+        those from the file. Filters are described in :func:`where_clause`.
+
+        >>> dm.read_table('avgint', columns=['avgint_id'], where={'c_location_id': 70})
+        >>> dm.read_table('predict', where={'avgint_id': [0, 1, 2]})
+        >>> dm.read_table('data', where={'age_lower': slice(0, 5)})
+
+        Parameters:
+            table_name (str): the table to read
+            columns (List[str]): the columns to read, or None for all of them
+            where (dict): filters on the rows to read, by column name
+        """
+        if self.typed_read:
+            return self._typed_read(table_name, columns=columns, where=where)
+        table = pd.read_sql_table(table_name=table_name, con=self.engine)
+        if columns is None and not where:
+            return table
+        return filter_table(table, columns=columns, where=where)
+
+    def table_names(self):
+        """
+        The tables that are in the database, which aren't all of the tables
+        in the metadata until Dismod-AT has made its output tables.
+
+        :return: (List[str])
+        """
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            names = [row[0] for row in cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name"
+            )]
+            cursor.close()
+        finally:
+            connection.close()
+        return names
+
+    def create_indexes(self, indexes=None):
+        """
+        Adds indexes to the file, so that reading the rows for one location,
+        sex or integrand doesn't scan the whole table. Columns that a table
+        doesn't have are skipped. Writing a table again drops its indexes.
+
+        Parameters:
+            indexes (Dict[str, List[str]]): columns to index by table name,
+                defaults to LOOKUP_INDEXES
+        """
+        indexes = LOOKUP_INDEXES if indexes is None else indexes
+        quote = self.engine.dialect.identifier_preparer.quote
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            for table_name, columns in indexes.items():
+                info = cursor.execute(f"PRAGMA table_info({quote(table_name)})").fetchall()
+                present = {column[1] for column in info}
+                for column in columns:
+                    if column not in present:
+                        continue
+                    LOG.debug(f"Indexing {table_name}.{column}.")
+                    cursor.execute(
+                        f"CREATE INDEX IF NOT EXISTS {quote(f'ix_{table_name}_{column}')} "
+                        f"ON {quote(table_name)} ({quote(column)})"
+                    )
+            connection.commit()
+            cursor.close()
+        finally:
+            connection.close()
+
+    def _column_type(self, table_name, column_name, declared_type):
+        """
+        The Python type of a column, from the table metadata if the column
+        is there, otherwise from the type it was declared with in the file.
+        Returns None if neither says.
+        """
+        table_definition = self._table_definitions.get(table_name)
+        if table_definition is not None and column_name in table_definition.c:
+            return self._expected_type(table_definition.c[column_name])
+        return DECLARED_TYPES.get(declared_type.split(' ')[0].lower())
+
+    def _not_null(self, table_name, info):
+        """
+        Whether a column can't have nulls, from the table metadata if the
+        column is there, otherwise from the table in the file. Takes the row
+        for the column from PRAGMA table_info.
+        """
+        _, column_name, _, notnull, _, primary_key = info
+        table_definition = self._table_definitions.get(table_name)
+        if table_definition is not None and column_name in table_definition.c:
+            column = table_definition.c[column_name]
+            return not column.nullable or column.primary_key
+        return bool(notnull or primary_key)
+
+    @staticmethod
+    def _fill_column(array, start, stop, values):
+        """
+        Puts values from the cursor into rows start to stop of a column.
+        Nulls become NaN in numeric columns and None in text columns, like
+        read_sql_table, so an integer column with nulls or with REAL values
+        stored in it is changed to float. Returns the column, which is a new
+        array if its type had to change.
+        """
+        if array.dtype == np.int64:
+            # Converting to int64 would truncate REAL values rather than fail.
+            if all(type(v) is int for v in values):
+                try:
+                    array[start:stop] = np.array(values, dtype=np.int64)
+                    return array
+                except OverflowError:
+                    pass
+            array = array.astype(float)
+        if array.dtype == np.float64:
+            try:
+                array[start:stop] = np.array(values, dtype=np.float64)
+                return array
+            except (TypeError, ValueError, OverflowError):
+                array = array.astype(object)
+        array[start:stop] = values
+        return array
+
+    def _plan_read(self, cursor, table_name, columns=None, where=None):
+        """
+        Works out the columns, their types, and the filter SQL for reading
+        a table, from the table as it is in the file.
+
+        Returns:
+            SimpleNamespace with names (the columns to read), types (their
+            Python types), notnull (whether each is declared not null),
+            selected (the columns to return), condition and parameters (the
+            filter SQL and its parameters) and unbound (filters that have to
+            be applied after reading)
+        """
+        quote = self.engine.dialect.identifier_preparer.quote
+        info = cursor.execute(f"PRAGMA table_info({quote(table_name)})").fetchall()
+        if not info:
+            raise ValueError(f"Table {table_name} not found")
+        declared = {column[1]: column for column in info}
+        selected = list(declared) if columns is None else list(columns)
+        missing = [name for name in selected + list(where or dict()) if name not in declared]
+        if missing:
+            raise ValueError(f"Table {table_name} has no columns {missing}")
+        condition, parameters, unbound = where_clause(where, quote)
+        names = selected + [name for name in unbound if name not in selected]
+        return SimpleNamespace(
+            names=names,
+            types=[self._column_type(table_name, name, declared[name][2]) for name in names],
+            notnull=[self._not_null(table_name, declared[name]) for name in names],
+            selected=selected,
+            condition=condition,
+            parameters=parameters,
+            unbound=unbound,
+        )
+
+    def _fill_chunk(self, arrays, start, rows):
         """
-        return pd.read_sql_table(table_name=table_name, con=self.engine)
+        Puts a chunk of rows from the cursor into the arrays, starting
+        at row start. Returns the arrays, some of which may be new arrays
+        if their types had to change for nulls.
+        """
+        stop = start + len(rows)
+        # Converting the whole chunk at once is fastest, and works whenever
+        # there are no nulls in the numeric columns. SQLite lets an integer
+        # column hold REAL values, which the conversion would truncate, so
+        # those columns have to hold only integers.
+        whole = all(
+            set(map(type, map(itemgetter(i), rows))) == {int}
+            for i, array in enumerate(arrays) if array.dtype == np.int64
+        )
+        if whole:
+            try:
+                chunk = np.array(rows, dtype=[(f'f{i}', a.dtype) for i, a in enumerate(arrays)])
+                for i, array in enumerate(arrays):
+                    array[start:stop] = chunk[f'f{i}']
+            except (TypeError, ValueError, OverflowError):
+                whole = False
+        if not whole:
+            for i, values in enumerate(zip(*rows)):
+                arrays[i] = self._fill_column(arrays[i], start, stop, values)
+        return arrays
+
+    @staticmethod
+    def _frame(plan, arrays, n_rows):
+        # An empty read_sql_table frame has an empty object index.
+        index = None if n_rows else pd.Index([], dtype=object)
+        df = pd.DataFrame(dict(zip(plan.names, arrays)), columns=plan.names, index=index)
+        untyped = [name for name, t in zip(plan.names, plan.types) if t is None]
+        if untyped:
+            df[untyped] = df[untyped].infer_objects()
+        if plan.unbound:
+            # These were read as a range, so take out the rows in the gaps.
+            df = filter_table(df, columns=plan.selected, where=plan.unbound)
+        return df
+
+    def _typed_read(self, table_name, columns=None, where=None):
+        """
+        Reads a table into arrays that are allocated up front with the types
+        from the table metadata, fetching the rows in chunks from a sqlite3
+        cursor. This skips reflecting the schema and inferring types.
+
+        Parameters:
+            table_name (str): the table to read
+            columns (List[str]): the columns to read, or None for all of them
+            where (dict): filters on the rows to read, by column name
+        """
+        quote = self.engine.dialect.identifier_preparer.quote
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            # The count and the rows come from the same read transaction.
+            cursor.execute("BEGIN")
+            plan = self._plan_read(cursor, table_name, columns=columns, where=where)
+            n_rows = cursor.execute(
+                f"SELECT count(*) FROM {quote(table_name)}{plan.condition}", plan.parameters
+            ).fetchone()[0]
+            arrays = [
+                np.empty(n_rows, dtype={int: np.int64, float: np.float64}.get(t, object))
+                for t in plan.types
+            ]
+
+            cursor.execute(
+                f"SELECT {', '.join(quote(n) for n in plan.names)} FROM {quote(table_name)}{plan.condition}",
+                plan.parameters
+            )
+            start = 0
+            while True:
+                rows = cursor.fetchmany(READ_CHUNK_ROWS)
+                if not rows:
+                    break
+                arrays = self._fill_chunk(arrays, start, rows)
+                start += len(rows)
+            connection.rollback()
+            cursor.close()
+        finally:
+            connection.close()
+        return self._frame(plan, arrays, n_rows)
+
+    def iter_table(self, table_name, chunk_rows=READ_CHUNK_ROWS, group_by=None, columns=None, where=None):
+        """
+        Reads a table a chunk at a time, so that tables like sample, predict
+        and data_sim can be processed in memory that doesn't grow with the
+        number of draws.
+
+        Every chunk has the same column types. They come from the table
+        metadata, except that integer columns which may be null are always
+        floats, whether or not a chunk has nulls in it.
+
+        With group_by, the rows are read in order of that column, and every
+        chunk holds whole groups, e.g. all of the rows for some values of
+        sample_index. A chunk can be bigger than chunk_rows if a single
+        group is.
+
+        >>> for chunk in dm.iter_table('sample', group_by='sample_index'):
+        >>>     ...
+
+        Parameters:
+            table_name (str): the table to read
+            chunk_rows (int): number of rows in each chunk
+            group_by (str): column whose groups shouldn't be split between
+                chunks. It's read even if it's not in columns.
+            columns (List[str]): the columns to read, or None for all of them
+            where (dict): filters on the rows to read, by column name
+
+        Yields:
+            pd.DataFrame with a default index
+        """
+        if group_by is not None and columns is not None and group_by not in columns:
+            columns = list(columns) + [group_by]
+        chunks = self._iter_chunks(table_name, chunk_rows=chunk_rows, order_by=group_by,
+                                   columns=columns, where=where)
+        if group_by is None:
+            yield from chunks
+            return
+
+        pending = None
+        for chunk in chunks:
+            if pending is not None:
+                chunk = pd.concat([pending, chunk], ignore_index=True)
+            # The last group in the chunk may go on in the next one.
+            complete = chunk[group_by].values != chunk[group_by].values[-1]
+            if complete.any():
+                yield chunk.loc[complete].reset_index(drop=True)
+                pending = chunk.loc[~complete].reset_index(drop=True)
+            else:
+                pending = chunk
+        if pending is not None:
+            yield pending
+
+    def _iter_chunks(self, table_name, chunk_rows, order_by=None, columns=None, where=None):
+        quote = self.engine.dialect.identifier_preparer.quote
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            # All of the chunks come from the same read transaction.
+            cursor.execute("BEGIN")
+            plan = self._plan_read(cursor, table_name, columns=columns, where=where)
+            dtypes = [
+                np.int64 if t is int and notnull else np.float64 if t in (int, float) else object
+                for t, notnull in zip(plan.types, plan.notnull)
+            ]
+            order = ""
+            if order_by is not None:
+                order = f" ORDER BY {quote(order_by)}, rowid"
+            cursor.execute(
+                f"SELECT {', '.join(quote(n) for n in plan.names)} "
+                f"FROM {quote(table_name)}{plan.condition}{order}",
+                plan.parameters
+            )
+            while True:
+                rows = cursor.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                arrays = [np.empty(len(rows), dtype=dtype) for dtype in dtypes]
+                arrays = self._fill_chunk(arrays, 0, rows)
+                chunk = self._frame(plan, arrays, len(rows))
+                if len(chunk):
+                    yield chunk
+            connection.rollback()
+            cursor.close()
+        finally:
+            connection.close()
 
     def write_table(self, table_name, table):
         """
@@ -134,6 +794,7 @@ class DismodSQLite:
         extra_columns = set(table.columns.difference(table_definition.c.keys()))
         if extra_columns:
             self.update_table_columns(table_name, table)
+            table_definition = self._table_definitions[table_name]
 
         # Force the table to have the dismod-required columns
         dtypes = {k: v.type for k, v in table_definition.c.items()}
@@ -142,13 +803,22 @@ class DismodSQLite:
             table[id_column] = table.reset_index(drop=True).index
         table = pd.DataFrame(table, columns = dtypes.keys())
 
-        self._validate_data(table_definition, table)
+        if self.validate != 'off':
+            start = time.perf_counter()
+            self._validate_data(table_definition, table, mode=self.validate)
+            seconds = time.perf_counter() - start
+            self.validation_seconds[table_name] += seconds
+            LOG.debug(f"Validated table {table_name} ({self.validate}) in {seconds:.3f} s")
 
         try:
             table = table.set_index(id_column)
             table.index = table.index.astype(np.int64)
         except ValueError as ve:
             raise ValueError(f"Cannot convert {table_name}.{table_name}_id to index") from ve
+        if self.bulk_write:
+            LOG.debug(f"Bulk writing table {table_name} rows {len(table)}")
+            self._bulk_write(table_name, id_column, table)
+            return
         try:
             LOG.debug(f"Writing table {table_name} rows {len(table)} types {dtypes}")
             table.index.name = None
@@ -159,9 +829,120 @@ class DismodSQLite:
                 if_exists="replace",
                 dtype=dtypes
             )
+            self._built_tables.add(table_name)
         except StatementError:
             raise
 
+    def write_pragmas(self, table_name):
+        """
+        The pragmas to write a table with. A file that only has tables that
+        this wrote, or that it started from, like a template, is being built
+        from the inputs, so it's written with BULK_WRITE_PRAGMAS. Any other
+        file, like one that dmdismod has written results to, keeps sqlite's
+        default journal and sync.
+
+        Parameters:
+            table_name (str): the table that's about to be written
+
+        Returns:
+            Dict[str, str]
+        """
+        if set(self.table_names()) <= self._built_tables | {table_name}:
+            return BULK_WRITE_PRAGMAS
+        return dict()
+
+    def mark_built(self, tables):
+        """
+        Counts tables that were copied into the file, like from a
+        template, as built by this, see write_pragmas.
+        """
+        self._built_tables.update(tables)
+
+    def _create_statements(self, table_name, id_column, columns):
+        """
+        Makes the statements that replace a table, matching what to_sql
+        makes from the table metadata: the id column as an integer
+        primary key, the other columns with the types from the metadata,
+        and an index on the id column.
+        """
+        definition = self._table_definitions[table_name]
+        quote = self.engine.dialect.identifier_preparer.quote
+        column_specs = [f"{quote(id_column)} integer primary key"] + [
+            f"{quote(c)} {definition.c[c].type.compile(dialect=self.engine.dialect)}"
+            for c in columns
+        ]
+        return [
+            f"DROP TABLE IF EXISTS {quote(table_name)}",
+            f"CREATE TABLE {quote(table_name)} (\n\t" + ", \n\t".join(column_specs) + "\n)",
+            f"CREATE INDEX {quote(f'ix_{table_name}_{id_column}')} "
+            f"ON {quote(table_name)} ({quote(id_column)})"
+        ]
+
+    @staticmethod
+    def _rows(table):
+        """
+        Converts a table with the id as its index to a list of row tuples
+        of plain Python values, with None for missing values.
+        """
+        columns = [table.index.to_series()] + [table[c] for c in table.columns]
+        values = list()
+        for column in columns:
+            missing = column.isna()
+            if missing.any():
+                values.append(column.astype(object).where(~missing, None).tolist())
+            else:
+                values.append(column.tolist())
+        return list(zip(*values))
+
+    def _bulk_write(self, table_name, id_column, table):
+        """
+        Replaces a table in one transaction: drop, create from the metadata,
+        and executemany on the rows.
+
+        Parameters:
+            table_name (str): the name of the table to write to
+            id_column (str): the name of the primary key column
+            table (pd.DataFrame): validated data frame indexed by the id
+        """
+        statements = self._create_statements(table_name, id_column, list(table.columns))
+        quote = self.engine.dialect.identifier_preparer.quote
+        insert = (
+            f"INSERT INTO {quote(table_name)} "
+            f"({', '.join(quote(c) for c in [id_column] + list(table.columns))}) "
+            f"VALUES ({', '.join('?' * (len(table.columns) + 1))})"
+        )
+        rows = self._rows(table)
+        pragmas = self.write_pragmas(table_name)
+
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            previous = {
+                pragma: cursor.execute(f"PRAGMA {pragma}").fetchone()[0]
+                for pragma in pragmas
+            }
+            for pragma, value in pragmas.items():
+                cursor.execute(f"PRAGMA {pragma} = {value}")
+            try:
+                cursor.execute("BEGIN")
+                drop_table, create_table, create_index = statements
+                cursor.execute(drop_table)
+                cursor.execute(create_table)
+                cursor.executemany(insert, rows)
+                # Building the index after the inserts is faster than updating it row by row.
+                cursor.execute(create_index)
+                connection.commit()
+                self._built_tables.add(table_name)
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                for pragma, value in previous.items():
+                    cursor.execute(f"PRAGMA {pragma} = {value}")
+                cursor.close()
+        finally:
+            connection.close()
+
     def empty_table(self, table_name, extra_columns=None):
         """
         Initializes an empty table for table_name.
@@ -175,9 +956,28 @@ class DismodSQLite:
             df = pd.concat([df, extras], axis=1)
         return df
 
-    def _validate_data(self, table_definition, data):
+    def validation_report(self):
+        """
+        Logs and returns the time spent validating each table written
+        through this object.
+
+        :return: (pd.DataFrame) with columns table_name, mode, seconds
+        """
+        names = sorted(self.validation_seconds)
+        df = pd.DataFrame({
+            'table_name': names,
+            'mode': self.validate,
+            'seconds': [self.validation_seconds[n] for n in names]
+        }, columns=['table_name', 'mode', 'seconds'])
+        LOG.info(f"Validating tables in {self.path} ({self.validate}) took {df.seconds.sum():.2f} s.")
+        for row in df.itertuples():
+            LOG.info(f"  {row.table_name}: {row.seconds:.3f} s.")
+        return df
+
+    def _validate_data(self, table_definition, data, mode='full'):
         """Validates that the dtypes in data match the expected types in the
-        table_definition.
+        table_definition. With mode 'schema-only', nulls are only filled in
+        numeric columns stored as objects, and other columns aren't copied.
         Pandas makes this difficult because DataFrames with no length have
         Object type, and those with nulls become float type.
 
@@ -201,7 +1001,7 @@ class DismodSQLite:
                 expected_type = self._expected_type(column_definition)
                 is_nullable_numeric = (column_definition.nullable and
                                        expected_type in [int, float])
-                if is_nullable_numeric:
+                if is_nullable_numeric and (mode == 'full' or data[column_name].dtype == np.dtype('O')):
                     data[column_name] = data[column_name].fillna(value=np.nan)
                 actual_type = data[column_name].dtype
                 is_pandas_extension = isinstance(actual_type, ExtensionDtype)
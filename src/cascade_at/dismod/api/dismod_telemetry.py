@@ -0,0 +1,169 @@
+"""
+Records the resources that each dmdismod command used, so that cluster
+requests can be sized from what the commands have needed before rather
+than from a guess.
+
+Every command that's run with a telemetry file appends one row to it,
+with the wall time, CPU time and peak resident memory of the dmdismod
+process, the size of the database before and after the command, and
+the number of data rows and model variables in the database.
+
+>>> from cascade_at.dismod.api.dismod_telemetry import read_telemetry, summarize_telemetry
+>>> summarize_telemetry(read_telemetry(context.telemetry_file))
+"""
+import os
+import socket
+import sqlite3
+import sys
+from datetime import datetime
+
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from cascade_at.core.log import get_loggers
+
+LOG = get_loggers(__name__)
+
+TELEMETRY_COLUMNS = [
+    'timestamp', 'host', 'dm_file', 'command', 'exit_status', 'seconds', 'cpu_seconds',
+    'max_rss_mb', 'size_before_mb', 'size_after_mb', 'data_rows', 'vars'
+]
+"""The columns of a telemetry file."""
+
+
+def rusage_max_rss_mb(rusage):
+    """
+    The peak resident memory from a resource usage, in megabytes.
+    Linux reports it in kilobytes and macOS in bytes.
+
+    :param rusage: (resource.struct_rusage)
+    :return: (float)
+    """
+    if sys.platform == 'darwin':
+        return rusage.ru_maxrss / 2 ** 20
+    return rusage.ru_maxrss / 2 ** 10
+
+
+def file_size_mb(path):
+    """
+    :param path: (str) a file
+    :return: (float) its size in megabytes, or None if there's no file
+    """
+    try:
+        return os.stat(path).st_size / 2 ** 20
+    except FileNotFoundError:
+        return None
+
+
+def count_rows(dm_file, table_name):
+    """
+    Counts the rows of a table in a dismod file without taking a write lock.
+
+    :param dm_file: (str) the dismod db filepath
+    :param table_name: (str) the table to count
+    :return: (int) the number of rows, or None if there's no such table
+    """
+    if not os.path.exists(dm_file):
+        return None
+    connection = sqlite3.connect(f"file:{dm_file}?mode=ro", uri=True)
+    try:
+        return connection.execute(f'SELECT count(*) FROM "{table_name}"').fetchone()[0]
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        connection.close()
+
+
+def command_telemetry(dm_file, command, info, size_before_mb):
+    """
+    The telemetry row for a command that has run.
+
+    :param dm_file: (str) the dismod db filepath
+    :param command: (str) the command
+    :param info: (SimpleNamespace) the run_dismod info for the command
+    :param size_before_mb: (float) the size of the file before the command
+    :return: (Dict) values by column in TELEMETRY_COLUMNS
+    """
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'host': socket.gethostname(),
+        'dm_file': str(dm_file),
+        'command': command,
+        'exit_status': info.exit_status,
+        'seconds': info.seconds,
+        'cpu_seconds': info.cpu_seconds,
+        'max_rss_mb': info.max_rss_mb,
+        'size_before_mb': size_before_mb,
+        'size_after_mb': file_size_mb(dm_file),
+        'data_rows': count_rows(dm_file, 'data'),
+        'vars': count_rows(dm_file, 'var'),
+    }
+
+
+def _format(value):
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        return f"{value:.6g}"
+    value = str(value)
+    if any(c in value for c in ',"\n'):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+def append_telemetry(path, row):
+    """
+    Appends a row to a telemetry file, writing the header if the file is
+    new. The file is locked while the row is written, because jobs for
+    every database of a model version append to the same file.
+
+    :param path: (pathlib.Path) the telemetry file
+    :param row: (Dict) values by column in TELEMETRY_COLUMNS
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    line = ','.join(_format(row.get(c)) for c in TELEMETRY_COLUMNS) + '\n'
+    with open(path, 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            if f.tell() == 0:
+                line = ','.join(TELEMETRY_COLUMNS) + '\n' + line
+            f.write(line)
+            f.flush()
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def read_telemetry(path):
+    """
+    :param path: (pathlib.Path) a telemetry file
+    :return: (pd.DataFrame) with the columns in TELEMETRY_COLUMNS
+    """
+    return pd.read_csv(path, parse_dates=['timestamp'])
+
+
+def summarize_telemetry(telemetry):
+    """
+    The most time and memory that each kind of command has needed,
+    by its first word, so 'fit both' and 'fit fixed' are both 'fit'.
+    Only commands that succeeded count.
+
+    :param telemetry: (pd.DataFrame) from read_telemetry
+    :return: (pd.DataFrame) with the number of runs and the largest
+        seconds, cpu_seconds, max_rss_mb and size_after_mb for each command
+    """
+    succeeded = telemetry.loc[telemetry.exit_status == 0]
+    kind = succeeded.command.str.split().str[0].rename('command')
+    summary = succeeded.groupby(kind).agg(
+        runs=('seconds', 'size'),
+        seconds=('seconds', 'max'),
+        cpu_seconds=('cpu_seconds', 'max'),
+        max_rss_mb=('max_rss_mb', 'max'),
+        size_after_mb=('size_after_mb', 'max'),
+    )
+    return summary.reset_index()
@@ -0,0 +1,145 @@
+"""
+Shares SQLAlchemy engines for Dismod-AT files across the process.
+
+Making an engine for every DismodIO object adds up when a job touches
+hundreds of databases, as mulcov statistics and sample simulate do.
+The registry keeps one engine per file path, each with a small pool of
+sqlite3 connections that are reused between reads and writes.
+
+An engine is replaced when the file at its path is replaced, for
+instance by a copy or a move, so a pooled connection never reads
+a file that has been deleted out from under it. A process that is forked,
+as by a multiprocessing pool, starts with no engines rather than sharing
+its parent's connections.
+
+>>> from cascade_at.dismod.api.engine_registry import ENGINE_REGISTRY
+>>> engine = ENGINE_REGISTRY.engine(path)
+>>> ENGINE_REGISTRY.dispose(path)  # close the pooled connections to one file
+>>> ENGINE_REGISTRY.dispose()  # close all of them
+"""
+import os
+from collections import OrderedDict
+from threading import Lock
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
+
+from cascade_at.core.log import get_loggers
+
+LOG = get_loggers(__name__)
+
+MAX_ENGINES = 256
+"""
+Number of files to keep engines for, each with an open file handle
+while it has an idle connection. The least recently used engine
+is disposed when there are more, which closes its idle connections.
+"""
+
+POOL_SIZE = 1
+"""
+Idle connections to keep for each file. More are opened when they're
+needed at the same time, like while a table is read a chunk at a time,
+and closed when they're returned.
+"""
+
+
+def _inode(key):
+    try:
+        return os.stat(key).st_ino
+    except FileNotFoundError:
+        return None
+
+
+class EngineRegistry:
+    def __init__(self, max_engines=MAX_ENGINES, pool_size=POOL_SIZE):
+        """
+        Keeps one engine with a pool of connections for each Dismod-AT file.
+
+        :param max_engines: (int) the most files to keep engines for
+        :param pool_size: (int) idle connections to keep for each file
+        """
+        self.max_engines = max_engines
+        self.pool_size = pool_size
+        # Engines by file path, least recently used first, with the inode
+        # of the file that the engine was made for.
+        self._engines = OrderedDict()
+        self._lock = Lock()
+        self._pid = os.getpid()
+
+    @staticmethod
+    def key(path):
+        """
+        :param path: (pathlib.Path) a Dismod-AT file
+        :return: (str) the absolute path that engines are kept by
+        """
+        return str(path.expanduser().absolute())
+
+    def __contains__(self, path):
+        return self.key(path) in self._engines
+
+    def __len__(self):
+        return len(self._engines)
+
+    def engine(self, path):
+        """
+        Gets the engine for a file, making one if there isn't one
+        or if the file has been replaced since it was made.
+
+        :param path: (pathlib.Path) a Dismod-AT file
+        :return: (sqlalchemy.engine.Engine)
+        """
+        key = self.key(path)
+        inode = _inode(key)
+        if self._pid != os.getpid():
+            # The connections belong to the parent process, so leave them be.
+            self._engines = OrderedDict()
+            self._lock = Lock()
+            self._pid = os.getpid()
+        with self._lock:
+            found = self._engines.get(key)
+            if found is not None:
+                engine, engine_inode = found
+                if engine_inode is None or engine_inode == inode:
+                    # The file may have been made since the engine was.
+                    self._engines[key] = (engine, inode)
+                    self._engines.move_to_end(key)
+                    return engine
+                LOG.debug(f"{key} was replaced, disposing of its engine.")
+                engine.dispose()
+            LOG.debug(f"Creating an engine at {key}.")
+            engine = create_engine(
+                f"sqlite:///{key}",
+                poolclass=QueuePool,
+                pool_size=self.pool_size,
+                max_overflow=-1,
+                # Connections go back to the pool, so the next thread to
+                # take one may not be the one that opened it.
+                connect_args={'check_same_thread': False}
+            )
+            self._engines[key] = (engine, inode)
+            while len(self._engines) > self.max_engines:
+                _, (oldest, _) = self._engines.popitem(last=False)
+                oldest.dispose()
+            return engine
+
+    def dispose(self, path=None):
+        """
+        Closes the pooled connections and forgets the engines, for one file
+        or for all of them. Connections that are in use are closed when
+        they're returned.
+
+        :param path: (pathlib.Path) a Dismod-AT file, or None for all files
+        """
+        with self._lock:
+            if path is None:
+                engines = list(self._engines.values())
+                self._engines.clear()
+            else:
+                found = self._engines.pop(self.key(path), None)
+                engines = [found] if found is not None else []
+        for engine, _ in engines:
+            engine.dispose()
+
+
+ENGINE_REGISTRY = EngineRegistry()
+"""The engines for Dismod-AT files in this process."""
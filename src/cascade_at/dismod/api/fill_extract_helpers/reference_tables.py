@@ -69,16 +69,21 @@ def construct_age_time_table(variable_name, variable, data_min=None, data_max=No
     return df
 
 
-def construct_node_table(location_dag):
+def construct_node_table(location_dag, location_ids=None):
     """
     Constructs the node table from a location
     DAG's to_dataframe() method.
 
     Parameters:
         location_dag: (cascade_at.inputs.locations.LocationDAG)
+        location_ids: (optional list of int) only make nodes for these
+            locations, e.g. a parent and its descendants. A location whose
+            parent isn't in the list gets a null parent.
     """
     LOG.info("Constructing node table.")
     node = location_dag.to_dataframe()
+    if location_ids is not None:
+        node = node.loc[node.location_id.isin(location_ids)]
     node = node.reset_index(drop=True)
     node["node_id"] = node.index
     p_node = node[["node_id", "location_id"]].rename(
@@ -1,33 +1,295 @@
+import os
+import re
+import shlex
+import signal
 import subprocess
 import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from threading import Event, Lock, Thread
+from time import perf_counter, sleep, time
 from types import SimpleNamespace
+
+import pandas as pd
+
 from cascade_at.core.log import get_loggers
+from cascade_at.dismod.api.command_markers import (
+    clear_markers, completed_commands, mark_completed, sequence_key
+)
+from cascade_at.dismod.api.dismod_io import DismodIO
+from cascade_at.dismod.api.dismod_telemetry import (
+    append_telemetry, command_telemetry, file_size_mb, rusage_max_rss_mb
+)
 
 LOG = get_loggers(__name__)
 
+OUTPUT_LINES = 1000
+"""
+How many of the last lines of stdout and stderr to keep for the command's
+info. Every line is logged as it comes, so none of the output is lost,
+but a fit with a high print_level can write far more than is worth
+holding in memory.
+"""
+
+_NUMBER = r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?"
+IPOPT_ITERATION = re.compile(
+    rf"^\s*(?P<iteration>\d+)(?P<restoration>r?)\s+(?P<objective>{_NUMBER})"
+    rf"\s+(?P<inf_pr>{_NUMBER})\s+(?P<inf_du>{_NUMBER})\s+(?:{_NUMBER}|-)\s"
+)
+"""An iteration line of Ipopt's output, up to lg(mu)."""
+
+TERMINATE_SECONDS = 30
+"""
+How long a dmdismod process that's over its time limit is given to exit
+after it's asked to terminate, before it's killed.
+"""
+
+REAP_POLL_SECONDS = 0.05
+"""
+How often to check whether a dmdismod process has exited, where there's
+no os.waitid to wait for it without reaping it.
+"""
 
-def run_dismod(dm_file, command):
+TIMED_OUT_EXIT_STATUS = 124
+"""
+The exit status of a job whose last command timed out, if dmdismod exited
+with 0 after it was terminated, as timeout(1) reports it.
+"""
+
+PROGRESS_COLUMNS = ['command', 'iteration', 'restoration', 'objective', 'inf_pr', 'inf_du', 'seconds']
+"""The columns of a progress file."""
+
+
+def parse_ipopt_iteration(line):
     """
-    Runs a command on a dismod file.
+    Parses a line of Ipopt's iteration output, like
+
+        iter    objective    inf_pr   inf_du lg(mu)  ||d||  lg(rg) alpha_du alpha_pr  ls
+           3  1.2345678e+02 1.00e-03 2.50e+01  -1.0 4.00e-01    -  1.00e+00 1.00e+00f  1
+
+    :param line: (str) a line of dmdismod's output
+    :return: (Dict) with the iteration, whether it's a restoration
+        iteration, the objective, and the primal and dual infeasibilities,
+        or None if the line isn't an iteration line
+    """
+    match = IPOPT_ITERATION.match(line)
+    if match is None:
+        return None
+    return {
+        'iteration': int(match.group('iteration')),
+        'restoration': match.group('restoration') == 'r',
+        'objective': float(match.group('objective')),
+        'inf_pr': float(match.group('inf_pr')),
+        'inf_du': float(match.group('inf_du')),
+    }
+
+
+def progress_file(dm_file):
+    """
+    The file that the progress of commands on a dismod file is written
+    to, next to it.
+
     :param dm_file: (str) the dismod db filepath
-    :param command: (str) a command to run
-    :return:
+    :return: (pathlib.Path)
+    """
+    return Path(dm_file).with_suffix('.progress.csv')
+
+
+class _ProgressWriter:
+    """
+    Appends iterations to a progress file, one line each, flushed as they
+    come so the file can be watched while a fit runs.
+    """
+    def __init__(self, path):
+        new = not path.exists()
+        self.file = open(path, 'a')
+        if new:
+            self.file.write(','.join(PROGRESS_COLUMNS) + '\n')
+            self.file.flush()
+
+    def __call__(self, record):
+        self.file.write(','.join(str(getattr(record, c)) for c in PROGRESS_COLUMNS) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def _read_lines(stream, name, lines, dm_file, on_line=None):
+    for line in stream:
+        line = line.rstrip('\n')
+        LOG.info(f"{dm_file} {name}: {line}")
+        lines.append(line)
+        if on_line is not None:
+            on_line(line)
+
+
+class _Reaper:
+    """
+    Waits for a process, and signals it for the watchdog, sharing a lock
+    so that the process is never signalled after it's been reaped, when
+    its pid could already belong to another process. Popen.terminate
+    and Popen.kill aren't used, because they poll the process, which can
+    reap it out from under os.wait4.
+    """
+    def __init__(self, process):
+        self.process = process
+        self.lock = Lock()
+        self.reaped = False
+
+    def signal(self, signal_number):
+        """
+        Sends a signal to the process, unless it's been reaped.
+        """
+        with self.lock:
+            if not self.reaped:
+                os.kill(self.process.pid, signal_number)
+
+    def wait(self):
+        """
+        Waits for the process and gets the resources it used. Where there's
+        no os.wait4, only the exit status is known.
+
+        :return: (Tuple[float, float]) CPU seconds and peak resident memory
+            in megabytes, or Nones
+        """
+        if not hasattr(os, 'wait4'):
+            self.process.wait()
+            with self.lock:
+                self.reaped = True
+            return None, None
+        if hasattr(os, 'waitid'):
+            # Waits for it to exit but leaves it to be reaped below,
+            # so that the lock isn't held while it runs.
+            os.waitid(os.P_PID, self.process.pid, os.WEXITED | os.WNOWAIT)
+        while True:
+            with self.lock:
+                pid, status, rusage = os.wait4(self.process.pid, os.WNOHANG)
+                if pid:
+                    self.reaped = True
+                    break
+            sleep(REAP_POLL_SECONDS)
+        # The process has been reaped, so tell Popen its exit status
+        # rather than have it wait for it again.
+        if os.WIFSIGNALED(status):
+            self.process.returncode = -os.WTERMSIG(status)
+        else:
+            self.process.returncode = os.WEXITSTATUS(status)
+        return rusage.ru_utime + rusage.ru_stime, rusage_max_rss_mb(rusage)
+
+
+def _watchdog(reaper, timeout, finished, info):
+    """
+    Terminates a process that's still running after the timeout,
+    and kills it if it doesn't exit after that.
+    """
+    if finished.wait(timeout):
+        return
+    arguments = ' '.join(reaper.process.args)
+    LOG.warning(f"{arguments} ran for more than {timeout} seconds, terminating it.")
+    info.timed_out = True
+    reaper.signal(signal.SIGTERM)
+    if not finished.wait(TERMINATE_SECONDS):
+        LOG.warning(f"{arguments} didn't exit after terminating it, killing it.")
+        reaper.signal(getattr(signal, 'SIGKILL', signal.SIGTERM))
+
+
+def run_dismod(dm_file, command, progress=None, write_progress=False, telemetry_file=None, timeout=None):
     """
-    command = ["dmdismod", str(dm_file), command]
-    command = ' '.join(command)
-    LOG.info(f"Running {command}...")
+    Runs a command on a dismod file. The output is logged a line at a time
+    as dmdismod writes it, and Ipopt's iteration lines are passed to the
+    progress callback as they come.
 
-    process = subprocess.run(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    :param dm_file: (str) the dismod db filepath
+    :param command: (str) a command to run
+    :param progress: (callable) optional function that's called with a
+        SimpleNamespace for each Ipopt iteration, with the dm_file, the
+        command, the seconds since the command started and the fields
+        from parse_ipopt_iteration
+    :param write_progress: (bool) also append the iterations to the
+        progress_file next to the dismod file
+    :param telemetry_file: (pathlib.Path) optional file to append the
+        resources the command used to, see dismod_telemetry
+    :param timeout: (float) optional seconds that the command may run for,
+        after which the dmdismod process is terminated
+    :return: SimpleNamespace with the exit_status, the last
+        OUTPUT_LINES lines of stdout and stderr, the wall seconds,
+        the cpu_seconds and the max_rss_mb of the dmdismod process,
+        and whether it timed_out
+    """
+    arguments = ["dmdismod", str(dm_file)] + shlex.split(command)
+    LOG.info(f"Running {' '.join(arguments)}...")
 
     info = SimpleNamespace()
+    info.seconds = 0.0
+    info.cpu_seconds = None
+    info.max_rss_mb = None
+    info.timed_out = False
+    size_before_mb = file_size_mb(dm_file) if telemetry_file is not None else None
+    start = perf_counter()
+    try:
+        process = subprocess.Popen(
+            arguments, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, bufsize=1
+        )
+    except FileNotFoundError:
+        # What a shell would say, so that a missing dmdismod is a failed
+        # command rather than an exception.
+        info.exit_status = 127
+        info.stdout = ''
+        info.stderr = f"{arguments[0]}: command not found"
+        return info
+
+    callbacks = [progress] if progress is not None else []
+    writer = None
+    if write_progress:
+        writer = _ProgressWriter(progress_file(dm_file))
+        callbacks.append(writer)
+
+    def on_line(line):
+        iteration = parse_ipopt_iteration(line)
+        if iteration is None:
+            return
+        record = SimpleNamespace(
+            dm_file=dm_file, command=command, seconds=round(perf_counter() - start, 3), **iteration
+        )
+        for callback in callbacks:
+            callback(record)
+
+    stdout = deque(maxlen=OUTPUT_LINES)
+    stderr = deque(maxlen=OUTPUT_LINES)
+    # Both pipes are read at once, so that dmdismod never waits on a full one.
+    stderr_reader = Thread(target=_read_lines, args=(process.stderr, 'stderr', stderr, dm_file))
+    stderr_reader.start()
+    finished = Event()
+    reaper = _Reaper(process)
+    if timeout is not None:
+        Thread(target=_watchdog, args=(reaper, timeout, finished, info), daemon=True).start()
+    try:
+        _read_lines(process.stdout, 'stdout', stdout, dm_file, on_line=on_line)
+    finally:
+        stderr_reader.join()
+        info.cpu_seconds, info.max_rss_mb = reaper.wait()
+        finished.set()
+        info.seconds = perf_counter() - start
+        process.stdout.close()
+        process.stderr.close()
+        if writer is not None:
+            writer.close()
+
     info.exit_status = process.returncode
-    info.stdout = process.stdout.decode()
-    info.stderr = process.stderr.decode()
+    info.stdout = '\n'.join(stdout)
+    info.stderr = '\n'.join(stderr)
 
+    if telemetry_file is not None:
+        append_telemetry(telemetry_file, command_telemetry(
+            dm_file=dm_file, command=command, info=info, size_before_mb=size_before_mb
+        ))
     return info
 
 
-def run_dismod_commands(dm_file, commands):
+def run_dismod_commands(dm_file, commands, progress=None, write_progress=False, telemetry_file=None,
+                        timeouts=None, fallbacks=None, resume=False):
     """
     Runs multiple commands on a dismod file and returns the exit statuses.
     Will raise an exception if it runs into an error.
@@ -35,23 +297,219 @@ def run_dismod_commands(dm_file, commands):
     Args:
         dm_file: (str) the dismod db filepath
         commands: (List[str]) a list of strings
+        progress: (callable) optional callback for Ipopt iterations, see run_dismod
+        write_progress: (bool) write the iterations next to the dismod file
+        telemetry_file: (pathlib.Path) optional file to append the resources
+            each command used to
+        timeouts: (Dict[str, float]) seconds that commands may run for, by command
+        fallbacks: (Dict[str, List[str]]) commands to try in turn when a command
+            fails or times out, by command, see run_dismod_job
+        resume: (bool) skip the commands that completed the last time
+            these commands ran on the file, see run_dismod_job
+
+    """
+    job = run_dismod_job(
+        dm_file=dm_file, commands=commands, progress=progress, write_progress=write_progress,
+        telemetry_file=telemetry_file, timeouts=timeouts, fallbacks=fallbacks, resume=resume
+    )
+    if job.exit_status:
+        process = job.processes[-1]
+        LOG.error(f"Output: {process.stdout}")
+        try:
+            raise RuntimeError(
+                f"Dismod-AT failed with exit status {job.exit_status}."
+                f"Exiting program."
+            )
+        except RuntimeError:
+            sys.exit(job.exit_status)
+
+
+def run_dismod_job(dm_file, commands, progress=None, write_progress=False, telemetry_file=None,
+                   timeouts=None, fallbacks=None, record_outcomes=True, resume=False):
+    """
+    Runs a sequence of commands on a dismod file, in order, stopping at the
+    first one that fails. Failures are recorded rather than raised.
+
+    A command that fails, or runs for longer than its timeout, can be
+    replaced by fallbacks, which are tried in turn until one succeeds.
+    The sequence then goes on from the command after the one that failed.
+    For instance, with
+
+    >>> run_dismod_job(dm_file, ['init', 'fit both', 'predict fit_var'],
+    >>>                timeouts={'fit both': 3600}, fallbacks={'fit both': ['fit fixed']})
+
+    a 'fit both' that takes more than an hour is stopped, and 'fit fixed'
+    runs instead, before 'predict fit_var'. What happened to each command
+    is written to the c_command_outcome table of the file, so that later
+    steps can tell which fit they're reading, see DismodIO.fit_command.
+
+    With resume, the commands at the start of the sequence that completed
+    when it last ran on this file are skipped, if the file hasn't changed
+    since, see cascade_at.dismod.api.command_markers.
+
+    Args:
+        dm_file: (str) the dismod db filepath
+        commands: (List[str]) the commands to run, in order
+        progress: (callable) optional callback for Ipopt iterations, see run_dismod
+        write_progress: (bool) write the iterations next to the dismod file
+        telemetry_file: (pathlib.Path) optional file to append the resources
+            each command used to
+        timeouts: (Dict[str, float]) seconds that commands may run for,
+            by command, including fallback commands
+        fallbacks: (Dict[str, List[str]]) commands to try in turn when
+            a command fails or times out, by command
+        record_outcomes: (bool) write the outcomes to the file, if it exists
+        resume: (bool) skip the commands that already completed, and mark
+            the ones that complete
 
+    Returns:
+        SimpleNamespace with the dm_file, the commands, the skipped commands,
+        the run_dismod info of each command that ran (processes), the outcomes, the failed_command
+        or None, the exit_status of the failed command or 0, the error that
+        stopped the job or None, see run_dismod_jobs, and the wall time in seconds
     """
     if isinstance(commands, str):
         commands = [commands]
-    for c in commands:
-        process = run_dismod(dm_file=dm_file, command=c)
-        if process.exit_status:
-            LOG.error(f"{c} failed with exit_status {process.exit_status}:")
+    timeouts = timeouts or dict()
+    fallbacks = fallbacks or dict()
+    start = perf_counter()
+    info = SimpleNamespace()
+    info.dm_file = dm_file
+    info.commands = list(commands)
+    info.processes = list()
+    info.outcomes = list()
+    info.skipped = list()
+    info.failed_command = None
+    info.exit_status = 0
+    info.error = None
+    db = None
+    if resume:
+        db = DismodIO(path=Path(dm_file), validate='off')
+        sequence = sequence_key(commands, fallbacks)
+        skip = completed_commands(db, sequence, commands) if os.path.exists(dm_file) else 0
+        if skip:
+            info.skipped = list(commands[:skip])
+            LOG.info(f"Skipping {info.skipped} on {dm_file}, which completed before.")
+        elif os.path.exists(dm_file):
+            clear_markers(db, sequence)
+    for position, c in enumerate(commands):
+        if position < len(info.skipped):
+            continue
+        for attempt in [c] + list(fallbacks.get(c, [])):
+            if attempt != c:
+                LOG.warning(f"Running {attempt} on {dm_file} in place of {c}.")
+            process = run_dismod(
+                dm_file=dm_file, command=attempt, progress=progress, write_progress=write_progress,
+                telemetry_file=telemetry_file, timeout=timeouts.get(attempt)
+            )
+            info.processes.append(process)
+            if process.timed_out:
+                outcome = 'timed_out'
+            elif process.exit_status:
+                outcome = 'failed'
+            else:
+                outcome = 'succeeded'
+            info.outcomes.append({
+                'requested': c, 'command': attempt, 'outcome': outcome, 'exit_status': process.exit_status,
+                'seconds': process.seconds, 'unix_time': int(time())
+            })
+            if outcome == 'succeeded':
+                break
+            LOG.error(f"{attempt} on {dm_file} {outcome.replace('_', ' ')} with exit_status {process.exit_status}:")
             LOG.error(f"Error: {process.stderr}")
-            LOG.error(f"Output: {process.stdout}")
-            try:
-                raise RuntimeError(
-                    f"Dismod-AT failed with exit status {process.exit_status}."
-                    f"Exiting program."
-                )
-            except RuntimeError:
-                sys.exit(process.exit_status)
-        else:
-            LOG.info(f"{process.stdout}")
-            LOG.info(f"{process.stderr}")
+        if info.outcomes[-1]['outcome'] != 'succeeded':
+            info.failed_command = c
+            info.exit_status = process.exit_status or TIMED_OUT_EXIT_STATUS
+            break
+        if db is not None:
+            mark_completed(db, sequence, position=position, requested=c, command=attempt)
+    if db is not None:
+        db.close()
+    info.seconds = perf_counter() - start
+    if record_outcomes and info.outcomes and os.path.exists(dm_file):
+        _record_outcomes(dm_file, info.outcomes)
+    return info
+
+
+def _record_outcomes(dm_file, outcomes):
+    """
+    Appends outcomes to the c_command_outcome table of a dismod file.
+    """
+    db = DismodIO(path=Path(dm_file), validate='off')
+    try:
+        outcome = pd.DataFrame(outcomes)
+        if 'c_command_outcome' in db.table_names():
+            outcome = pd.concat([db.command_outcome.drop(columns='c_command_outcome_id'), outcome],
+                                ignore_index=True)
+        db.command_outcome = outcome
+    finally:
+        db.close()
+
+
+def _run_dismod_job_or_fail(dm_file, commands, **kwargs):
+    """
+    Runs run_dismod_job, turning an exception into a failed result so
+    that it doesn't hide the results of the other jobs.
+    """
+    start = perf_counter()
+    try:
+        return run_dismod_job(dm_file=dm_file, commands=commands, **kwargs)
+    except Exception as error:
+        LOG.exception(f"Running {commands} on {dm_file} raised {error!r}.")
+        return SimpleNamespace(
+            dm_file=dm_file, commands=list(commands), processes=list(), outcomes=list(), skipped=list(),
+            failed_command=None, exit_status=1, error=repr(error), seconds=perf_counter() - start
+        )
+
+
+def run_dismod_jobs(jobs, max_workers=1, progress=None, write_progress=False, telemetry_file=None,
+                    timeouts=None, fallbacks=None, resume=False):
+    """
+    Runs command sequences on many dismod files at once. The commands for
+    each file run in order, but files run at the same time as each other,
+    in a bounded thread pool, each thread waiting on its dmdismod process.
+    A file whose commands fail doesn't stop the others, and neither does
+    one whose job raises, which gets a result with exit_status 1 and
+    the exception as its error.
+
+    Args:
+        jobs: (List[Tuple[str, List[str]]]) dismod db filepaths with the
+            commands to run on each
+        max_workers: (int) how many files to run commands on at once,
+            1 runs them in order in this thread
+        progress: (callable) optional callback for Ipopt iterations, see
+            run_dismod, which is called from the worker threads
+        write_progress: (bool) write the iterations next to each dismod file
+        telemetry_file: (pathlib.Path) optional file to append the resources
+            each command used to
+        timeouts: (Dict[str, float]) seconds that commands may run for, by command
+        fallbacks: (Dict[str, List[str]]) commands to try in turn when a command
+            fails or times out, by command, see run_dismod_job
+        resume: (bool) skip the commands that completed the last time
+            the same commands ran on each file, see run_dismod_job
+
+    Returns:
+        (List[SimpleNamespace]) the run_dismod_job info for each job,
+        in the same order as jobs
+    """
+    if max_workers <= 1:
+        results = [
+            _run_dismod_job_or_fail(dm_file=dm_file, commands=commands, progress=progress,
+                                    write_progress=write_progress, telemetry_file=telemetry_file,
+                                    timeouts=timeouts, fallbacks=fallbacks, resume=resume)
+            for dm_file, commands in jobs
+        ]
+    else:
+        LOG.info(f"Running commands on {len(jobs)} files with {max_workers} workers.")
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(_run_dismod_job_or_fail, dm_file=dm_file, commands=commands,
+                                progress=progress, write_progress=write_progress,
+                                telemetry_file=telemetry_file, timeouts=timeouts, fallbacks=fallbacks,
+                                resume=resume)
+                for dm_file, commands in jobs
+            ]
+            results = [future.result() for future in futures]
+    failed = [r for r in results if r.exit_status]
+    LOG.info(f"Ran commands on {len(results)} files, {len(failed)} failed.")
+    return results
@@ -367,6 +367,44 @@ class ExecutionData(Base):
     value = Column(String(), nullable=False)
 
 
+class CommandOutcome(Base):
+    """
+    What happened to each dmdismod command that was run on the file,
+    including fallback commands that ran in place of a command that
+    failed or timed out.
+    """
+
+    __tablename__ = "c_command_outcome"
+
+    c_command_outcome_id = Column(Integer(), primary_key=True, autoincrement=False)
+    requested = Column(String(), nullable=False)
+    command = Column(String(), nullable=False)
+    outcome = Column(String(), nullable=False)
+    exit_status = Column(Integer(), nullable=False)
+    seconds = Column(Float(), nullable=False)
+    unix_time = Column(Integer(), nullable=False)
+
+
+class CommandMarker(Base):
+    """
+    Marks each command of a sequence that has completed, with the
+    log table row that dmdismod wrote when it ended and a fingerprint
+    of the input tables after it, so that a retry of the sequence can
+    skip the commands that don't need to run again.
+    """
+
+    __tablename__ = "c_command_marker"
+
+    c_command_marker_id = Column(Integer(), primary_key=True, autoincrement=False)
+    sequence = Column(String(), nullable=False)
+    position = Column(Integer(), nullable=False)
+    requested = Column(String(), nullable=False)
+    command = Column(String(), nullable=False)
+    log_id = Column(Integer(), nullable=False)
+    inputs = Column(String(), nullable=False)
+    unix_time = Column(Integer(), nullable=False)
+
+
 class DataSubset(Base):
     """
     Output, identifies which rows of the data table are included in
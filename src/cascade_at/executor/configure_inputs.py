@@ -1,11 +1,16 @@
 import logging
 import json
+import os
 from argparse import ArgumentParser
 
 from cascade_at.context.model_context import Context
 from cascade_at.settings.settings import settings_json_from_model_version_id, load_settings
 from cascade_at.inputs.measurement_inputs import MeasurementInputsFromSettings
+from cascade_at.dismod.api.dismod_filler import DismodFiller
+from cascade_at.model.grid_alchemy import Alchemy
+from cascade_at.core.db import set_shared_function_cache
 from cascade_at.core.log import get_loggers, LEVELS
+from cascade_at.core.shared_function_cache import SharedFunctionCache
 
 LOG = get_loggers(__name__)
 
@@ -33,9 +38,53 @@ def get_args(args):
                         help=("if set, will save files to the directory "
                               "specified. Invalidated if --configure is "
                               "set"))
+    parser.add_argument("--n-pull-workers", type=int, required=False, default=1,
+                        help="how many raw inputs to pull from the databases at once")
+    parser.add_argument("--pull-retries", type=int, required=False, default=0,
+                        help="how many times to retry a failed pull of a raw input")
+    parser.add_argument("--no-shared-function-cache", action='store_true',
+                        help="pull every input from the databases instead of "
+                             "reusing results cached under the cascade directory")
+    parser.add_argument("--shared-function-cache-gb", type=float, required=False, default=20.,
+                        help="size in GB past which old cached pulls are evicted")
+    parser.add_argument("--clear-shared-function-cache", nargs='*', required=False, default=None,
+                        metavar='FUNCTION',
+                        help="delete cached pulls before pulling, of all functions or of the "
+                             "named ones, like db_queries.get_covariate_estimates, for instance "
+                             "to use a best version published since they were cached")
+    parser.add_argument("--no-template-db", action='store_true',
+                        help="don't make a template database with the tables "
+                             "that every parent and sex database shares")
     return parser.parse_args()
 
 
+def write_template_db(context, settings, inputs):
+    """
+    Makes the template database that the databases for each parent and sex
+    start from. Its tables are built for the drill start location and drill
+    sex, which doesn't matter for the tables in TEMPLATE_TABLES, and
+    each database checks the others before it uses them, see
+    cascade_at.dismod.api.dismod_filler.
+    """
+    if settings.model.is_field_unset("drill_location_start") or settings.model.is_field_unset("drill_sex"):
+        LOG.info("Not making a template database without a drill start location and sex.")
+        return
+    parent_location_id = settings.model.drill_location_start
+    sex_id = settings.model.drill_sex
+    LOG.info(f"Making the template database {context.template_db_file}.")
+    os.makedirs(context.database_dir, exist_ok=True)
+    if context.template_db_file.exists():
+        context.template_db_file.unlink()
+    DismodFiller(
+        path=context.template_db_file,
+        settings_configuration=settings,
+        measurement_inputs=inputs,
+        grid_alchemy=Alchemy(settings=settings),
+        parent_location_id=parent_location_id,
+        sex_id=sex_id
+    ).fill_template()
+
+
 def main(args=None):
     """
     Grabs the inputs for a specific model version ID, sets up the folder
@@ -57,6 +106,15 @@ def main(args=None):
         configure_application=args.configure,
         root_directory=args.test_dir
     )
+    cache = SharedFunctionCache(
+        directory=context.shared_function_cache_dir,
+        max_bytes=int(args.shared_function_cache_gb * 1e9),
+        enabled=not args.no_shared_function_cache
+    )
+    if args.clear_shared_function_cache is not None:
+        for function in args.clear_shared_function_cache or [None]:
+            cache.clear(function=function)
+    set_shared_function_cache(cache)
     if args.json_file:
         LOG.info(f"Reading settings from file: {args.json_file}")
         with open(args.json_file, 'r') as json_file:
@@ -69,10 +127,16 @@ def main(args=None):
     settings = load_settings(settings_json=parameter_json)
 
     inputs = MeasurementInputsFromSettings(settings=settings)
-    inputs.get_raw_inputs()
+    inputs.get_raw_inputs(
+        max_workers=args.n_pull_workers,
+        retries=args.pull_retries
+    )
     inputs.configure_inputs_for_dismod(settings=settings)
 
     context.write_inputs(inputs=inputs, settings=parameter_json)
+    if not args.no_template_db:
+        write_template_db(context=context, settings=settings, inputs=inputs)
+    cache.report()
 
 
 if __name__ == '__main__':
@@ -2,9 +2,12 @@ import logging
 from argparse import ArgumentParser
 
 from cascade_at.context.model_context import Context
+from cascade_at.dismod.api.command_markers import commands_to_rerun
 from cascade_at.dismod.api.dismod_filler import DismodFiller
 from cascade_at.dismod.api.dismod_extractor import DismodExtractor
-from cascade_at.context.arg_utils import parse_options, parse_commands
+from cascade_at.dismod.api.dismod_io import DismodIO
+from cascade_at.dismod.api.dismod_sqlite import VALIDATION_MODES
+from cascade_at.context.arg_utils import parse_options, parse_commands, parse_timeouts, parse_fallbacks
 from cascade_at.dismod.api.run_dismod import run_dismod_commands
 from cascade_at.core.log import get_loggers, LEVELS
 
@@ -28,6 +31,28 @@ def get_args(args=None):
     parser.add_argument("--prior-parent", type=int, required=False, default=None)
     parser.add_argument("--prior-sex", type=int, required=False, default=None)
     parser.add_argument("--commands", nargs="+", required=False, default=[])
+    parser.add_argument("--subtree-data", action='store_true',
+                        help="only fill the data table with the parent location and its descendants")
+    parser.add_argument("--subtree-nodes", action='store_true',
+                        help="only fill the node table with the parent location and its descendants")
+    parser.add_argument("--index-tables", action='store_true',
+                        help="index the location, sex and integrand columns of the avgint and data tables")
+    parser.add_argument("--validate", type=str, required=False, default='off', choices=VALIDATION_MODES,
+                        help="how to check the tables before writing them to the database")
+    parser.add_argument("--in-memory", action='store_true',
+                        help="build the database in memory and write it to the file once it's filled")
+    parser.add_argument("--no-template", action='store_true',
+                        help="build every table rather than starting from the model version's template database")
+    parser.add_argument("--refill", action='store_true',
+                        help="only write the tables that changed since the database was last filled, "
+                             "and skip the commands that completed before and don't depend on them")
+    parser.add_argument("--no-resume", action='store_true',
+                        help="run every command, rather than skipping the ones that completed the last time "
+                             "the same commands ran on the database, as when a job is retried or refilled")
+    parser.add_argument("--timeouts", metavar="COMMAND=SECONDS", nargs="+", required=False, default=[],
+                        help="seconds that a command may run for before it's stopped, e.g. fit-both=3600")
+    parser.add_argument("--fallbacks", metavar="COMMAND=FALLBACK", nargs="+", required=False, default=[],
+                        help="commands to run in place of a command that fails or times out, e.g. fit-both=fit-fixed")
     parser.add_argument("--loglevel", type=str, required=False, default='info')
     parser.add_argument("--test_dir", type=str, required=False, default=None)
     arguments = parser.parse_args()
@@ -44,6 +69,8 @@ def get_args(args=None):
         arguments.commands = parse_commands(arguments.commands)
     else:
         arguments.commands = list()
+    arguments.timeouts = parse_timeouts(arguments.timeouts)
+    arguments.fallbacks = parse_fallbacks(arguments.fallbacks)
     return arguments
 
 
@@ -75,10 +102,13 @@ def main(args=None):
     if args.prior_parent or args.prior_sex:
         if not (args.prior_parent and args.prior_sex):
             raise RuntimeError("Need to pass both prior parent and sex or neither.")
-        child_prior = DismodExtractor(path=context.db_file(
+        prior_db = DismodExtractor(path=context.db_file(
             location_id=args.prior_parent,
             sex_id=args.prior_sex
-        )).gather_draws_for_prior_grid(
+        ), cache_reads=True)
+        LOG.info(f"Taking priors from the results of {prior_db.fit_command() or 'an unrecorded fit'} "
+                 f"in {prior_db.path}.")
+        child_prior = prior_db.gather_draws_for_prior_grid(
             location_id=args.parent_location_id,
             sex_id=args.sex_id,
             rates=[r.rate for r in settings.rate]
@@ -86,6 +116,10 @@ def main(args=None):
     else:
         child_prior = None
 
+    template = None
+    if not args.no_template and context.template_db_file.exists():
+        template = context.template_db_file
+
     df = DismodFiller(
         path=context.db_file(location_id=args.parent_location_id, sex_id=args.sex_id),
         settings_configuration=settings,
@@ -93,10 +127,29 @@ def main(args=None):
         grid_alchemy=alchemy,
         parent_location_id=args.parent_location_id,
         sex_id=args.sex_id,
-        child_prior=child_prior
+        child_prior=child_prior,
+        subtree_data=args.subtree_data,
+        subtree_nodes=args.subtree_nodes,
+        index_tables=args.index_tables,
+        validate=args.validate,
+        in_memory=args.in_memory,
+        template=template,
+        refill=args.refill
     )
     df.fill_for_parent_child(**args.options)
-    run_dismod_commands(dm_file=df.path.absolute(), commands=args.commands)
+    if args.refill and not args.no_resume:
+        # Stamps the markers of the commands to skip, which resume then skips.
+        commands = commands_to_rerun(
+            DismodIO(path=df.path), commands=args.commands, changed_tables=df.changed_tables,
+            fallbacks=args.fallbacks
+        )
+        if len(commands) < len(args.commands):
+            LOG.info(f"Skipping commands {args.commands[:len(args.commands) - len(commands)]}, "
+                     f"which completed before and don't depend on the changed tables {df.changed_tables}.")
+    run_dismod_commands(
+        dm_file=df.path.absolute(), commands=args.commands, telemetry_file=context.telemetry_file,
+        timeouts=args.timeouts, fallbacks=args.fallbacks, resume=not args.no_resume
+    )
 
 
 if __name__ == '__main__':
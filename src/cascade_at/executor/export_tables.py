@@ -0,0 +1,65 @@
+import logging
+from argparse import ArgumentParser
+from pathlib import Path
+
+from cascade_at.context.model_context import Context
+from cascade_at.dismod.api.dismod_io import DismodIO, EXPORT_FORMATS, EXPORT_METADATA
+from cascade_at.core.log import get_loggers, LEVELS
+
+LOG = get_loggers(__name__)
+
+
+def get_args(args=None):
+    """
+    Parse the arguments for exporting tables from dismod databases.
+    :return: parsed args
+    """
+    if args:
+        return args
+
+    parser = ArgumentParser()
+    parser.add_argument("-model-version-id", type=int, required=True)
+    parser.add_argument("-locations", nargs="+", required=True, default=[], type=int)
+    parser.add_argument("-sexes", nargs="+", required=True, default=[], type=int)
+    parser.add_argument("--tables", nargs="+", required=False, default=list(EXPORT_METADATA),
+                        help="the tables to export from each database")
+    parser.add_argument("--format", type=str, required=False, default='hdf', choices=list(EXPORT_FORMATS))
+    parser.add_argument("--directory", type=str, required=False, default=None,
+                        help="where to export to, defaults to the model version's outputs")
+    parser.add_argument("--loglevel", type=str, required=False, default='info')
+    parser.add_argument("--test_dir", type=str, required=False, default=None)
+    return parser.parse_args()
+
+
+def main(args=None):
+    """
+    Exports result tables from the databases for each location and sex,
+    joined with the var and avgint tables that describe them,
+    to columnar files that can be read without opening the databases.
+    The files for a database go in a <location>/<sex> folder of the
+    directory.
+    """
+    args = get_args(args=args)
+    logging.basicConfig(level=LEVELS[args.loglevel])
+
+    if args.test_dir:
+        context = Context(model_version_id=args.model_version_id,
+                          configure_application=False,
+                          root_directory=args.test_dir)
+    else:
+        context = Context(model_version_id=args.model_version_id)
+
+    directory = Path(args.directory) if args.directory else context.export_dir
+    for location_id in args.locations:
+        for sex_id in args.sexes:
+            path = context.db_file(location_id=location_id, sex_id=sex_id, make=False)
+            with DismodIO(path=path) as db:
+                db.export(
+                    tables=args.tables,
+                    directory=directory / str(location_id) / str(sex_id),
+                    format=args.format
+                )
+
+
+if __name__ == '__main__':
+    main()
@@ -27,8 +27,10 @@ def get_args():
 def main():
     """
     Takes a dismod database that has had predict run on it and converts the predictions
-    into the format needed for the IHME Epi Databases. Also uploads inputs to tier 3 which
-    allows us to view those inputs in EpiViz.
+    into the format needed for the IHME Epi Databases. The summaries of the draws are
+    saved and uploaded. If predict ran on samples, the draws are also saved, a chunk at
+    a time so that any number of draws fits in memory. Also uploads inputs to tier 3
+    which allows us to view those inputs in EpiViz.
     """
     args = get_args()
     logging.basicConfig(level=LEVELS[args.loglevel])
@@ -45,11 +47,15 @@ def main():
 
     LOG.info("Extracting results from DisMod SQLite Database.")
     dismod_file = context.db_file(location_id=args.parent_location_id, sex_id=args.sex_id, make=False)
-    da = DismodExtractor(path=dismod_file)
-    predictions = da.format_predictions_for_ihme()
+    da = DismodExtractor(path=dismod_file, cache_reads=True)
+    LOG.info(f"The predictions are from {da.fit_command() or 'an unrecorded fit'}.")
+    rh = ResultsHandler(model_version_id=args.model_version_id)
+
+    LOG.info("Saving the draws of samples.")
+    rh.save_draw_chunks(chunks=da.iter_draws_for_ihme(), directory=context.sample_draw_dir)
 
     LOG.info("Saving the results.")
-    rh = ResultsHandler(model_version_id=args.model_version_id)
+    predictions = da.format_predictions_for_ihme()
     rh.save_draw_files(df=predictions, directory=context.draw_dir)
     rh.upload_summaries(directory=context.draw_dir, conn_def=context.model_connection)
 
@@ -121,7 +121,7 @@ def main():
     logging.basicConfig(level=LEVELS[args.loglevel])
 
     context = Context(model_version_id=args.model_version_id)
-    db_files = [DismodIO(context.db_file(location_id=loc, sex_id=sex))
+    db_files = [DismodIO(context.db_file(location_id=loc, sex_id=sex), cache_reads=True)
                 for loc in args.locations for sex in args.sexes]
     LOG.info(f"There are {len(db_files)} databases that will be aggregated.")
 
@@ -137,6 +137,8 @@ def main():
     mulcov_estimates = get_mulcovs(
         dbs=db_files, covs=common_covariates, table=args.sample
     )
+    for db in db_files:
+        db.close()
     mulcov_statistics = compute_statistics(
         df=mulcov_estimates, mean=args.mean, std=args.std, quantile=args.quantile
     )
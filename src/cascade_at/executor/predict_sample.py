@@ -51,8 +51,9 @@ def main():
     posterior_grid.rename(columns={'sex_id': 'c_sex_id'}, inplace=True)
     sourceDB.avgint = posterior_grid
     run_dismod_commands(
-        dm_file=sourceDB,
-        commands=['predict sample']
+        dm_file=sourceDB.path,
+        commands=['predict sample'],
+        telemetry_file=context.telemetry_file
     )
 
 
@@ -1,8 +1,10 @@
 import logging
+import sys
 from argparse import ArgumentParser
+from pathlib import Path
 
-from cascade_at.context.arg_utils import parse_commands
-from cascade_at.dismod.api.run_dismod import run_dismod
+from cascade_at.context.arg_utils import parse_commands, parse_timeouts, parse_fallbacks
+from cascade_at.dismod.api.run_dismod import run_dismod_jobs
 from cascade_at.core.log import get_loggers, LEVELS
 
 LOG = get_loggers(__name__)
@@ -14,8 +16,22 @@ def get_args():
     :return: parsed args, plus additional parsing for
     """
     parser = ArgumentParser()
-    parser.add_argument("-file", type=str, required=True)
+    parser.add_argument("-file", type=str, nargs="+", required=True,
+                        help="one or more dismod databases to run the commands on")
     parser.add_argument("--commands", nargs="+", required=False, default=[])
+    parser.add_argument("--workers", type=int, required=False, default=1,
+                        help="how many databases to run commands on at once")
+    parser.add_argument("--progress", action='store_true',
+                        help="write the Ipopt iterations of each database to a progress file next to it")
+    parser.add_argument("--telemetry-file", type=str, required=False, default=None,
+                        help="file to append the time and memory that each command used to")
+    parser.add_argument("--resume", action='store_true',
+                        help="skip the commands that completed the last time the same commands "
+                             "ran on an unchanged database")
+    parser.add_argument("--timeouts", metavar="COMMAND=SECONDS", nargs="+", required=False, default=[],
+                        help="seconds that a command may run for before it's stopped, e.g. fit-both=3600")
+    parser.add_argument("--fallbacks", metavar="COMMAND=FALLBACK", nargs="+", required=False, default=[],
+                        help="commands to run in place of a command that fails or times out, e.g. fit-both=fit-fixed")
     parser.add_argument("--loglevel", type=str, required=False, default='info')
 
     arguments = parser.parse_args()
@@ -26,32 +42,36 @@ def get_args():
         arguments.commands = parse_commands(arguments.commands)
     else:
         arguments.commands = list()
+    arguments.timeouts = parse_timeouts(arguments.timeouts)
+    arguments.fallbacks = parse_fallbacks(arguments.fallbacks)
     return arguments
 
 
 def main():
     """
-    Creates a dismod database using the saved inputs and the file
-    structure specified in the context.
-
-    Then runs an optional set of commands on the database passed
-    in the --commands argument.
-
-    Also passes an optional argument --options as a dictionary to
-    the dismod database to fill/modify the options table.
+    Runs a set of commands, in order, on each of the dismod databases
+    passed in the -file argument, with up to --workers databases
+    running at once. A database whose commands fail doesn't stop
+    the others, and the exit status is 1 if any of them failed.
     """
     args = get_args()
     logging.basicConfig(level=LEVELS[args.loglevel])
 
-    for c in args.commands:
-        process = run_dismod(dm_file=args.file, command=c)
-        if process.exit_status:
-            LOG.error(f"{c} failed with exit_status {process.exit_status}:")
-            LOG.error(f"{process.stderr}")
-            raise
-        else:
-            print(process.stdout)
-            print(process.stderr)
+    results = run_dismod_jobs(
+        jobs=[(dm_file, args.commands) for dm_file in args.file],
+        max_workers=args.workers,
+        write_progress=args.progress,
+        telemetry_file=Path(args.telemetry_file) if args.telemetry_file else None,
+        timeouts=args.timeouts,
+        fallbacks=args.fallbacks,
+        resume=args.resume
+    )
+    for result in results:
+        if result.exit_status:
+            LOG.error(f"{result.failed_command} failed on {result.dm_file} "
+                      f"with exit_status {result.exit_status}.")
+    if any(result.exit_status for result in results):
+        sys.exit(1)
 
 
 if __name__ == '__main__':
@@ -58,9 +58,10 @@ class FitSample:
         )
         if index is not None:
             copy2(src=str(self.main_db), dst=str(index_db))
-        run_dismod_commands(dm_file=index_db, commands=[f'fit {self.fit_type} {index}'])
-        db = DismodIO(path=index_db)
-        fit = db.fit_var
+        run_dismod_commands(dm_file=index_db, commands=[f'fit {self.fit_type} {index}'],
+                            telemetry_file=self.context.telemetry_file)
+        with DismodIO(path=index_db) as db:
+            fit = db.fit_var
         fit['sample_index'] = index
         return fit
 
@@ -90,7 +91,8 @@ def main():
             'set truth_var fit_var',
             'set scale_var fit_var',
             f'simulate {args.n_sim}'
-        ]
+        ],
+        telemetry_file=context.telemetry_file
     )
 
     if args.n_pool > 1:
@@ -111,7 +113,8 @@ def main():
             dm_file=main_db,
             commands=[
                 f'sample simulate {args.n_sim}'
-            ]
+            ],
+            telemetry_file=context.telemetry_file
         )
 
 
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 
 from cascade_at.core.db import db_queries
@@ -76,6 +77,101 @@ class CovariateData(BaseInput):
     def complete_covariate_locations(cov_df, pop_df, loc_df, locations):
         """
         Completes the covariate locations that aren't in the database as a population-weighted average.
+
+        Gives the same result as complete_covariate_locations_by_merge, but
+        lays out the population and covariate values as dense
+        (location x demographic group) arrays, where a demographic group is
+        a year, age group, and sex, and aggregates children into their
+        parents level by level with integer parent indices and reductions
+        over the rows of those arrays. Memory is bounded by the size of those
+        arrays rather than by the size of the merged data frames.
+
+        :param cov_df: (pd.DataFrame)
+        :param pop_df: (pd.DataFrame)
+        :param loc_df: (pd.DataFrame)
+        :param locations: (list)
+        :return:
+        """
+        loc_subset_df = loc_df.loc[loc_df.location_id.isin(locations)]
+        all_levels = loc_subset_df.level.unique().tolist()
+        cov_locations = cov_df.location_id.unique().tolist()
+        cov_levels = loc_subset_df.loc[loc_subset_df.location_id.isin(cov_locations)].level.unique().tolist()
+        missing_levels = [x for x in all_levels if x not in cov_levels]
+
+        df = cov_df.copy()
+        if not missing_levels:
+            return df
+
+        demographic_columns = ['year_id', 'age_group_id', 'sex_id']
+        location_ids = np.unique(np.concatenate([
+            loc_subset_df.location_id.values, loc_subset_df.parent_id.values
+        ]))
+
+        # The demographic axis is every (year, age group, sex) combination in the
+        # population, in the same order that a groupby would sort them
+        demographic_axes = [np.unique(pop_df[c].values) for c in demographic_columns]
+        n_demographics = int(np.prod([len(a) for a in demographic_axes]))
+
+        def positions(frame):
+            loc_pos = np.searchsorted(location_ids, frame.location_id.values)
+            loc_pos = np.clip(loc_pos, 0, len(location_ids) - 1)
+            found = location_ids[loc_pos] == frame.location_id.values
+            demo_pos = np.zeros(len(frame), dtype=int)
+            for axis, column in zip(demographic_axes, demographic_columns):
+                pos = np.clip(np.searchsorted(axis, frame[column].values), 0, len(axis) - 1)
+                found &= axis[pos] == frame[column].values
+                demo_pos = demo_pos * len(axis) + pos
+            return loc_pos[found], demo_pos[found], found
+
+        shape = (len(location_ids), n_demographics)
+        population = np.full(shape, np.nan)
+        has_population = np.zeros(shape, dtype=bool)
+        loc_pos, demo_pos, found = positions(pop_df)
+        population[loc_pos, demo_pos] = pop_df.population.values[found]
+        has_population[loc_pos, demo_pos] = True
+
+        covariate = np.full(shape, np.nan)
+        loc_pos, demo_pos, found = positions(df)
+        covariate[loc_pos, demo_pos] = df.mean_value.values[found]
+
+        for level in sorted(missing_levels, reverse=True):
+            LOG.info(f"Filling in covariate values at location hierarchy level {level}.")
+            # Get one location below this level
+            ldf = loc_subset_df.loc[loc_subset_df.level == level + 1]
+            if ldf.empty:
+                continue
+            # Children grouped by parent, keeping their order within each parent
+            order = np.argsort(np.searchsorted(location_ids, ldf.parent_id.values), kind='stable')
+            child_pos = np.searchsorted(location_ids, ldf.location_id.values[order])
+            parent_pos = np.searchsorted(location_ids, ldf.parent_id.values[order])
+            parents, starts = np.unique(parent_pos, return_index=True)
+
+            # Weight each child by its share of the parent population, where
+            # missing values don't contribute to the sum
+            weighted = covariate[child_pos] * population[child_pos] / population[parent_pos]
+            weighted[np.isnan(weighted)] = 0.
+            values = np.add.reduceat(weighted, starts, axis=0)
+            # A parent gets a value wherever any of its children has population
+            has_rows = np.logical_or.reduceat(has_population[child_pos], starts, axis=0)
+
+            parent_idx, demo_idx = np.nonzero(has_rows)
+            covariate[parents[parent_idx], demo_idx] = values[parent_idx, demo_idx]
+
+            dp = pd.DataFrame({'location_id': location_ids[parents[parent_idx]].astype(ldf.parent_id.dtype)})
+            for axis, column, index in zip(
+                    demographic_axes, demographic_columns,
+                    np.unravel_index(demo_idx, [len(a) for a in demographic_axes])):
+                dp[column] = axis[index]
+            dp['mean_value'] = values[parent_idx, demo_idx]
+            df = pd.concat([df, dp], axis=0, sort=False)
+
+        return df
+
+    @staticmethod
+    def complete_covariate_locations_by_merge(cov_df, pop_df, loc_df, locations):
+        """
+        Completes the covariate locations that aren't in the database as a population-weighted average.
+        This is the merge-based reference implementation of complete_covariate_locations.
         :param cov_df: (pd.DataFrame)
         :param pop_df: (pd.DataFrame)
         :param loc_df: (pd.DataFrame)
@@ -0,0 +1,235 @@
+"""
+A directory of input components that can be read one at a time.
+
+Instead of pickling the whole MeasurementInputs object into one file, the
+store writes each attribute of the inputs as its own component. A manifest
+lists the components and says how each one was written:
+
+- ``value``: small JSON-serializable values, kept in the manifest itself
+- ``frame``: a data frame, written to ``<name>.h5``
+- ``frames``: a dictionary of data frames (like the country covariate data
+  by covariate ID), written to ``<name>.h5`` with one key per entry
+- ``object``: anything else. The data frames it holds, like the ``raw`` frame
+  of an ASDR or the ``df`` of a LocationDAG, are written to ``<name>.h5``
+  and the rest of the object is pickled with dill into ``<name>.p``.
+
+Reading the store gives back an inputs object with only the values
+filled in. Other components are loaded from disk the first time they are
+accessed, so a job that only needs ``dismod_data`` and ``location_dag``
+never reads the raw population or covariate estimates.
+"""
+import copy
+import importlib
+import json
+import os
+import shutil
+import warnings
+from pathlib import Path
+
+import dill
+import pandas as pd
+from tables import PerformanceWarning
+
+from cascade_at.core.log import get_loggers
+
+LOG = get_loggers(__name__)
+
+MANIFEST = 'manifest.json'
+STORE_ATTRIBUTE = 'input_store'
+
+
+def _is_value(value):
+    try:
+        return json.loads(json.dumps(value)) == value
+    except (TypeError, ValueError):
+        return False
+
+
+def _is_frame_dict(value):
+    return (
+        isinstance(value, dict) and len(value) > 0
+        and all(isinstance(v, pd.DataFrame) for v in value.values())
+        and _is_value(list(value.keys()))
+    )
+
+
+def _split_frames(value, prefix=''):
+    """
+    Takes the data frames out of an object or a list of objects.
+
+    :param value: the object
+    :param prefix: (str) HDF5 key prefix for the frames
+    :return: (shell, frames) where shell is a copy of the object with
+        None in place of the data frames, and frames maps HDF5 keys to frames
+    """
+    frames = dict()
+    if isinstance(value, list):
+        shell = list()
+        for i, item in enumerate(value):
+            item_shell, item_frames = _split_frames(item, prefix=f'{prefix}item_{i}/')
+            shell.append(item_shell)
+            frames.update(item_frames)
+        return shell, frames
+    if not hasattr(value, '__dict__') or isinstance(value, type):
+        return value, frames
+
+    frame_attributes = [k for k, v in vars(value).items() if isinstance(v, pd.DataFrame)]
+    if not frame_attributes:
+        return value, frames
+    shell = copy.copy(value)
+    for attribute in frame_attributes:
+        frames[f'{prefix}{attribute}'] = getattr(value, attribute)
+        setattr(shell, attribute, None)
+    return shell, frames
+
+
+def _restore_frames(shell, frames):
+    """
+    Puts the data frames back into an object split by _split_frames.
+
+    :param shell: the object without its frames
+    :param frames: (Dict[str, pd.DataFrame]) frames by HDF5 key
+    """
+    for key, frame in frames.items():
+        target = shell
+        path = key.split('/')
+        for part in path[:-1]:
+            target = target[int(part[len('item_'):])]
+        setattr(target, path[-1], frame)
+    return shell
+
+
+class InputStore:
+    def __init__(self, directory):
+        """
+        Reads and writes measurement inputs as a directory of components.
+
+        >>> store = InputStore(context.input_store_dir)
+        >>> store.write(inputs)
+        >>> inputs = store.read()
+        >>> inputs.dismod_data  # only reads dismod_data.h5
+
+        :param directory: (pathlib.Path) the directory for the store
+        """
+        self.directory = Path(directory)
+        self._manifest = None
+
+    @property
+    def manifest_file(self):
+        return self.directory / MANIFEST
+
+    def exists(self):
+        return self.manifest_file.exists()
+
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            with open(self.manifest_file) as f:
+                self._manifest = json.load(f)
+        return self._manifest
+
+    @property
+    def components(self):
+        return self.manifest['components']
+
+    def __contains__(self, name):
+        return name in self.components
+
+    def write(self, inputs):
+        """
+        Writes each attribute of the inputs as a component, replacing
+        anything that was in the store before.
+
+        :param inputs: (cascade_at.inputs.measurement_inputs.MeasurementInputs)
+        """
+        names = set(vars(inputs))
+        lazy_store = vars(inputs).get(STORE_ATTRIBUTE)
+        if lazy_store is not None:
+            names |= set(lazy_store.components)
+        names.discard(STORE_ATTRIBUTE)
+        values = {name: getattr(inputs, name) for name in sorted(names)}
+
+        LOG.info(f"Writing {len(values)} input components to {self.directory}.")
+        if self.directory.exists():
+            shutil.rmtree(self.directory)
+        os.makedirs(self.directory)
+
+        components = dict()
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', PerformanceWarning)
+            for name, value in values.items():
+                components[name] = self._write_component(name, value)
+
+        cls = type(inputs)
+        manifest = {
+            'class': f'{cls.__module__}:{cls.__qualname__}',
+            'components': components
+        }
+        with open(self.manifest_file, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        self._manifest = manifest
+
+    def _write_component(self, name, value):
+        h5_file = self.directory / f'{name}.h5'
+        if _is_value(value):
+            return {'kind': 'value', 'value': value}
+        if isinstance(value, pd.DataFrame):
+            value.to_hdf(h5_file, key='frame', mode='w')
+            return {'kind': 'frame'}
+        if _is_frame_dict(value):
+            keys = list(value.keys())
+            for i, key in enumerate(keys):
+                value[key].to_hdf(h5_file, key=f'frame_{i}', mode='a')
+            return {'kind': 'frames', 'keys': keys}
+
+        shell, frames = _split_frames(value)
+        for key, frame in frames.items():
+            frame.to_hdf(h5_file, key=key, mode='a')
+        with open(self.directory / f'{name}.p', 'wb') as f:
+            dill.dump(shell, f)
+        return {'kind': 'object', 'frames': list(frames)}
+
+    def load(self, name):
+        """
+        Reads one component from the store.
+
+        :param name: (str) the attribute name of the component
+        :return: the component
+        """
+        component = self.components[name]
+        kind = component['kind']
+        h5_file = self.directory / f'{name}.h5'
+        LOG.debug(f"Loading input component {name} from {self.directory}.")
+        if kind == 'value':
+            return component['value']
+        if kind == 'frame':
+            return pd.read_hdf(h5_file, key='frame')
+        if kind == 'frames':
+            return {
+                key: pd.read_hdf(h5_file, key=f'frame_{i}')
+                for i, key in enumerate(component['keys'])
+            }
+        if kind == 'object':
+            with open(self.directory / f'{name}.p', 'rb') as f:
+                shell = dill.load(f)
+            frames = {key: pd.read_hdf(h5_file, key=key) for key in component['frames']}
+            return _restore_frames(shell, frames)
+        raise ValueError(f"Unknown input component kind {kind} for {name}.")
+
+    def read(self):
+        """
+        Makes an inputs object that loads its components from this store
+        when they are first accessed. Values in the manifest are set right
+        away.
+
+        :return: (cascade_at.inputs.measurement_inputs.MeasurementInputs)
+        """
+        module_name, class_name = self.manifest['class'].split(':')
+        cls = getattr(importlib.import_module(module_name), class_name)
+        LOG.info(f"Reading {cls.__name__} lazily from {self.directory}.")
+        inputs = cls.__new__(cls)
+        for name, component in self.components.items():
+            if component['kind'] == 'value':
+                setattr(inputs, name, component['value'])
+        setattr(inputs, STORE_ATTRIBUTE, self)
+        return inputs
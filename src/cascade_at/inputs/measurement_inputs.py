@@ -16,9 +16,12 @@ from cascade_at.inputs.data import CrosswalkVersion
 from cascade_at.inputs.demographics import Demographics
 from cascade_at.inputs.locations import LocationDAG
 from cascade_at.inputs.population import Population
+from cascade_at.inputs.utilities.concurrent_pull import run_pulls
 from cascade_at.inputs.utilities.covariate_weighting import (
-    get_interpolated_covariate_values)
+    get_interpolated_covariate_values, PopulationWeights)
 from cascade_at.inputs.utilities.gbd_ids import get_location_set_version_id
+from cascade_at.inputs.utilities.interpolation_cache import (
+    CovariateInterpolationCache)
 from cascade_at.dismod.integrand_mappings import INTEGRAND_MAP
 from cascade_at.dismod.constants import IntegrandEnum
 from cascade_at.inputs.utilities.transformations import COVARIATE_TRANSFORMS
@@ -87,6 +90,19 @@ class MeasurementInputs:
                 of locations to be used
             self.population: (cascade_at.inputs.population.Population)
                 population object that is used for covariate weighting
+            self.population_weights: (cascade_at.inputs.utilities.
+                covariate_weighting.PopulationWeights) population lookup
+                built from self.population, shared by all covariate
+                interpolations
+            self.interpolation_cache: (cascade_at.inputs.utilities.
+                interpolation_cache.CovariateInterpolationCache) interpolated
+                country covariate values by covariate ID and demographic
+                window, pickled with the inputs so later jobs can reuse them
+            self.pull_seconds: (Dict[str, float]) wall time in seconds for
+                each of the raw input pulls in get_raw_inputs
+            self.input_store: (cascade_at.inputs.input_store.InputStore) the
+                store that these inputs were read from, if any. Components
+                that haven't been accessed yet are loaded from it on demand.
             self.data_eta: (Dict[str, float]): dictionary of eta value to be
                 applied to each measure
             self.density: (Dict[str, str]): dictionary of density to be
@@ -95,6 +111,9 @@ class MeasurementInputs:
                 to each measure
             self.dismod_data: (pd.DataFrame) resulting dismod data formatted
                 to be used in the dismod database
+            self.location_row_index: (Dict[int, np.array]) positions of the
+                rows of self.dismod_data for each location ID, built the
+                first time a subset of locations is requested
 
         Usage:
         >>> from cascade_at.settings.base_case import BASE_CASE
@@ -157,6 +176,10 @@ class MeasurementInputs:
         self.asdr = None
         self.csmr = None
         self.population = None
+        self.population_weights = None
+        self.interpolation_cache = CovariateInterpolationCache()
+        self.pull_seconds = dict()
+        self.input_store = None
         self.data = None
         self.covariates = None
         self.age_groups = None
@@ -167,49 +190,96 @@ class MeasurementInputs:
         self.measures_to_exclude = None
 
         self.dismod_data = None
+        self.location_row_index = None
         self.covariate_data = None
         self.country_covariate_data = None
         self.covariate_specs = None
         self.omega = None
 
-    def get_raw_inputs(self):
+    def __getattr__(self, name):
+        # Only called for attributes that aren't set yet, which for inputs
+        # read from an input store are the components not yet loaded.
+        store = self.__dict__.get('input_store')
+        if store is None or name not in store:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        value = store.load(name)
+        setattr(self, name, value)
+        return value
+
+    def get_raw_inputs(self, max_workers=1, retries=0, backoff=1.0):
         """
         Get the raw inputs that need to be used
-        in the modeling.
-
+        in the modeling. The pulls are independent of each other,
+        so they can be run at the same time in a bounded thread pool;
+        the inputs are the same either way.
+
+        :param max_workers: (int) how many pulls to run at once, 1 pulls
+            them in order
+        :param retries: (int) how many times to retry a failed pull
+        :param backoff: (float) seconds to wait before the first retry,
+            doubled for each retry after that
         :return:
         """
         LOG.info("Getting all raw inputs.")
-        self.asdr = ASDR(
+        pulls = dict()
+        pulls['asdr'] = ASDR(
             demographics=self.demographics,
             decomp_step=self.decomp_step,
             gbd_round_id=self.gbd_round_id
-        ).get_raw()
-        self.csmr = CSMR(
+        ).get_raw
+        pulls['csmr'] = CSMR(
             cause_id=self.csmr_cause_id,
             demographics=self.demographics,
             decomp_step=self.decomp_step,
             gbd_round_id=self.gbd_round_id,
             process_version_id=self.csmr_process_version_id
-        ).get_raw()
-        self.data = CrosswalkVersion(
+        ).get_raw
+        pulls['data'] = CrosswalkVersion(
             crosswalk_version_id=self.crosswalk_version_id,
             exclude_outliers=self.exclude_outliers,
             demographics=self.demographics,
             conn_def=self.conn_def,
             gbd_round_id=self.gbd_round_id
-        ).get_raw()
-        self.covariate_data = [CovariateData(
-            covariate_id=c,
-            demographics=self.demographics,
-            decomp_step=self.decomp_step,
-            gbd_round_id=self.gbd_round_id
-        ).get_raw() for c in self.country_covariate_id]
-        self.population = Population(
+        ).get_raw
+        covariate_pulls = [f'covariate_{c}' for c in self.country_covariate_id]
+        for name, c in zip(covariate_pulls, self.country_covariate_id):
+            pulls[name] = CovariateData(
+                covariate_id=c,
+                demographics=self.demographics,
+                decomp_step=self.decomp_step,
+                gbd_round_id=self.gbd_round_id
+            ).get_raw
+        pulls['population'] = Population(
             demographics=self.demographics,
             decomp_step=self.decomp_step,
             gbd_round_id=self.gbd_round_id
-        ).get_population()
+        ).get_population
+
+        pulled = run_pulls(pulls=pulls, max_workers=max_workers, retries=retries, backoff=backoff)
+        self.pull_seconds = {name: info.seconds for name, info in pulled.items()}
+
+        self.asdr = pulled['asdr'].result
+        self.csmr = pulled['csmr'].result
+        self.data = pulled['data'].result
+        self.covariate_data = [pulled[name].result for name in covariate_pulls]
+        self.population = pulled['population'].result
+        self.population_weights = None
+        self.interpolation_cache.clear()
+
+    def get_population_weights(self):
+        """
+        Gets the population lookup for covariate interpolation, building
+        it the first time it's needed so that the data, avgint, and reference
+        value interpolations all share it.
+
+        :return: (cascade_at.inputs.utilities.covariate_weighting.PopulationWeights)
+        """
+        if self.population_weights is None:
+            LOG.info("Building the population weights for covariate interpolation.")
+            self.population_weights = PopulationWeights(
+                population=self.population.configure_for_dismod()
+            )
+        return self.population_weights
 
     def configure_inputs_for_dismod(self, settings,
                                     mortality_year_reduction=5):
@@ -252,6 +322,7 @@ class MeasurementInputs:
 
         self.dismod_data = pd.concat([data, asdr, csmr], axis=0, sort=True)
         self.dismod_data.reset_index(drop=True, inplace=True)
+        self.location_row_index = None
 
         self.dismod_data["density"] = self.dismod_data.measure.apply(
             self.density.__getitem__)
@@ -270,6 +341,7 @@ class MeasurementInputs:
             pop_df=self.population.configure_for_dismod(),
             loc_df=self.location_dag.df
         ) for c in self.covariate_data}
+        self.interpolation_cache.clear()
 
         self.dismod_data = self.add_covariates_to_data(df=self.dismod_data)
         self.dismod_data.loc[
@@ -278,11 +350,45 @@ class MeasurementInputs:
 
         return self
 
+    def get_location_row_index(self):
+        """
+        Gets the row positions of self.dismod_data for each location ID,
+        building them the first time they're needed.
+
+        :return: (Dict[int, np.array])
+        """
+        if getattr(self, 'location_row_index', None) is None:
+            LOG.info("Indexing the dismod data rows by location.")
+            self.location_row_index = {
+                int(location_id): rows
+                for location_id, rows in self.dismod_data.groupby('location_id').indices.items()
+            }
+        return self.location_row_index
+
+    def dismod_data_for_locations(self, location_ids):
+        """
+        Gets the rows of self.dismod_data for a set of locations, in their
+        original order. Uses the location row index so that the cost
+        depends on the number of rows kept, not the size of the data.
+
+        :param location_ids: (List[int]) locations to keep
+        :return: (pd.DataFrame)
+        """
+        index = self.get_location_row_index()
+        rows = [index[location_id] for location_id in location_ids if location_id in index]
+        if not rows:
+            return self.dismod_data.iloc[0:0]
+        return self.dismod_data.iloc[np.sort(np.concatenate(rows))]
+
     def add_covariates_to_data(self, df):
         """
         Add on covariates to a data frame that has age_group_id, year_id
         or time-age upper / lower, and location_id and sex_id. Adds both
         country-level and study-level covariates.
+
+        Rows whose age and time bounds are exactly a GBD age group and a
+        single year (like the avgint grid) get their country covariate values
+        by a direct lookup, and only the other rows are population-weighted.
         :return:
         """
         cov_dict_for_interpolation = {
@@ -291,8 +397,15 @@ class MeasurementInputs:
             if c.study_country == 'country'
         }
 
+        covariate_ids = {
+            c.name: c.covariate_id
+            for c in self.covariate_specs.covariate_specs
+            if c.study_country == 'country'
+        }
+
         df = self.interpolate_country_covariate_values(
-            df=df, cov_dict=cov_dict_for_interpolation)
+            df=df, cov_dict=cov_dict_for_interpolation,
+            covariate_ids=covariate_ids)
         df = self.transform_country_covariates(df=df)
 
         df['s_sex'] = df.sex_id.map(
@@ -355,7 +468,8 @@ class MeasurementInputs:
 
         return omega
 
-    def interpolate_country_covariate_values(self, df, cov_dict):
+    def interpolate_country_covariate_values(self, df, cov_dict,
+                                             covariate_ids=None):
         """
         Interpolates the covariate values onto the data
         so that the non-standard ages and years match up to meaningful
@@ -363,12 +477,16 @@ class MeasurementInputs:
 
         :param df: (pd.DataFrame)
         :param cov_dict: (Dict)
+        :param covariate_ids: (Dict[str, int]) covariate ID for each name in
+            cov_dict, used to key the interpolation cache
         """
         LOG.info(f"Interpolating and merging the country covariates.")
         interp_df = get_interpolated_covariate_values(
             data_df=df,
             covariate_dict=cov_dict,
-            population_df=self.population.configure_for_dismod()
+            population_weights=self.get_population_weights(),
+            cache=self.interpolation_cache,
+            covariate_ids=covariate_ids
         )
         return interp_df
 
@@ -441,11 +559,6 @@ class MeasurementInputs:
                     reference_value = 0
                     max_difference = np.nan
                 else:
-                    pop_df = self.population.configure_for_dismod()
-                    pop_df = (
-                        pop_df.loc[pop_df.location_id == parent_location_id].copy()
-                    )
-
                     df_to_interp = pd.DataFrame({
                         'location_id': parent_location_id,
                         'sex_id': [sex_id],
@@ -455,7 +568,9 @@ class MeasurementInputs:
                     reference_value = get_interpolated_covariate_values(
                         data_df=df_to_interp,
                         covariate_dict={c.name: parent_df},
-                        population_df=pop_df
+                        population_weights=self.get_population_weights(),
+                        cache=self.interpolation_cache,
+                        covariate_ids={c.name: c.covariate_id}
                     )[c.name].iloc[0]
                     max_difference = np.max(
                         np.abs(all_loc_df.mean_value - reference_value)
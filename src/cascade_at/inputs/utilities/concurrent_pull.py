@@ -0,0 +1,81 @@
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter, sleep
+from types import SimpleNamespace
+
+from cascade_at.core.db import DatabaseSandboxViolation
+from cascade_at.core.log import get_loggers
+
+LOG = get_loggers(__name__)
+
+NON_RETRYABLE_ERRORS = (DatabaseSandboxViolation, ModuleNotFoundError)
+"""Errors that won't go away by trying the same call again."""
+
+
+def call_with_retries(name, function, retries=0, backoff=1.0):
+    """
+    Calls a function that pulls from the shared functions, retrying
+    with exponential backoff if it fails.
+
+    :param name: (str) name of the pull, for logging
+    :param function: (callable) function of no arguments
+    :param retries: (int) how many times to retry after the first failure
+    :param backoff: (float) seconds to wait before the first retry, doubled
+        for each retry after that
+    :return: SimpleNamespace with the result, the number of attempts,
+        and the wall time in seconds across all attempts
+    """
+    start = perf_counter()
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            result = function()
+            break
+        except NON_RETRYABLE_ERRORS:
+            raise
+        except Exception as error:
+            if attempt > retries:
+                LOG.error(f"Pulling {name} failed after {attempt} attempts.")
+                raise
+            wait = backoff * 2 ** (attempt - 1)
+            LOG.warning(f"Pulling {name} failed on attempt {attempt} with {error!r}. "
+                        f"Retrying in {wait:.1f} seconds.")
+            sleep(wait)
+
+    info = SimpleNamespace()
+    info.result = result
+    info.attempts = attempt
+    info.seconds = perf_counter() - start
+    LOG.info(f"Pulled {name} in {info.seconds:.1f} seconds ({attempt} attempt(s)).")
+    return info
+
+
+def run_pulls(pulls, max_workers=1, retries=0, backoff=1.0):
+    """
+    Runs independent pulls from the shared functions, either one after
+    another or in a bounded thread pool. The pulls are I/O-bound, so
+    threads let them wait on the databases at the same time.
+
+    :param pulls: (Dict[str, callable]) names mapped to functions of
+        no arguments
+    :param max_workers: (int) how many pulls to run at once, 1 runs them
+        in order in this thread
+    :param retries: (int) how many times to retry each pull
+    :param backoff: (float) seconds to wait before the first retry
+    :return: (Dict[str, SimpleNamespace]) the call_with_retries info for
+        each pull, in the same order as pulls
+    """
+    if max_workers <= 1:
+        return {
+            name: call_with_retries(name=name, function=function, retries=retries, backoff=backoff)
+            for name, function in pulls.items()
+        }
+
+    LOG.info(f"Running {len(pulls)} pulls with {max_workers} workers.")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            name: executor.submit(call_with_retries, name=name, function=function,
+                                  retries=retries, backoff=backoff)
+            for name, function in pulls.items()
+        }
+        return {name: future.result() for name, future in futures.items()}
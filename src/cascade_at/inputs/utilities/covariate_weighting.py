@@ -2,6 +2,7 @@ import numpy as np
 import pandas as pd
 import itertools
 from intervaltree import IntervalTree
+from scipy import sparse
 
 from cascade_at.core.log import get_loggers
 
@@ -29,6 +30,115 @@ def interval_weighting(intervals, lower, upper):
     return wts
 
 
+def overlap_weights(lower, upper, begin, end):
+    """
+    Vectorized version of ``interval_weighting`` for many windows at once.
+    Finds the intervals that each window [lower, upper) overlaps (or the
+    interval that contains the point if lower == upper), and weights
+    them the same way that ``interval_weighting`` does.
+
+    Note: begin and end must be sorted the same way that the interval tree
+    results are sorted in ``CovariateInterpolator._weighting``, that is by
+    (begin, end, id).
+
+    :param lower: (np.array) lower bounds of the windows
+    :param upper: (np.array) upper bounds of the windows
+    :param begin: (np.array) lower bounds of the intervals
+    :param end: (np.array) upper bounds of the intervals
+    :return: (scipy.sparse.csr_matrix) of shape (windows, intervals)
+    """
+    lower = np.asarray(lower, dtype=float)[:, np.newaxis]
+    upper = np.asarray(upper, dtype=float)[:, np.newaxis]
+    begin = np.asarray(begin, dtype=float)
+    end = np.asarray(end, dtype=float)
+
+    overlaps = np.where(
+        lower == upper,
+        (begin <= lower) & (lower < end),
+        (begin < upper) & (end > lower)
+    )
+    wts = overlaps.astype(float)
+
+    multiple = np.flatnonzero(overlaps.sum(axis=1) > 1)
+    if len(multiple):
+        first = overlaps[multiple].argmax(axis=1)
+        last = overlaps.shape[1] - 1 - overlaps[multiple, ::-1].argmax(axis=1)
+        width = end - begin
+        wts[multiple, first] = (end[first] - lower[multiple, 0]) / width[first]
+        wts[multiple, last] = (upper[multiple, 0] - begin[last]) / width[last]
+
+    # Build from coordinates so that explicit zero weights are kept
+    rows, cols = np.nonzero(overlaps)
+    return sparse.csr_matrix((wts[rows, cols], (rows, cols)), shape=overlaps.shape)
+
+
+def expand_epoch_weights(time_wts, time_rows, age_wts, age_rows):
+    """
+    Expands the outer product of the time and age weights for each group
+    into flat arrays, one entry per (group, year, age group) epoch. This is
+    the sparse equivalent of ``np.outer(time_wts, age_wts)`` in
+    ``CovariateInterpolator._weighting`` for all groups at once.
+
+    :param time_wts: (scipy.sparse.csr_matrix) time window weights
+    :param time_rows: (np.array) the time window row for each group
+    :param age_wts: (scipy.sparse.csr_matrix) age window weights
+    :param age_rows: (np.array) the age window row for each group
+    :return: (group, year position, age position, weight) arrays
+    """
+    t_start = time_wts.indptr[time_rows]
+    t_count = time_wts.indptr[time_rows + 1] - t_start
+    a_start = age_wts.indptr[age_rows]
+    a_count = age_wts.indptr[age_rows + 1] - a_start
+
+    n_entries = t_count * a_count
+    group = np.repeat(np.arange(len(n_entries)), n_entries)
+    offset = np.arange(n_entries.sum()) - np.repeat(np.cumsum(n_entries) - n_entries, n_entries)
+    a_per_group = np.repeat(a_count, n_entries)
+
+    t_pos = np.repeat(t_start, n_entries) + offset // a_per_group
+    a_pos = np.repeat(a_start, n_entries) + offset % a_per_group
+
+    weight = time_wts.data[t_pos] * age_wts.data[a_pos]
+    return group, time_wts.indices[t_pos], age_wts.indices[a_pos], weight
+
+
+def axis_index(axis, values):
+    """
+    Finds the position of each value in a sorted axis.
+
+    :param axis: (np.array) sorted unique values
+    :param values: (np.array) values to look up
+    :return: (positions, found) where found is False for values not on the axis
+    """
+    values = np.asarray(values)
+    positions = np.searchsorted(axis, values)
+    positions = np.clip(positions, 0, max(len(axis) - 1, 0))
+    found = (axis[positions] == values) if len(axis) else np.zeros(len(values), dtype=bool)
+    return positions, found
+
+
+def dense_cube(df, value_column, axes):
+    """
+    Lays out a value column as a dense array indexed by
+    (location, sex, year, age group), filled with NaN where
+    the data frame has no row.
+
+    :param df: (pd.DataFrame) with location_id, sex_id, year_id, age_group_id
+    :param value_column: (str) the column to put in the cube
+    :param axes: (List[np.array]) sorted unique ids for each dimension
+    :return: (np.ndarray)
+    """
+    cube = np.full(tuple(len(a) for a in axes), np.nan)
+    positions = list()
+    found = np.ones(len(df), dtype=bool)
+    for axis, column in zip(axes, ['location_id', 'sex_id', 'year_id', 'age_group_id']):
+        pos, in_axis = axis_index(axis, df[column].values)
+        positions.append(pos)
+        found &= in_axis
+    cube[tuple(p[found] for p in positions)] = df[value_column].values[found]
+    return cube
+
+
 class CovariateInterpolator:
     def __init__(self,
                  covariate,
@@ -106,8 +216,247 @@ class CovariateInterpolator:
         return cov_value
 
 
+class PopulationWeights:
+    def __init__(self, population):
+        """
+        The population lookup used to population-weight covariates. It is
+        built once and shared by all of the covariates that are interpolated,
+        and across calls on the same inputs, so that only the covariate
+        values vary per covariate.
+
+        :param population: (pd.DataFrame) with location_id, sex_id, year_id,
+            age_group_id and population
+        """
+        self.location_ids = np.unique(population.location_id.values)
+        self.sex_ids = np.unique(population.sex_id.values)
+        self.year_ids = np.unique(population.year_id.values)
+        self.age_group_ids = np.unique(population.age_group_id.values)
+        self.population_cube = dense_cube(
+            population, 'population',
+            axes=[self.location_ids, self.sex_ids, self.year_ids, self.age_group_ids]
+        )
+
+    def for_groups(self, groups):
+        """
+        Makes the weights for one set of demographic groups.
+
+        :param groups: (pd.DataFrame) with columns location_id, sex_id,
+            age_lower, age_upper, time_lower, time_upper
+        :return: (GroupWeights)
+        """
+        return GroupWeights(population_weights=self, groups=groups)
+
+
+class GroupWeights:
+    def __init__(self, population_weights, groups):
+        """
+        Population-weighted epoch weights for a set of demographic groups.
+        The weights depend on the age groups and years of the covariate, so
+        they are computed once for each set of covariate age groups and years
+        and reused for every covariate that shares them.
+
+        :param population_weights: (PopulationWeights)
+        :param groups: (pd.DataFrame) with columns location_id, sex_id,
+            age_lower, age_upper, time_lower, time_upper
+        """
+        self.population_weights = population_weights
+        self.groups = groups
+        self.location_ids = groups.location_id.values
+        self.sex_ids = groups.sex_id.values
+
+        self.age_windows, age_rows = np.unique(
+            groups[['age_lower', 'age_upper']].values.astype(float), axis=0, return_inverse=True
+        )
+        self.time_windows, time_rows = np.unique(
+            groups[['time_lower', 'time_upper']].values.astype(float), axis=0, return_inverse=True
+        )
+        self.age_rows = age_rows.ravel()
+        self.time_rows = time_rows.ravel()
+
+        self._epoch_weights = dict()
+
+    def __len__(self):
+        return len(self.groups)
+
+    def epoch_weights(self, age_begin, age_end, age_group_ids, year_ids):
+        """
+        Gets the population-weighted epoch weights for covariate age
+        intervals and years.
+
+        :param age_begin: (np.array) sorted age interval lower bounds
+        :param age_end: (np.array) age interval upper bounds
+        :param age_group_ids: (np.array) age group ID of each age interval
+        :param year_ids: (np.array) sorted unique years
+        :return: (group, year_id, age_group_id, weight) arrays with one
+            entry per (group, year, age group) epoch
+        """
+        key = (age_begin.tobytes(), age_end.tobytes(), age_group_ids.tobytes(), year_ids.tobytes())
+        if key not in self._epoch_weights:
+            self._epoch_weights[key] = self._compute_epoch_weights(
+                age_begin=age_begin, age_end=age_end,
+                age_group_ids=age_group_ids, year_ids=year_ids
+            )
+        return self._epoch_weights[key]
+
+    def _compute_epoch_weights(self, age_begin, age_end, age_group_ids, year_ids):
+        pop = self.population_weights
+        age_wts = overlap_weights(
+            lower=self.age_windows[:, 0], upper=self.age_windows[:, 1],
+            begin=age_begin, end=age_end
+        )
+        time_wts = overlap_weights(
+            lower=self.time_windows[:, 0], upper=self.time_windows[:, 1],
+            begin=year_ids, end=year_ids + 1
+        )
+        group, year_pos, age_pos, weight = expand_epoch_weights(
+            time_wts=time_wts, time_rows=self.time_rows,
+            age_wts=age_wts, age_rows=self.age_rows
+        )
+        year_id = year_ids[year_pos]
+        age_group_id = age_group_ids[age_pos]
+
+        positions = list()
+        found = np.ones(len(group), dtype=bool)
+        for axis, values in zip(
+                [pop.location_ids, pop.sex_ids, pop.year_ids, pop.age_group_ids],
+                [self.location_ids[group], self.sex_ids[group], year_id, age_group_id]):
+            pos, in_axis = axis_index(axis, values)
+            positions.append(pos)
+            found &= in_axis
+        population = np.full(len(group), np.nan)
+        population[found] = pop.population_cube[tuple(p[found] for p in positions)]
+
+        return group, year_id, age_group_id, weight * population
+
+
+class BatchCovariateInterpolator:
+    def __init__(self,
+                 covariate,
+                 population):
+        """
+        Interpolates a covariate by population weighting for many
+        demographic groups at once. Gives the same values as
+        CovariateInterpolator.interpolate, but the covariate is stored as a
+        dense cube indexed by (location, sex, year, age group), and the age
+        and time weights for all of the groups are computed as sparse matrices.
+
+        :param covariate: (pd.DataFrame)
+        :param population: (pd.DataFrame or PopulationWeights)
+        """
+        if not isinstance(population, PopulationWeights):
+            population = PopulationWeights(population=population)
+        self.population_weights = population
+
+        # Sorted the same way as the interval tree results in CovariateInterpolator
+        age_intervals = covariate[['age_lower', 'age_upper', 'age_group_id']].drop_duplicates()
+        age_intervals = age_intervals.sort_values(by=['age_lower', 'age_upper', 'age_group_id'])
+        self.age_begin = age_intervals.age_lower.values.astype(float)
+        self.age_end = age_intervals.age_upper.values.astype(float)
+        self.age_interval_ids = age_intervals.age_group_id.values
+
+        self.location_ids = np.unique(covariate.location_id.values)
+        self.sex_ids = np.unique(covariate.sex_id.values)
+        self.year_ids = np.unique(covariate.year_id.values)
+        self.age_group_ids = np.unique(self.age_interval_ids)
+
+        self.covariate_cube = dense_cube(
+            covariate, 'mean_value',
+            axes=[self.location_ids, self.sex_ids, self.year_ids, self.age_group_ids]
+        )
+
+    def standard_values(self, groups):
+        """
+        Finds the groups whose age window is exactly one of the covariate's
+        age groups and whose time window is exactly one of its years, and
+        looks up their covariate values directly. These windows only
+        overlap one (year, age group) of the covariate, so interpolating
+        them would give the covariate value back without needing any
+        population weighting.
+
+        :param groups: (pd.DataFrame) with columns location_id, sex_id,
+            age_lower, age_upper, time_lower, time_upper
+        :return: (standard, values) arrays, where standard is True for the
+            groups that match exactly and values are only filled for those
+        """
+        age_windows, age_rows = np.unique(
+            groups[['age_lower', 'age_upper']].values.astype(float), axis=0, return_inverse=True
+        )
+        age_rows = age_rows.ravel()
+        age_wts = overlap_weights(
+            lower=age_windows[:, 0], upper=age_windows[:, 1],
+            begin=self.age_begin, end=self.age_end
+        )
+        single = np.diff(age_wts.indptr) == 1
+        interval = np.zeros(len(age_windows), dtype=int)
+        interval[single] = age_wts.indices[age_wts.indptr[:-1][single]]
+        age_standard = (
+            single
+            & (self.age_begin[interval] == age_windows[:, 0])
+            & (self.age_end[interval] == age_windows[:, 1])
+        )[age_rows]
+        age_pos = np.searchsorted(self.age_group_ids, self.age_interval_ids[interval])[age_rows]
+
+        time_lower = groups.time_lower.values.astype(float)
+        year_pos, year_found = axis_index(self.year_ids, time_lower)
+        time_standard = year_found & (groups.time_upper.values.astype(float) == time_lower + 1)
+
+        loc_idx, loc_found = axis_index(self.location_ids, groups.location_id.values)
+        sex_idx, sex_found = axis_index(self.sex_ids, groups.sex_id.values)
+
+        standard = age_standard & time_standard
+        values = np.full(len(groups), np.nan)
+        lookup = standard & loc_found & sex_found
+        values[lookup] = self.covariate_cube[
+            loc_idx[lookup], sex_idx[lookup], year_pos[lookup], age_pos[lookup]
+        ]
+        return standard, values
+
+    def interpolate_groups(self, groups, group_weights=None):
+        """
+        Interpolates the covariate for every row of groups.
+
+        :param groups: (pd.DataFrame) with columns location_id, sex_id,
+            age_lower, age_upper, time_lower, time_upper
+        :param group_weights: (GroupWeights) optional weights for these
+            groups, to share with other covariates
+        :return: (np.array) one covariate value per row, NaN where the
+            covariate is missing
+        """
+        if group_weights is None:
+            group_weights = self.population_weights.for_groups(groups)
+        n_groups = len(group_weights)
+
+        loc_idx, loc_found = axis_index(self.location_ids, group_weights.location_ids)
+        sex_idx, sex_found = axis_index(self.sex_ids, group_weights.sex_ids)
+        if not loc_found.all():
+            missing = np.unique(group_weights.location_ids[~loc_found])
+            LOG.warning(f"Covariate is missing for location_ids {missing.tolist()} "
+                        f"-- setting the value to None.")
+
+        group, year_id, age_group_id, weight = group_weights.epoch_weights(
+            age_begin=self.age_begin, age_end=self.age_end,
+            age_group_ids=self.age_interval_ids, year_ids=self.year_ids
+        )
+        keep = (loc_found & sex_found)[group]
+        group, weight = group[keep], weight[keep]
+        cube_index = (
+            loc_idx[group], sex_idx[group],
+            np.searchsorted(self.year_ids, year_id[keep]),
+            np.searchsorted(self.age_group_ids, age_group_id[keep])
+        )
+        numerator = np.bincount(group, weights=weight * self.covariate_cube[cube_index], minlength=n_groups)
+        denominator = np.bincount(group, weights=weight, minlength=n_groups)
+
+        values = np.full(n_groups, np.nan)
+        has_weight = denominator != 0
+        values[has_weight] = numerator[has_weight] / denominator[has_weight]
+        return values
+
+
 def get_interpolated_covariate_values(data_df, covariate_dict,
-                                      population_df):
+                                      population_df=None, batch=True,
+                                      population_weights=None, cache=None,
+                                      covariate_ids=None):
     """
     Gets the unique age-time combinations from the data_df, and creates
     interpolated covariate values for each of these combinations by population-weighting
@@ -115,15 +464,70 @@ def get_interpolated_covariate_values(data_df, covariate_dict,
 
     :param data_df: (pd.DataFrame)
     :param covariate_dict: Dict[pd.DataFrame] with covariate names as keys
-    :param population_df: (pd.DataFrame)
+    :param population_df: (pd.DataFrame) not needed if population_weights
+        is passed
+    :param batch: (bool) interpolate all of the groups at once with
+        BatchCovariateInterpolator rather than one group at a time
+    :param population_weights: (PopulationWeights) optional precomputed
+        population lookup to share across calls, only used in batch mode
+    :param cache: (cascade_at.inputs.utilities.interpolation_cache.
+        CovariateInterpolationCache) optional cache of values that were
+        already interpolated, only used in batch mode
+    :param covariate_ids: (Dict[str, int]) optional map from covariate
+        name to the covariate ID used as the cache key
     :return: pd.DataFrame
     """
     data = data_df.copy()
+
+    group_columns = ['location_id', 'sex_id', 'age_lower', 'age_upper', 'time_lower', 'time_upper']
+    if batch:
+        valid = data[group_columns].notnull().all(axis=1).values
+        keys = data.loc[valid, group_columns]
+        inverse = keys.groupby(group_columns, sort=False).ngroup().values
+        groups = keys.drop_duplicates()
+        if covariate_ids is None:
+            covariate_ids = dict()
+        LOG.info(f"Getting covariate values for {len(groups)} data groups in batch.")
+
+        if population_weights is None:
+            population_weights = PopulationWeights(population=population_df)
+
+        # Covariates usually share the same non-standard groups, so they
+        # can share the weights for them too.
+        group_weights = dict()
+        values = dict()
+        for cov_id, raw_cov in covariate_dict.items():
+            cache_key = covariate_ids.get(cov_id, cov_id)
+            if cache is not None:
+                values[cov_id], found = cache.get_many(cache_key, groups)
+            else:
+                values[cov_id], found = np.full(len(groups), np.nan), np.zeros(len(groups), dtype=bool)
+
+            interpolator = BatchCovariateInterpolator(covariate=raw_cov, population=population_weights)
+            standard, standard_values = interpolator.standard_values(groups)
+            standard &= ~found
+            values[cov_id][standard] = standard_values[standard]
+
+            to_interpolate = ~found & ~standard
+            LOG.info(f"Covariate {cov_id}: {found.sum()} groups from the cache, {standard.sum()} "
+                     f"standard groups, interpolating {to_interpolate.sum()} groups.")
+            if to_interpolate.any():
+                subset = groups.loc[to_interpolate]
+                subset_key = to_interpolate.tobytes()
+                if subset_key not in group_weights:
+                    group_weights[subset_key] = population_weights.for_groups(subset)
+                interpolated = interpolator.interpolate_groups(subset, group_weights=group_weights[subset_key])
+                values[cov_id][to_interpolate] = interpolated
+                if cache is not None:
+                    cache.put_many(cache_key, subset, interpolated)
+
+        for cov_id, cov_values in values.items():
+            data.loc[valid, cov_id] = cov_values[inverse]
+        return data
+
     pop = population_df.copy()
 
-    data_groups = data.groupby([
-        'location_id', 'sex_id', 'age_lower', 'age_upper', 'time_lower', 'time_upper'
-    ], as_index=False)
+    data_groups = data.groupby(group_columns, as_index=False)
 
     cov_objects = {cov_name: CovariateInterpolator(covariate=raw_cov, population=pop)
                    for cov_name, raw_cov in covariate_dict.items()}
@@ -1,5 +1,5 @@
 from cascade_at.core.db import db_queries
-from cascade_at.core.db import db_tools
+from cascade_at.core.db import static_query
 
 from cascade_at.core.log import get_loggers
 
@@ -51,13 +51,14 @@ def get_sex_ids():
 def get_measure_ids(conn_def):
     """
     Gets measure IDs because the output from get_ids(table='measure') does not
-    include measure it only includes measure_name.
+    include measure it only includes measure_name. The measure table
+    doesn't change while models run, so the result is cached.
 
     :param conn_def: (str)
     :return: (df)
     """
     query = "SELECT measure_id, measure, measure_name FROM shared.measure"
-    df = db_tools.ezfuncs.query(query, conn_def=conn_def)
+    df = static_query(query, conn_def=conn_def)
     return df
 
 
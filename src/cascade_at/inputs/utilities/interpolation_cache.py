@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+
+from cascade_at.core.log import get_loggers
+
+LOG = get_loggers(__name__)
+
+WINDOW_COLUMNS = ['location_id', 'sex_id', 'age_lower', 'age_upper', 'time_lower', 'time_upper']
+
+DEFAULT_MAX_SIZE = int(1e6)
+"""
+How many interpolated values a cache keeps by default. The cache is pickled
+with the measurement inputs, so this bounds what it adds to them, about
+60 MB of windows and values.
+"""
+
+
+class CovariateInterpolationCache:
+    def __init__(self, max_size=DEFAULT_MAX_SIZE):
+        """
+        Memoizes interpolated covariate values by covariate and
+        demographic window (location, sex, age window, time window).
+        Each covariate keeps one table of unique windows, so lookups and
+        inserts are index operations over all of the groups at once
+        rather than a loop over rows. It is a plain object so it gets
+        pickled along with the measurement inputs, and jobs that read
+        the inputs can reuse values that were already interpolated.
+
+        :param max_size: (int) maximum number of values to keep, evicting
+            the least recently used values first. None keeps every value,
+            which is bounded only by the number of unique windows in the inputs.
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._tables = dict()
+        self._tick = 0
+
+    def __len__(self):
+        return sum(len(table) for table in self._tables.values())
+
+    @staticmethod
+    def _index(groups):
+        return pd.MultiIndex.from_frame(groups[WINDOW_COLUMNS].astype(float))
+
+    def get_many(self, covariate_id, groups):
+        """
+        Looks up the values for a covariate for many demographic windows.
+
+        :param covariate_id: the covariate key
+        :param groups: (pd.DataFrame) with columns location_id, sex_id,
+            age_lower, age_upper, time_lower, time_upper
+        :return: (values, found) arrays where values are NaN if not found
+        """
+        values = np.full(len(groups), np.nan)
+        found = np.zeros(len(groups), dtype=bool)
+        table = self._tables.get(covariate_id)
+        if table is not None and len(groups):
+            position = table.index.get_indexer(self._index(groups))
+            found = position >= 0
+            values[found] = table['value'].values[position[found]]
+            self._tick += 1
+            used = table['used'].values.copy()
+            used[position[found]] = self._tick
+            table['used'] = used
+        n_found = int(found.sum())
+        self.hits += n_found
+        self.misses += len(groups) - n_found
+        return values, found
+
+    def put_many(self, covariate_id, groups, values):
+        """
+        Stores the values for a covariate for many demographic windows,
+        evicting the least recently used values past max_size.
+
+        :param covariate_id: the covariate key
+        :param groups: (pd.DataFrame) with columns location_id, sex_id,
+            age_lower, age_upper, time_lower, time_upper
+        :param values: (np.array) one value per row of groups
+        """
+        self._tick += 1
+        new = pd.DataFrame({
+            'value': np.asarray(values, dtype=float),
+            'used': self._tick
+        }, index=self._index(groups))
+        table = self._tables.get(covariate_id)
+        if table is not None:
+            new = pd.concat([table, new])
+        self._tables[covariate_id] = new.loc[~new.index.duplicated(keep='last')]
+        if self.max_size is not None:
+            self._evict(len(self) - self.max_size)
+
+    def _evict(self, n_evict):
+        if n_evict <= 0:
+            return
+        LOG.debug(f"Evicting {n_evict} covariate values from the interpolation cache.")
+        keys = list(self._tables)
+        used = np.concatenate([self._tables[key]['used'].values for key in keys])
+        owner = np.repeat(np.arange(len(keys)), [len(self._tables[key]) for key in keys])
+        evict = np.zeros(len(used), dtype=bool)
+        evict[np.argsort(used, kind='stable')[:n_evict]] = True
+        for i, key in enumerate(keys):
+            keep = ~evict[owner == i]
+            self._tables[key] = self._tables[key].loc[keep]
+
+    def clear(self):
+        """
+        Drops all of the values and the counts of hits and misses, for when
+        the covariates or population change.
+        """
+        self._tables.clear()
+        self.hits = 0
+        self.misses = 0
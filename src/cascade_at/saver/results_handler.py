@@ -44,20 +44,56 @@ class ResultsHandler:
 
         Returns:
 
+        """
+        self.save_draw_chunks(chunks=[df], directory=directory)
+
+    def save_draw_chunks(self, chunks, directory):
+        """
+        Saves data frames that come a chunk at a time by location and sex
+        in .csv files, like save_draw_files, appending each chunk to the files
+        so that only one chunk is in memory at a time. The columns of the
+        first chunk are the columns of the files, so later chunks are
+        put in that order, and one with other columns is an error.
+
+        Args:
+            chunks: (Iterable[pd.DataFrame]) e.g. from
+                DismodExtractor.iter_draws_for_ihme
+            directory: (pathlib.Path)
+
+        Returns:
+
         """
         LOG.info(f"Saving results to {directory.absolute()}")
 
-        df['model_version_id'] = self.model_version_id
-        validated_df = self.validate_results(df=df)
-
-        for loc in validated_df.location_id.unique().tolist():
-            os.makedirs(directory / str(loc), exist_ok=True)
-            for sex in validated_df.sex_id.unique().tolist():
-                subset = validated_df.loc[
-                    (validated_df.location_id == loc) &
-                    (validated_df.sex_id == sex)
-                ].copy()
-                subset.to_csv(directory / str(loc) / f'{loc}_{sex}.csv')
+        written = set()
+        columns = None
+        for df in chunks:
+            df['model_version_id'] = self.model_version_id
+            validated_df = self.validate_results(df=df)
+            if columns is None:
+                columns = list(validated_df.columns)
+            elif set(validated_df.columns) != set(columns):
+                raise RuntimeError(
+                    f"A chunk of results has columns {list(validated_df.columns)} "
+                    f"rather than the columns {columns} of the earlier chunks."
+                )
+            validated_df = validated_df[columns]
+
+            for loc in validated_df.location_id.unique().tolist():
+                os.makedirs(directory / str(loc), exist_ok=True)
+                for sex in validated_df.sex_id.unique().tolist():
+                    subset = validated_df.loc[
+                        (validated_df.location_id == loc) &
+                        (validated_df.sex_id == sex)
+                    ].copy()
+                    if subset.empty and (loc, sex) in written:
+                        continue
+                    path = directory / str(loc) / f'{loc}_{sex}.csv'
+                    if (loc, sex) in written:
+                        subset.to_csv(path, mode='a', header=False)
+                    else:
+                        subset.to_csv(path)
+                        written.add((loc, sex))
 
     @staticmethod
     def upload_summaries(directory, conn_def):
@@ -277,3 +277,42 @@ def df(mi, settings):
     )
     d.fill_for_parent_child()
     return d
+
+
+@pytest.fixture
+def stub_modules():
+    """
+    Stand-ins for the shared functions that return small frames
+    so that MeasurementInputs can pull its raw inputs offline.
+    """
+    locations = pd.DataFrame({
+        'location_id': [1, 70, 72],
+        'parent_id': [1, 1, 70],
+        'location_name': ['Global', 'Canada', 'Ontario'],
+    })
+    demographics = {'age_group_id': [2, 3], 'sex_id': [1, 2], 'year_id': [1990, 1991]}
+
+    def frame(**columns):
+        return pd.DataFrame(columns)
+
+    db_queries = SimpleNamespace(
+        get_demographics=lambda gbd_team, gbd_round_id: deepcopy(demographics),
+        get_location_metadata=lambda **kwargs: locations.copy(),
+        get_age_metadata=lambda **kwargs: frame(
+            age_group_id=[2, 3], age_group_years_start=[0., 7 / 365],
+            age_group_years_end=[7 / 365, 28 / 365]),
+        get_envelope=lambda **kwargs: frame(location_id=kwargs['location_id'], mean=0.1),
+        get_outputs=lambda **kwargs: frame(location_id=kwargs['location_id'], val=0.01),
+        get_covariate_estimates=lambda covariate_id, **kwargs: frame(
+            covariate_id=covariate_id, mean_value=[0.5, 0.6]),
+        get_population=lambda **kwargs: frame(year_id=kwargs['year_id'], population=100.),
+    )
+    gbd = SimpleNamespace(constants=SimpleNamespace(
+        metrics=SimpleNamespace(RATE=3), measures=SimpleNamespace(DEATH=1)))
+    return dict(
+        db_queries=db_queries,
+        gbd=gbd,
+        decomp_step=SimpleNamespace(decomp_step_from_decomp_step_id=lambda i: f'step{i}'),
+        elmo=SimpleNamespace(get_crosswalk_version=lambda crosswalk_version_id: frame(
+            seq=[1, 2], mean=[0.1, 0.2])),
+    )
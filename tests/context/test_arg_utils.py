@@ -1,4 +1,4 @@
-from cascade_at.context.arg_utils import parse_options, parse_commands
+from cascade_at.context.arg_utils import parse_options, parse_commands, parse_timeouts, parse_fallbacks
 
 
 def test_options():
@@ -14,3 +14,12 @@ def test_commands():
     assert parse_commands(['init']) == ['init']
     assert parse_commands(['init', 'fit-fixed']) == ['init', 'fit fixed']
 
+
+def test_timeouts():
+    assert parse_timeouts(['fit-both=3600', 'init=60.5']) == {'fit both': 3600.0, 'init': 60.5}
+
+
+def test_fallbacks():
+    assert parse_fallbacks(['fit-both=fit-fixed', 'fit-both=fit-fixed-x']) == {
+        'fit both': ['fit fixed', 'fit fixed x']
+    }
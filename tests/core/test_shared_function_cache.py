@@ -0,0 +1,176 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cascade_at.core import db
+from cascade_at.core.shared_function_cache import (
+    SharedFunctionCache, call_key, normalize_arguments)
+
+
+@pytest.fixture
+def counting_db_queries():
+    calls = []
+
+    def get_population(location_id, year_id, **kwargs):
+        calls.append((location_id, year_id))
+        return pd.DataFrame({'location_id': location_id, 'year_id': year_id[0], 'population': 1., 'run_id': 101})
+
+    def get_demographics(gbd_team, gbd_round_id):
+        calls.append(gbd_team)
+        return {'year_id': [1990, 1995]}
+
+    return SimpleNamespace(get_population=get_population, get_demographics=get_demographics,
+                           get_ids=lambda table: None, calls=calls)
+
+
+@pytest.fixture
+def use_cache():
+    def use(cache):
+        db.set_shared_function_cache(cache)
+        return cache
+    yield use
+    db.set_shared_function_cache(None)
+
+
+def test_normalize_arguments():
+    assert normalize_arguments([np.int64(3), 1, 2]) == [1, 2, 3]
+    assert normalize_arguments({'b': (2, 1), 'a': None}) == {'a': None, 'b': [1, 2]}
+    assert call_key('db_queries', 'get_population', (), {'year_id': [1995, 1990]}) == \
+        call_key('db_queries', 'get_population', (), {'year_id': np.array([1990, 1995])})
+    assert call_key('db_queries', 'get_population', (), {'year_id': [1990]}) != \
+        call_key('db_queries', 'get_envelope', (), {'year_id': [1990]})
+
+
+def test_cache_hits_skip_the_function(tmp_path, counting_db_queries, use_cache):
+    cache = use_cache(SharedFunctionCache(directory=tmp_path))
+    with db.substitute_modules(db_queries=counting_db_queries):
+        first = db.db_queries.get_population(location_id=[70, 1], year_id=[1990])
+        second = db.db_queries.get_population(location_id=[1, 70], year_id=[1990])
+        demographics = db.db_queries.get_demographics(gbd_team='epi', gbd_round_id=6)
+        assert db.db_queries.get_demographics(gbd_team='epi', gbd_round_id=6) == demographics
+        db.db_queries.get_population(location_id=[70], year_id=[1990])
+
+    pd.testing.assert_frame_equal(first, second)
+    assert counting_db_queries.calls == [([70, 1], [1990]), 'epi', ([70], [1990])]
+    report = cache.report().set_index('function')
+    assert report.loc['db_queries.get_population', ['hits', 'misses']].tolist() == [1, 2]
+    assert report.loc['db_queries.get_demographics', ['hits', 'misses']].tolist() == [1, 1]
+
+
+def test_cache_survives_new_process(tmp_path, counting_db_queries, use_cache):
+    with db.substitute_modules(db_queries=counting_db_queries):
+        use_cache(SharedFunctionCache(directory=tmp_path))
+        db.db_queries.get_population(location_id=[70], year_id=[1990])
+        cache = use_cache(SharedFunctionCache(directory=tmp_path))
+        db.db_queries.get_population(location_id=[70], year_id=[1990])
+    assert len(counting_db_queries.calls) == 1
+    assert cache.hits['db_queries.get_population'] == 1
+
+
+def test_best_versions_expire(tmp_path, counting_db_queries, use_cache, monkeypatch):
+    import cascade_at.core.shared_function_cache as shared_function_cache
+    cache = use_cache(SharedFunctionCache(directory=tmp_path))
+    now = 1e9
+    monkeypatch.setattr(shared_function_cache, 'time', lambda: now)
+    with db.substitute_modules(db_queries=counting_db_queries):
+        db.db_queries.get_population(location_id=[70], year_id=[1990])
+        db.db_queries.get_demographics(gbd_team='epi', gbd_round_id=6)
+        now += 2 * 24 * 60 * 60
+        db.db_queries.get_population(location_id=[70], year_id=[1990])
+        db.db_queries.get_demographics(gbd_team='epi', gbd_round_id=6)
+    # The population may have a new best run, but the demographics don't change.
+    assert counting_db_queries.calls == [([70], [1990]), 'epi', ([70], [1990])]
+    assert cache.expirations == 1
+
+
+def test_report_shows_served_versions(tmp_path, counting_db_queries, use_cache):
+    with db.substitute_modules(db_queries=counting_db_queries):
+        use_cache(SharedFunctionCache(directory=tmp_path))
+        db.db_queries.get_population(location_id=[70], year_id=[1990])
+        cache = use_cache(SharedFunctionCache(directory=tmp_path))
+        db.db_queries.get_population(location_id=[70], year_id=[1990])
+        db.db_queries.get_demographics(gbd_team='epi', gbd_round_id=6)
+    report = cache.report().set_index('function')
+    assert report.loc['db_queries.get_population', 'versions'] == 'run_id=101'
+    assert report.loc['db_queries.get_demographics', 'versions'] == ''
+
+
+def test_clear_one_function(tmp_path, counting_db_queries, use_cache):
+    cache = use_cache(SharedFunctionCache(directory=tmp_path))
+    with db.substitute_modules(db_queries=counting_db_queries):
+        db.db_queries.get_population(location_id=[70], year_id=[1990])
+        db.db_queries.get_demographics(gbd_team='epi', gbd_round_id=6)
+        cache.clear(function='db_queries.get_population')
+        assert len(cache.entries()) == 1
+        db.db_queries.get_population(location_id=[70], year_id=[1990])
+        db.db_queries.get_demographics(gbd_team='epi', gbd_round_id=6)
+        cache.clear()
+    assert counting_db_queries.calls == [([70], [1990]), 'epi', ([70], [1990])]
+    assert not cache.entries()
+
+
+def test_cache_evicts_least_recently_used(tmp_path, counting_db_queries, use_cache):
+    cache = use_cache(SharedFunctionCache(directory=tmp_path))
+    with db.substitute_modules(db_queries=counting_db_queries):
+        db.db_queries.get_population(location_id=[1], year_id=[1990])
+        one_size = cache.size_bytes()
+        cache.max_bytes = int(2.5 * one_size)
+        for location_id in [2, 3, 4]:
+            db.db_queries.get_population(location_id=[location_id], year_id=[1990])
+    assert len(cache.entries()) == 2
+    assert cache.evictions == 2
+    assert cache.size_bytes() <= cache.max_bytes
+
+
+def test_cache_opt_out(tmp_path, counting_db_queries, use_cache):
+    cache = use_cache(SharedFunctionCache(directory=tmp_path / 'cache', enabled=False))
+    with db.substitute_modules(db_queries=counting_db_queries):
+        db.db_queries.get_demographics(gbd_team='epi', gbd_round_id=6)
+        db.db_queries.get_demographics(gbd_team='epi', gbd_round_id=6)
+    assert len(counting_db_queries.calls) == 2
+    assert not (tmp_path / 'cache').exists()
+    assert cache.report().empty
+
+
+def test_uncached_attributes_pass_through(tmp_path, counting_db_queries, use_cache):
+    cache = use_cache(SharedFunctionCache(
+        directory=tmp_path, cached_functions={'db_queries': {'get_population'}}))
+    with db.substitute_modules(db_queries=counting_db_queries):
+        assert db.db_queries.calls is counting_db_queries.calls
+        assert db.db_queries.get_ids is counting_db_queries.get_ids
+    assert not cache.entries()
+
+
+def test_measure_ids_are_cached(tmp_path, use_cache):
+    from cascade_at.inputs.utilities.gbd_ids import get_measure_ids
+    queries = []
+
+    def query(sql, conn_def):
+        queries.append(sql)
+        return pd.DataFrame({'measure_id': [5], 'measure': ['prevalence'], 'measure_name': ['Prevalence']})
+
+    def no_query(sql, conn_def):
+        raise AssertionError("The second run went to the database.")
+
+    use_cache(SharedFunctionCache(directory=tmp_path))
+    with db.substitute_modules(ezfuncs=SimpleNamespace(query=query)):
+        first = get_measure_ids(conn_def='epi')
+    # A second run in a new process finds everything in the cache
+    cache = use_cache(SharedFunctionCache(directory=tmp_path))
+    with db.substitute_modules(ezfuncs=SimpleNamespace(query=no_query)):
+        second = get_measure_ids(conn_def='epi')
+    assert len(queries) == 1
+    pd.testing.assert_frame_equal(first, second)
+    report = cache.report().set_index('function')
+    assert report.loc['db_tools.ezfuncs.static_query', ['hits', 'misses']].tolist() == [1, 0]
+
+
+def test_other_queries_are_not_cached(tmp_path, use_cache):
+    queries = []
+    use_cache(SharedFunctionCache(directory=tmp_path))
+    with db.substitute_modules(ezfuncs=SimpleNamespace(query=lambda sql, conn_def: queries.append(sql))):
+        db.ezfuncs.query("SELECT * FROM epi.model_version", conn_def='epi')
+        db.ezfuncs.query("SELECT * FROM epi.model_version", conn_def='epi')
+    assert len(queries) == 2
@@ -2,9 +2,11 @@ import numpy as np
 import pandas as pd
 import pytest
 
+from cascade_at.core.db import substitute_modules
 from cascade_at.dismod.api.fill_extract_helpers.reference_tables import (
-    construct_age_time_table, construct_integrand_table
+    construct_age_time_table, construct_integrand_table, construct_node_table
 )
+from cascade_at.inputs.locations import LocationDAG
 from cascade_at.settings.settings import load_settings
 from cascade_at.settings.base_case import BASE_CASE
 from cascade_at.inputs.measurement_inputs import MeasurementInputs
@@ -85,3 +87,17 @@ def test_construct_integrand_table_from_settings():
     unchanged = df.loc[df.integrand_name != 'prevalence']
     assert all(changed.minimum_meas_cv == 0.5)
     assert all(unchanged.minimum_meas_cv == 0.2)
+
+
+def test_construct_node_table_for_subtree(stub_modules):
+    with substitute_modules(**stub_modules):
+        dag = LocationDAG(location_set_version_id=544, gbd_round_id=6)
+    node = construct_node_table(location_dag=dag)
+    assert node.c_location_id.tolist() == [1, 70, 72]
+    assert node.parent.tolist()[1:] == [0, 1]
+
+    subtree = construct_node_table(location_dag=dag, location_ids=[70, 72])
+    assert subtree.node_id.tolist() == [0, 1]
+    assert subtree.c_location_id.tolist() == [70, 72]
+    assert np.isnan(subtree.parent.iloc[0])
+    assert subtree.parent.iloc[1] == 0
@@ -2,9 +2,11 @@ import pytest
 from pathlib import Path
 import numpy as np
 import os
+import pandas as pd
 
 from cascade_at.dismod.api.run_dismod import run_dismod
 from cascade_at.dismod.api.dismod_extractor import DismodExtractor
+from cascade_at.saver.results_handler import ResultsHandler
 
 
 def test_run_dismod_fit_predict(dismod, ihme):
@@ -55,3 +57,114 @@ def test_format_for_ihme(ihme, dismod):
     assert all(pred.age_group_id == 2)
     assert all(pred.year_id == 1990)
 
+
+
+def fill_predictions(path, n_samples=2, samples=True):
+    d = DismodExtractor(path=path)
+    d.integrand = pd.DataFrame({'integrand_name': ['Sincidence', 'prevalence'], 'minimum_meas_cv': [0.0, 0.0]})
+    d.avgint = pd.DataFrame({
+        'integrand_id': [0, 1, 0, 1, 0, 1], 'node_id': [1, 1, 2, 2, 1, 1], 'weight_id': 0, 'subgroup_id': 0,
+        'age_lower': 0.0, 'age_upper': 0.0, 'time_lower': 1990.0, 'time_upper': 1990.0,
+        'c_location_id': [70, 70, 72, 72, 70, 70], 'c_sex_id': [1, 1, 1, 1, 2, 2],
+        'c_age_group_id': 2, 'c_year_id': 1990
+    })
+    d.write_table('predict', pd.DataFrame({
+        'sample_index': np.repeat(np.arange(n_samples), 6) if samples else np.nan,
+        'avgint_id': list(range(6)) * n_samples,
+        'avg_integrand': np.arange(6 * n_samples, dtype=float)
+    }))
+    return d
+
+
+def test_get_predictions_for_one_child(tmp_path):
+    d = fill_predictions(tmp_path / 'dismod.db')
+    d.create_indexes()
+    everything = d.get_predictions()
+    child = d.get_predictions(location_id=70, sex_id=2)
+    expected = everything.loc[(everything.c_location_id == 70) & (everything.c_sex_id == 2)]
+    pd.testing.assert_frame_equal(child, expected.reset_index(drop=True))
+    assert child.avg_integrand.tolist() == [4.0, 10.0, 5.0, 11.0]
+    assert child.rate.tolist() == ['iota', 'iota', 'pini', 'pini']
+
+
+@pytest.mark.parametrize("group_by", ['sample_index', 'avgint_id'])
+def test_iter_predictions(tmp_path, group_by):
+    d = fill_predictions(tmp_path / 'dismod.db', n_samples=3)
+    chunks = list(d.iter_predictions(location_id=70, group_by=group_by, chunk_rows=4))
+    assert len(chunks) > 1
+    streamed = pd.concat(chunks).sort_values('predict_id').reset_index(drop=True)
+    expected = d.get_predictions(location_id=70).sort_values('predict_id').reset_index(drop=True)
+    pd.testing.assert_frame_equal(streamed, expected)
+
+
+def test_summarize_predictions(tmp_path):
+    d = fill_predictions(tmp_path / 'dismod.db', n_samples=5)
+    summary = d.summarize_predictions(sex_id=1, lower=0.0, upper=1.0, chunk_rows=3)
+    summary = summary.sort_values('avgint_id')
+    assert summary.avgint_id.tolist() == [0, 1, 2, 3]
+    assert summary['mean'].tolist() == [12.0, 13.0, 14.0, 15.0]
+    assert summary['lower'].tolist() == [0.0, 1.0, 2.0, 3.0]
+    assert summary['upper'].tolist() == [24.0, 25.0, 26.0, 27.0]
+
+
+def test_format_predictions_for_ihme_one_draw(tmp_path):
+    d = fill_predictions(tmp_path / 'dismod.db', n_samples=1)
+    formatted = d.format_predictions_for_ihme(chunk_rows=2)
+    assert formatted.measure_id.tolist() == [41, 41, 41, 5, 5, 5, 6, 6, 6]
+    assert formatted['mean'].tolist() == [0.0, 2.0, 4.0, 1.0, 3.0, 5.0, 0.0, 2.0, 4.0]
+    assert (formatted['mean'] == formatted['lower']).all()
+    assert (formatted['mean'] == formatted['upper']).all()
+
+
+def test_iter_draws_for_ihme(tmp_path):
+    d = fill_predictions(tmp_path / 'dismod.db', n_samples=3)
+    draws = pd.concat(d.iter_draws_for_ihme(chunk_rows=4))
+    assert list(draws.columns) == [
+        'location_id', 'age_group_id', 'year_id', 'sex_id', 'measure_id', 'draw_0', 'draw_1', 'draw_2']
+    assert len(draws) == 9
+    incidence = draws.loc[(draws.measure_id == 41) & (draws.location_id == 72)]
+    assert incidence[['draw_0', 'draw_1', 'draw_2']].values.tolist() == [[2.0, 8.0, 14.0]]
+
+
+def test_save_streamed_draws(tmp_path):
+    d = fill_predictions(tmp_path / 'dismod.db', n_samples=3)
+    rh = ResultsHandler(model_version_id=1)
+    rh.save_draw_chunks(chunks=d.iter_draws_for_ihme(chunk_rows=4), directory=tmp_path / 'draws')
+    saved = pd.concat([
+        pd.read_csv(path, index_col=0) for path in sorted((tmp_path / 'draws').glob('*/*.csv'))
+    ])
+    whole = pd.concat(d.iter_draws_for_ihme())
+    assert len(saved) == len(whole)
+    assert saved.draw_2.sum() == pytest.approx(whole.draw_2.sum())
+    assert (saved.model_version_id == 1).all()
+
+
+def test_no_draws_without_samples(tmp_path):
+    d = fill_predictions(tmp_path / 'dismod.db', n_samples=1, samples=False)
+    assert d.sample_indices() == []
+    assert list(d.iter_draws_for_ihme()) == []
+    assert len(d.format_predictions_for_ihme()) == 9
+
+
+def test_draws_have_the_same_columns_in_every_chunk(tmp_path):
+    d = fill_predictions(tmp_path / 'dismod.db', n_samples=3)
+    # The last sample is missing for the first avgint row.
+    d.write_table('predict', d.predict.loc[~((d.predict.avgint_id == 0) & (d.predict.sample_index == 2))])
+    chunks = list(d.iter_draws_for_ihme(chunk_rows=3))
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert list(chunk.columns)[-3:] == ['draw_0', 'draw_1', 'draw_2']
+    rh = ResultsHandler(model_version_id=1)
+    rh.save_draw_chunks(chunks=iter(chunks), directory=tmp_path / 'draws')
+    saved = pd.read_csv(tmp_path / 'draws' / '70' / '70_1.csv', index_col=0)
+    first = saved.loc[saved.measure_id == 41]
+    assert first[['draw_0', 'draw_1', 'draw_2']].values.tolist()[0][:2] == [0.0, 6.0]
+    assert np.isnan(first.draw_2.values[0])
+
+
+def test_save_draw_chunks_needs_the_same_columns(tmp_path):
+    d = fill_predictions(tmp_path / 'dismod.db', n_samples=3)
+    chunks = list(d.iter_draws_for_ihme(chunk_rows=3))
+    chunks[1] = chunks[1].drop(columns=['draw_1'])
+    with pytest.raises(RuntimeError):
+        ResultsHandler(model_version_id=1).save_draw_chunks(chunks=chunks, directory=tmp_path / 'draws')
@@ -3,6 +3,12 @@ import numpy as np
 from numpy import nan, inf
 import pandas as pd
 
+from cascade_at.dismod.api.dismod_filler import (
+    DismodFiller, TEMPLATE_TABLES, CHECKED_TEMPLATE_TABLES, TEMPLATE_WEIGHT_TABLES, table_fingerprint)
+from cascade_at.model.grid_alchemy import Alchemy
+from cascade_at.settings.base_case import BASE_CASE
+from cascade_at.settings.settings import load_settings
+
 
 @pytest.fixture(scope='module')
 def value_prior(df):
@@ -381,3 +387,102 @@ def test_mulcov(df, mulcov):
 
 def test_option(df, option):
     pd.testing.assert_frame_equal(df.option, option)
+
+
+def test_fill_from_template(mi, settings, tmp_path):
+    alchemy = Alchemy(settings)
+
+    def filler(path, **kwargs):
+        return DismodFiller(
+            path=path, settings_configuration=settings, measurement_inputs=mi,
+            grid_alchemy=alchemy, parent_location_id=70, sex_id=2, **kwargs
+        )
+
+    filler(tmp_path / 'template.db').fill_template()
+    direct = filler(tmp_path / 'direct.db')
+    direct.fill_for_parent_child()
+    templated = filler(tmp_path / 'templated.db', template=tmp_path / 'template.db', in_memory=True)
+    templated.fill_for_parent_child()
+
+    assert sorted(templated.template_tables) == sorted(
+        TEMPLATE_TABLES + CHECKED_TEMPLATE_TABLES + TEMPLATE_WEIGHT_TABLES)
+    assert not set(templated.template_tables) & set(templated.changed_tables)
+    for table_name in ['density', 'integrand', 'subgroup', 'age', 'time', 'weight', 'weight_grid',
+                       'covariate', 'node', 'data', 'avgint', 'prior', 'smooth', 'smooth_grid',
+                       'rate', 'option']:
+        pd.testing.assert_frame_equal(templated.read_table(table_name), direct.read_table(table_name))
+
+
+def test_fill_from_template_writes_tables_that_differ(mi, settings, tmp_path):
+    alchemy = Alchemy(settings)
+
+    def filler(path, **kwargs):
+        return DismodFiller(
+            path=path, settings_configuration=settings, measurement_inputs=mi,
+            grid_alchemy=alchemy, parent_location_id=70, sex_id=2, **kwargs
+        )
+
+    template = filler(tmp_path / 'template.db')
+    template.fill_template()
+    # As if the template were made for a parent with another age grid
+    template.age = template.age.append(pd.DataFrame({'age_id': [len(template.age)], 'age': [200.0]}))
+    template.write_fingerprints()
+    direct = filler(tmp_path / 'direct.db')
+    direct.fill_for_parent_child()
+    templated = filler(tmp_path / 'templated.db', template=tmp_path / 'template.db')
+    templated.fill_for_parent_child()
+
+    assert 'age' in templated.changed_tables
+    assert 'age' not in templated.template_tables
+    for table_name in CHECKED_TEMPLATE_TABLES + TEMPLATE_WEIGHT_TABLES + TEMPLATE_TABLES:
+        pd.testing.assert_frame_equal(templated.read_table(table_name), direct.read_table(table_name))
+
+
+def test_table_fingerprint():
+    table = pd.DataFrame({'age': [0.0, 1.0], 'age_id': [0, 1]})
+    assert table_fingerprint(table) == table_fingerprint(table[['age_id', 'age']].copy())
+    assert table_fingerprint(table) != table_fingerprint(table.assign(age=[0.0, 2.0]))
+    assert table_fingerprint(table) != table_fingerprint(table.iloc[::-1])
+    assert table_fingerprint(table) != table_fingerprint(table.astype({'age_id': float}))
+
+
+def test_refill(mi, settings, tmp_path):
+    alchemy = Alchemy(settings)
+
+    def fill(**options):
+        filler = DismodFiller(
+            path=tmp_path / 'dismod.db', settings_configuration=settings, measurement_inputs=mi,
+            grid_alchemy=alchemy, parent_location_id=70, sex_id=2, refill=True
+        )
+        filler.fill_for_parent_child(**options)
+        return filler
+
+    first = fill()
+    assert 'data' in first.changed_tables
+    second = fill()
+    assert second.changed_tables == []
+    third = fill(max_num_iter_fixed=10)
+    assert third.changed_tables == ['option']
+    assert third.option.set_index('option_name').option_value['max_num_iter_fixed'] == '10'
+
+
+def test_refill_from_template_rebuilds_template_tables(mi, settings, tmp_path):
+    alchemy = Alchemy(settings)
+
+    def filler(path, settings, **kwargs):
+        return DismodFiller(
+            path=path, settings_configuration=settings, measurement_inputs=mi,
+            grid_alchemy=alchemy, parent_location_id=70, sex_id=2, **kwargs
+        )
+
+    filler(tmp_path / 'template.db', settings).fill_template()
+    first = filler(tmp_path / 'dismod.db', settings, template=tmp_path / 'template.db', refill=True)
+    first.fill_for_parent_child()
+    assert 'integrand' in first.template_tables
+
+    changed = load_settings(dict(BASE_CASE, model=dict(BASE_CASE['model'], minimum_meas_cv=0.5)))
+    second = filler(tmp_path / 'dismod.db', changed, template=tmp_path / 'template.db', refill=True)
+    second.fill_for_parent_child()
+    assert second.template_tables == []
+    assert 'integrand' in second.changed_tables
+    assert (second.read_table('integrand').minimum_meas_cv == 0.5).all()
@@ -1,9 +1,12 @@
+import os
+import sqlite3
 import pytest
 import numpy as np
 import pandas as pd
 import sys
 
-from cascade_at.dismod.api.dismod_io import DismodIO
+from cascade_at.dismod.api.dismod_io import DismodIO, read_export
+from cascade_at.dismod.api.dismod_sqlite import DismodSQLite
 
 
 @pytest.fixture
@@ -205,3 +208,103 @@ def test_subgroup(dm, dm_read):
     }, index=[0])
     assert len(dm_read.subgroup) == 1
     assert all(dm_read.subgroup.columns == ['subgroup_id', 'subgroup_name', 'group_id', 'group_name'])
+
+
+@pytest.fixture
+def dm_cached(tmp_path):
+    return DismodIO(path=tmp_path / 'dismod.db', cache_reads=True)
+
+
+def test_read_cache_keeps_tables(dm_cached, mocker):
+    dm_cached.age = pd.DataFrame({'age': [0.0, 1.0]})
+    dm_cached.time = pd.DataFrame({'time': [1990.0, 2000.0]})
+    read = mocker.spy(DismodSQLite, 'read_table')
+    dm_cached.age
+    age = dm_cached.age
+    dm_cached.time
+    assert read.call_count == 2
+    age['age'] = -1.0
+    assert dm_cached.age.age.tolist() == [0.0, 1.0]
+
+
+def test_read_cache_invalidated_by_setter(dm_cached, mocker):
+    dm_cached.age = pd.DataFrame({'age': [0.0, 1.0]})
+    dm_cached.time = pd.DataFrame({'time': [1990.0, 2000.0]})
+    dm_cached.age
+    dm_cached.time
+    read = mocker.spy(DismodSQLite, 'read_table')
+    dm_cached.age = pd.DataFrame({'age': [5.0]})
+    assert dm_cached.age.age.tolist() == [5.0]
+    assert dm_cached.time.time.tolist() == [1990.0, 2000.0]
+    assert read.call_count == 1
+
+
+def test_read_cache_notices_external_writes(dm_cached, tmp_path):
+    dm_cached.age = pd.DataFrame({'age': [0.0, 1.0]})
+    assert len(dm_cached.age) == 2
+    other = DismodIO(path=tmp_path / 'dismod.db')
+    other.age = pd.DataFrame({'age': [0.0, 1.0, 2.0]})
+    assert len(dm_cached.age) == 3
+
+
+def test_read_cache_notices_writes_in_the_same_tick(dm_cached, tmp_path):
+    path = tmp_path / 'dismod.db'
+    dm_cached.age = pd.DataFrame({'age': [0.0, 1.0]})
+    assert dm_cached.age.age.tolist() == [0.0, 1.0]
+    before = os.stat(path)
+    # Rewrite a value in place, which keeps the size, and put the
+    # modification time back, as if it happened in the same clock tick.
+    connection = sqlite3.connect(str(path))
+    connection.execute("UPDATE age SET age = 5.0 WHERE age_id = 1")
+    connection.commit()
+    connection.close()
+    os.utime(path, ns=(before.st_atime_ns, before.st_mtime_ns))
+    assert os.stat(path).st_size == before.st_size
+    assert dm_cached.age.age.tolist() == [0.0, 5.0]
+
+
+@pytest.fixture
+def results(dm):
+    dm.write_table('var', pd.DataFrame({
+        'var_type': ['rate', 'rate'], 'smooth_id': 0, 'age_id': [0, 1], 'time_id': 0,
+        'node_id': 0, 'rate_id': 0, 'integrand_id': np.nan, 'covariate_id': np.nan,
+        'mulcov_id': np.nan
+    }))
+    dm.write_table('fit_var', pd.DataFrame({
+        'fit_var_id': [0, 1], 'fit_var_value': [0.1, 0.2], 'residual_value': 0.0,
+        'residual_dage': 0.0, 'residual_dtime': 0.0, 'lagrange_value': 0.0,
+        'lagrange_dage': 0.0, 'lagrange_dtime': 0.0
+    }))
+    return dm
+
+
+@pytest.mark.parametrize("format", ['hdf', 'feather'])
+def test_export(results, tmp_path, format):
+    if format == 'feather':
+        pytest.importorskip('pyarrow')
+    written = results.export(['fit_var', 'predict'], tmp_path / 'exported', format=format)
+    assert list(written) == ['fit_var']
+    exported = read_export(tmp_path / 'exported', 'fit_var', format=format)
+    assert exported.fit_var_value.tolist() == [0.1, 0.2]
+    assert exported.var_id.tolist() == [0, 1]
+    assert exported.age_id.tolist() == [0, 1]
+    assert exported.var_type.tolist() == ['rate', 'rate']
+
+
+def test_feather_export_is_memory_mapped(results, tmp_path):
+    pa = pytest.importorskip('pyarrow')
+    results.export(['fit_var'], tmp_path, format='feather')
+    allocated = pa.total_allocated_bytes()
+    exported = read_export(tmp_path, 'fit_var', format='feather', as_arrow=True)
+    # Compressed or copied columns would be allocated by Arrow.
+    assert pa.total_allocated_bytes() == allocated
+    assert exported.column('fit_var_value').to_pylist() == [0.1, 0.2]
+    assert exported.column('var_type').to_pylist() == ['rate', 'rate']
+    pd.testing.assert_frame_equal(
+        read_export(tmp_path, 'fit_var', format='feather'), exported.to_pandas()
+    )
+
+
+def test_export_unknown_format(results, tmp_path):
+    with pytest.raises(ValueError):
+        results.export(['fit_var'], tmp_path, format='csv')
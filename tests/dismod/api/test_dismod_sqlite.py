@@ -0,0 +1,286 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cascade_at.dismod.api.dismod_io import DismodIO
+from cascade_at.core.errors import DismodFileError
+from cascade_at.dismod.api import dismod_sqlite
+from cascade_at.dismod.api.dismod_sqlite import MAX_IN_VALUES, filter_table
+
+
+def fill(path, bulk_write, validate='full', in_memory=False):
+    dm = DismodIO(path=path, bulk_write=bulk_write, validate=validate, in_memory=in_memory)
+    dm.age = pd.DataFrame({'age': [0.0, 1.0, 5.0]})
+    dm.node = pd.DataFrame({
+        'node_name': ['Global', np.nan], 'parent': [np.nan, 0], 'c_location_id': [1, 70]
+    })
+    dm.data = pd.DataFrame({
+        'data_name': ['0', '1'], 'integrand_id': [1, 2], 'density_id': [1, 1], 'node_id': [0, 1],
+        'weight_id': [0, 0], 'subgroup_id': [0, 0], 'hold_out': [0, 1],
+        'meas_value': [0.1, np.inf], 'meas_std': [0.1, -np.inf], 'eta': [np.nan, 1e-5], 'nu': [np.nan, 5],
+        'age_lower': [0.0, 1], 'age_upper': [1.0, 2], 'time_lower': [1990.0, 1991],
+        'time_upper': [1991.0, 1992], 'x_0': [1.0, np.nan]
+    })
+    dm.option = pd.DataFrame({'option_name': ['parent_node_id'], 'option_value': ['0']})
+    dm.nslist = dm.empty_table('nslist')
+    if in_memory:
+        assert not path.exists()
+        dm.persist()
+        dm.close()
+    return list(sqlite3.connect(str(path)).iterdump())
+
+
+def test_bulk_write_matches_to_sql(tmp_path):
+    assert fill(tmp_path / 'bulk.db', bulk_write=True) == fill(tmp_path / 'to_sql.db', bulk_write=False)
+
+
+def test_bulk_write_replaces_table(tmp_path):
+    dm = DismodIO(path=tmp_path / 'dismod.db')
+    dm.age = pd.DataFrame({'age': [0.0, 1.0, 5.0]})
+    dm.age = pd.DataFrame({'age': [2.0]})
+    assert dm.age.age.tolist() == [2.0]
+
+
+def test_bulk_write_rolls_back(tmp_path):
+    dm = DismodIO(path=tmp_path / 'dismod.db')
+    dm.age = pd.DataFrame({'age': [0.0, 1.0, 5.0]})
+    with pytest.raises(sqlite3.IntegrityError):
+        dm.age = pd.DataFrame({'age_id': [0, 0], 'age': [1.0, 2.0]})
+    assert dm.age.age.tolist() == [0.0, 1.0, 5.0]
+
+
+def test_bulk_write_pragmas_only_while_building(tmp_path):
+    path = tmp_path / 'dismod.db'
+    dm = DismodIO(path=path)
+    assert dm.write_pragmas('age') == dismod_sqlite.BULK_WRITE_PRAGMAS
+    dm.age = pd.DataFrame({'age': [0.0, 1.0]})
+    assert dm.write_pragmas('time') == dismod_sqlite.BULK_WRITE_PRAGMAS
+    assert dm.write_pragmas('age') == dismod_sqlite.BULK_WRITE_PRAGMAS
+    # Another writer, like dmdismod or a later job, has results in the file.
+    assert DismodIO(path=path).write_pragmas('c_command_marker') == dict()
+    connection = sqlite3.connect(str(path))
+    connection.execute("CREATE TABLE fit_var (fit_var_id integer primary key, fit_var_value real)")
+    connection.commit()
+    connection.close()
+    assert dm.write_pragmas('age') == dict()
+    dm.age = pd.DataFrame({'age': [0.0, 2.0]})
+    assert dm.age.age.tolist() == [0.0, 2.0]
+    journal_mode = sqlite3.connect(str(path)).execute("PRAGMA journal_mode").fetchone()[0]
+    assert journal_mode == 'delete'
+
+
+@pytest.mark.parametrize("table_name", ['age', 'node', 'data', 'option', 'nslist'])
+def test_typed_read_matches_read_sql_table(tmp_path, table_name):
+    path = tmp_path / 'dismod.db'
+    fill(path, bulk_write=True)
+    typed = DismodIO(path=path).read_table(table_name)
+    reflected = DismodIO(path=path, typed_read=False).read_table(table_name)
+    pd.testing.assert_frame_equal(typed, reflected)
+
+
+def test_typed_read_conventions(tmp_path):
+    path = tmp_path / 'dismod.db'
+    fill(path, bulk_write=True)
+    dm = DismodIO(path=path)
+    node = dm.node
+    assert node.parent.dtype == np.float64
+    assert np.isnan(node.parent.iloc[0])
+    assert node.node_name.iloc[1] is None
+    data = dm.data
+    assert data.meas_value.iloc[1] == np.inf
+    assert data.meas_std.iloc[1] == -np.inf
+    assert data.integrand_id.dtype == np.int64
+    assert data.x_0.dtype == np.float64
+
+
+@pytest.mark.parametrize("nulls", [False, True])
+def test_typed_read_keeps_reals_in_integer_columns(tmp_path, nulls):
+    path = tmp_path / 'dismod.db'
+    fill(path, bulk_write=True)
+    connection = sqlite3.connect(str(path))
+    connection.execute("UPDATE data SET nu = ? WHERE data_id = 1", (None if nulls else 3,))
+    connection.execute("UPDATE data SET integrand_id = 1.5, density_id = 2.0 WHERE data_id = 0")
+    connection.commit()
+    connection.close()
+    typed = DismodIO(path=path).data
+    # read_sql_table truncates the REAL value to the declared integer type.
+    reflected = DismodIO(path=path, typed_read=False).data
+    pd.testing.assert_frame_equal(typed.drop(columns='integrand_id'), reflected.drop(columns='integrand_id'))
+    assert typed.integrand_id.dtype == np.float64
+    assert typed.integrand_id.tolist() == [1.5, 2.0]
+    assert typed.density_id.dtype == np.int64
+
+
+def test_typed_read_missing_table(tmp_path):
+    with pytest.raises(ValueError):
+        DismodIO(path=tmp_path / 'dismod.db').read_table('var')
+
+
+@pytest.mark.parametrize("typed_read", [True, False])
+@pytest.mark.parametrize("columns,where", [
+    (['data_name', 'meas_value'], None),
+    (None, {'node_id': 1}),
+    (['data_id'], {'integrand_id': [1, 2], 'hold_out': 0}),
+    (None, {'age_lower': slice(0.5, None)}),
+    (None, {'node_id': []}),
+])
+def test_read_table_pushdown(tmp_path, typed_read, columns, where):
+    path = tmp_path / 'dismod.db'
+    fill(path, bulk_write=True)
+    dm = DismodIO(path=path, typed_read=typed_read)
+    expected = filter_table(dm.data, columns=columns, where=where)
+    pushed = dm.read_table('data', columns=columns, where=where)
+    pd.testing.assert_frame_equal(pushed, expected, check_index_type=False)
+
+
+def test_read_table_long_in_list(tmp_path):
+    dm = DismodIO(path=tmp_path / 'dismod.db')
+    dm.age = pd.DataFrame({'age': np.arange(2000, dtype=float)})
+    wanted = list(range(0, 2000, 3))
+    assert len(wanted) > MAX_IN_VALUES
+    age = dm.read_table('age', columns=['age'], where={'age_id': wanted})
+    assert age.age.tolist() == [float(i) for i in wanted]
+
+
+def test_read_table_unknown_column(tmp_path):
+    path = tmp_path / 'dismod.db'
+    fill(path, bulk_write=True)
+    with pytest.raises(ValueError):
+        DismodIO(path=path).read_table('data', where={'c_location_id': 70})
+
+
+def test_create_indexes(tmp_path):
+    dm = DismodIO(path=tmp_path / 'dismod.db')
+    dm.avgint = pd.DataFrame({
+        'integrand_id': [0, 1], 'node_id': [0, 1], 'weight_id': [0, 0], 'subgroup_id': [0, 0],
+        'age_lower': [0.0, 1], 'age_upper': [0.0, 1], 'time_lower': [1990.0, 1990],
+        'time_upper': [1990.0, 1990], 'c_location_id': [1, 70]
+    })
+    dm.create_indexes()
+    dm.create_indexes()
+    indexes = {row[1] for row in sqlite3.connect(str(dm.path)).execute("PRAGMA index_list(avgint)")}
+    assert {'ix_avgint_c_location_id', 'ix_avgint_integrand_id'} <= indexes
+    assert 'ix_avgint_c_sex_id' not in indexes
+
+
+def write_sample(path, n_samples=7, n_var=5):
+    dm = DismodIO(path=path)
+    dm.write_table('sample', pd.DataFrame({
+        'sample_index': np.repeat(np.arange(n_samples), n_var),
+        'var_id': np.tile(np.arange(n_var), n_samples),
+        'var_value': np.arange(n_samples * n_var, dtype=float)
+    }))
+    return dm
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 4, 5, 100])
+def test_iter_table_chunks(tmp_path, chunk_rows):
+    dm = write_sample(tmp_path / 'dismod.db')
+    chunks = list(dm.iter_table('sample', chunk_rows=chunk_rows))
+    assert all(len(chunk) <= chunk_rows for chunk in chunks)
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), dm.sample)
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 4, 5, 12, 100])
+def test_iter_table_groups(tmp_path, chunk_rows):
+    dm = write_sample(tmp_path / 'dismod.db')
+    chunks = list(dm.iter_table('sample', chunk_rows=chunk_rows, group_by='var_id',
+                                columns=['var_value'], where={'sample_index': slice(1, None)}))
+    groups = [set(chunk.var_id) for chunk in chunks]
+    assert set.union(*groups) == set(range(5))
+    assert sum(len(g) for g in groups) == 5
+    assert all((chunk.groupby('var_id').size() == 6).all() for chunk in chunks)
+    assert list(chunks[0].columns) == ['var_value', 'var_id']
+    assert chunks[0].var_value.tolist()[:2] == [5.0, 10.0]
+
+
+def test_iter_table_stable_types(tmp_path):
+    path = tmp_path / 'dismod.db'
+    fill(path, bulk_write=True)
+    chunks = list(DismodIO(path=path).iter_table('node', chunk_rows=1))
+    assert [chunk.parent.dtype for chunk in chunks] == [np.float64, np.float64]
+    assert [chunk.node_id.dtype for chunk in chunks] == [np.int64, np.int64]
+
+
+@pytest.mark.parametrize("validate", ['schema-only', 'off'])
+def test_validation_modes_write_the_same_file(tmp_path, validate):
+    assert fill(tmp_path / 'full.db', bulk_write=True) == fill(
+        tmp_path / f'{validate}.db', bulk_write=True, validate=validate)
+
+
+@pytest.mark.parametrize("table", [
+    pd.DataFrame({'age': ['young', 'old']}),
+    pd.DataFrame({'age': [0.0, 1.0], 'other': [1, 2]}),
+])
+@pytest.mark.parametrize("validate", ['full', 'schema-only'])
+def test_validation_modes_raise(tmp_path, validate, table):
+    dm = DismodIO(path=tmp_path / 'dismod.db', validate=validate)
+    with pytest.raises((DismodFileError, ValueError)):
+        dm.age = table
+
+
+def test_schema_only_infers_object_columns(tmp_path):
+    dm = DismodIO(path=tmp_path / 'dismod.db', validate='schema-only')
+    dm.node = pd.DataFrame({
+        'node_name': ['Global', 'Canada'], 'parent': pd.Series([None, 0], dtype=object)
+    })
+    assert dm.node.parent.tolist()[1] == 0
+
+
+def test_validation_report(tmp_path):
+    path = tmp_path / 'dismod.db'
+    dm = DismodIO(path=path)
+    dm.age = pd.DataFrame({'age': [0.0, 1.0]})
+    dm.age = pd.DataFrame({'age': [0.0, 1.0]})
+    dm.time = pd.DataFrame({'time': [1990.0]})
+    report = dm.validation_report()
+    assert report.table_name.tolist() == ['age', 'time']
+    assert (report['mode'] == 'full').all()
+    assert (report.seconds > 0).all()
+    assert DismodIO(path=path, validate='off').validation_report().empty
+
+
+def test_unknown_validation_mode(tmp_path):
+    with pytest.raises(ValueError):
+        DismodIO(path=tmp_path / 'dismod.db', validate='strict')
+
+
+@pytest.fixture(params=[True, False], ids=['backup', 'dump'])
+def backup_api(request, monkeypatch):
+    if request.param and not dismod_sqlite.HAS_BACKUP_API:
+        pytest.skip("sqlite3 has no backup API before Python 3.7")
+    monkeypatch.setattr(dismod_sqlite, 'HAS_BACKUP_API', request.param)
+    return request.param
+
+
+def test_in_memory_persists_the_same_file(tmp_path, backup_api):
+    path = tmp_path / 'memory.db'
+    assert fill(tmp_path / 'direct.db', bulk_write=True) == fill(path, bulk_write=True, in_memory=True)
+
+
+def test_in_memory_loads_file(tmp_path, backup_api):
+    path = tmp_path / 'dismod.db'
+    fill(path, bulk_write=True)
+    file_data = DismodIO(path=path).data
+    with DismodIO(path=path, in_memory=True) as dm:
+        pd.testing.assert_frame_equal(dm.data, file_data)
+        dm.age = pd.DataFrame({'age': [2.0]})
+        for chunk in dm.iter_table('data', chunk_rows=1):
+            assert dm.age.age.tolist() == [2.0]
+        assert DismodIO(path=path).age.age.tolist() == [0.0, 1.0, 5.0]
+        dm.persist()
+        assert DismodIO(path=path).age.age.tolist() == [2.0]
+        assert list(tmp_path.iterdir()) == [path]
+
+
+def test_load_replaces_memory(tmp_path, backup_api):
+    path = tmp_path / 'dismod.db'
+    fill(path, bulk_write=True)
+    with DismodIO(path=path, in_memory=True) as dm:
+        dm.age = pd.DataFrame({'age': [2.0]})
+        dm.time = pd.DataFrame({'time': [1990.0]})
+        dm.load()
+        assert dm.age.age.tolist() == [0.0, 1.0, 5.0]
+        assert 'time' not in dm.table_names()
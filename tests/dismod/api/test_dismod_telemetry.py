@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+
+from cascade_at.dismod.api.dismod_io import DismodIO
+from cascade_at.dismod.api.dismod_telemetry import (
+    TELEMETRY_COLUMNS, append_telemetry, count_rows, read_telemetry, summarize_telemetry
+)
+
+
+def row(command, exit_status=0, seconds=1.0, max_rss_mb=100.0):
+    return {
+        'timestamp': '2020-01-01T00:00:00', 'host': 'node-1', 'dm_file': '/a, b/dismod.db',
+        'command': command, 'exit_status': exit_status, 'seconds': seconds, 'cpu_seconds': seconds,
+        'max_rss_mb': max_rss_mb, 'size_before_mb': 1.0, 'size_after_mb': 2.0, 'data_rows': 10, 'vars': None
+    }
+
+
+def test_append_and_summarize(tmp_path):
+    path = tmp_path / 'outputs' / 'telemetry.csv'
+    append_telemetry(path, row('init', seconds=0.5))
+    append_telemetry(path, row('fit both', seconds=100.0, max_rss_mb=900.0))
+    append_telemetry(path, row('fit fixed', seconds=50.0, max_rss_mb=1200.0))
+    append_telemetry(path, row('fit both', exit_status=1, seconds=1e5))
+
+    telemetry = read_telemetry(path)
+    assert list(telemetry.columns) == TELEMETRY_COLUMNS
+    assert len(telemetry) == 4
+    assert telemetry.dm_file.iloc[0] == '/a, b/dismod.db'
+    assert np.isnan(telemetry.vars.iloc[0])
+
+    summary = summarize_telemetry(telemetry).set_index('command')
+    assert summary.runs.to_dict() == {'fit': 2, 'init': 1}
+    assert summary.seconds['fit'] == 100.0
+    assert summary.max_rss_mb['fit'] == 1200.0
+
+
+def test_count_rows(tmp_path):
+    path = tmp_path / 'dismod.db'
+    assert count_rows(path, 'age') is None
+    DismodIO(path=path).age = pd.DataFrame({'age': [0.0, 1.0, 5.0]})
+    assert count_rows(path, 'age') == 3
+    assert count_rows(path, 'var') is None
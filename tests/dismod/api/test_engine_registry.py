@@ -0,0 +1,86 @@
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+from cascade_at.dismod.api.dismod_io import DismodIO
+from cascade_at.dismod.api.engine_registry import ENGINE_REGISTRY, EngineRegistry
+from cascade_at.dismod.api.table_metadata import Base
+
+
+@pytest.fixture
+def registry():
+    yield ENGINE_REGISTRY
+    ENGINE_REGISTRY.dispose()
+
+
+def test_files_share_an_engine(tmp_path, registry):
+    path = tmp_path / 'dismod.db'
+    first = DismodIO(path=path)
+    second = DismodIO(path=path)
+    first.age = pd.DataFrame({'age': [0.0, 1.0]})
+    assert first.engine is second.engine
+    assert second.age.age.tolist() == [0.0, 1.0]
+    assert DismodIO(path=tmp_path / 'other.db').engine is not first.engine
+
+
+def test_close_disposes_engine(tmp_path, registry):
+    path = tmp_path / 'dismod.db'
+    with DismodIO(path=path) as db:
+        db.age = pd.DataFrame({'age': [0.0, 1.0]})
+        engine = db.engine
+        assert path in registry
+    assert path not in registry
+    assert db.age.age.tolist() == [0.0, 1.0]
+    assert db.engine is not engine
+
+
+def test_replaced_file_gets_new_engine(tmp_path, registry):
+    path = tmp_path / 'dismod.db'
+    other = tmp_path / 'other.db'
+    db = DismodIO(path=path)
+    db.age = pd.DataFrame({'age': [0.0, 1.0]})
+    engine = db.engine
+    DismodIO(path=other).age = pd.DataFrame({'age': [5.0]})
+    os.remove(path)
+    shutil.copy(other, path)
+    assert db.age.age.tolist() == [5.0]
+    assert db.engine is not engine
+
+
+def test_least_recently_used_engines_are_disposed(tmp_path):
+    registry = EngineRegistry(max_engines=2)
+    first = registry.engine(tmp_path / 'first.db')
+    registry.engine(tmp_path / 'second.db')
+    assert registry.engine(tmp_path / 'first.db') is first
+    registry.engine(tmp_path / 'third.db')
+    assert len(registry) == 2
+    assert tmp_path / 'second.db' not in registry
+    registry.dispose()
+    assert len(registry) == 0
+
+
+def test_added_columns_stay_with_their_file(tmp_path, registry):
+    avgint = pd.DataFrame({
+        'integrand_id': [0], 'node_id': [0], 'weight_id': [0], 'subgroup_id': [0],
+        'age_lower': [0.0], 'age_upper': [0.0], 'time_lower': [1990.0], 'time_upper': [1990.0],
+        'c_location_id': [70], 'x_0': [1.5]
+    })
+    db = DismodIO(path=tmp_path / 'dismod.db')
+    db.avgint = avgint.copy()
+    other = DismodIO(path=tmp_path / 'other.db')
+    assert 'x_0' in db._table_definitions['avgint'].c
+    assert 'x_0' not in other._table_definitions['avgint'].c
+    assert 'x_0' not in Base.metadata.tables['avgint'].c
+    assert other._table_definitions['age'] is Base.metadata.tables['age']
+    pd.testing.assert_frame_equal(db.avgint, avgint.assign(avgint_id=0)[['avgint_id'] + list(avgint.columns)])
+
+
+def test_unpooled_engine(tmp_path, registry):
+    path = tmp_path / 'dismod.db'
+    db = DismodIO(path=path, pooled=False)
+    db.age = pd.DataFrame({'age': [0.0]})
+    assert path not in registry
+    assert db.engine is db.engine
+    db.close()
@@ -0,0 +1,344 @@
+import os
+import signal
+import stat
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import pandas as pd
+
+from cascade_at.dismod.api import run_dismod as run_dismod_module
+from cascade_at.dismod.api.dismod_io import DismodIO
+from cascade_at.dismod.api.dismod_telemetry import read_telemetry
+from cascade_at.dismod.api.command_markers import commands_to_rerun, completed_commands, sequence_key
+from cascade_at.dismod.api.run_dismod import (
+    run_dismod, run_dismod_commands, run_dismod_job, run_dismod_jobs, parse_ipopt_iteration, progress_file,
+    _Reaper
+)
+
+
+IPOPT_OUTPUT = """This is Ipopt version 3.13.2, running with linear solver mumps.
+iter    objective    inf_pr   inf_du lg(mu)  ||d||  lg(rg) alpha_du alpha_pr  ls
+   0  1.2345678e+02 1.00e+00 2.50e+01  -1.0 0.00e+00    -  0.00e+00 0.00e+00   0
+   1  9.8765432e+01 5.00e-01 1.00e+01  -1.0 4.00e-01    -  1.00e+00 1.00e+00f  1
+   2r 9.0000000e+01 1.00e-03 3.00e-02  -2.5 1.00e-01    -  9.00e-01 1.00e+00h  1
+
+Number of Iterations....: 2"""
+
+LOG_COMMANDS = """
+import sqlite3, sys, time
+connection = sqlite3.connect(sys.argv[1])
+connection.execute(
+    "CREATE TABLE IF NOT EXISTS log (log_id integer primary key, message_type text, "
+    "table_name text, row_id integer, unix_time integer, message text)"
+)
+for message in ["begin " + sys.argv[2], "end " + sys.argv[2]]:
+    connection.execute(
+        "INSERT INTO log (message_type, unix_time, message) VALUES ('command', ?, ?)",
+        (int(time.time()), message)
+    )
+connection.commit()
+"""
+
+
+@pytest.fixture
+def dmdismod(tmp_path, monkeypatch):
+    """
+    A dmdismod on the path that appends each command to a file next to
+    the database and fails on the command 'fit both' for databases
+    named bad.db and hangs on it for databases named slow.db, or polite.db,
+    which exits with 0 when it's terminated.
+    Otherwise 'fit both' writes some Ipopt iterations, or fails if there's
+    a file next to the database that ends in .fail. With LOG_COMMANDS set,
+    a command that succeeds runs it with Python to log its end.
+    """
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    script = bin_dir / 'dmdismod'
+    script.write_text(
+        '#!/bin/sh\n'
+        'db=$1\n'
+        'shift\n'
+        'echo "$@" >> "$db.commands"\n'
+        'sleep 0.2\n'
+        'case "$db:$*" in\n'
+        '  *bad.db:"fit both") echo "fit failed" >&2; exit 3;;\n'
+        '  *slow.db:"fit both") exec sleep 30;;\n'
+        '  *polite.db:"fit both") trap \'kill $!; exit 0\' TERM; sleep 30 >/dev/null 2>&1 & wait;;\n'
+        '  *:"fit both") [ -e "$db.fail" ] && exit 4; printf "%s\\n" "$IPOPT";;\n'
+        'esac\n'
+        'if [ -n "$LOG_COMMANDS" ]; then "$PYTHON" -c "$LOG_COMMANDS" "$db" "$*"; fi\n'
+        'echo "$* done"\n'
+    )
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv('IPOPT', IPOPT_OUTPUT)
+    monkeypatch.setenv('PYTHON', sys.executable)
+    monkeypatch.setenv('PATH', f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    return tmp_path
+
+
+def commands_run(path):
+    return path.with_name(path.name + '.commands').read_text().splitlines()
+
+
+def test_run_dismod_quotes(dmdismod):
+    info = run_dismod(dm_file=dmdismod / 'a.db', command="set option note 'a b'")
+    assert info.exit_status == 0
+    assert commands_run(dmdismod / 'a.db') == ['set option note a b']
+
+
+def test_run_dismod_job_stops_at_failure(dmdismod):
+    info = run_dismod_job(dm_file=dmdismod / 'bad.db', commands=['init', 'fit both', 'predict fit_var'])
+    assert info.exit_status == 3
+    assert info.failed_command == 'fit both'
+    assert len(info.processes) == 2
+    assert info.processes[1].stderr.strip() == 'fit failed'
+    assert commands_run(dmdismod / 'bad.db') == ['init', 'fit both']
+
+
+def test_run_dismod_jobs(dmdismod):
+    commands = ['init', 'fit both', 'predict fit_var']
+    names = ['a.db', 'bad.db', 'b.db', 'c.db']
+    start = time.perf_counter()
+    results = run_dismod_jobs([(dmdismod / name, commands) for name in names], max_workers=4)
+    seconds = time.perf_counter() - start
+
+    assert [r.dm_file.name for r in results] == names
+    assert [r.exit_status for r in results] == [0, 3, 0, 0]
+    for name in ['a.db', 'b.db', 'c.db']:
+        assert commands_run(dmdismod / name) == commands
+    # Three commands of 0.2 seconds each on four files, one at a time, would take 2.2 seconds.
+    assert seconds < 1.6
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_run_dismod_jobs_that_raise(dmdismod, monkeypatch, max_workers):
+    run = run_dismod_module.run_dismod
+
+    def raise_for_bad(dm_file, **kwargs):
+        if dm_file.name.startswith('bad'):
+            raise RuntimeError(f"can't run {dm_file.name}")
+        return run(dm_file=dm_file, **kwargs)
+
+    monkeypatch.setattr(run_dismod_module, 'run_dismod', raise_for_bad)
+    names = ['bad.db', 'a.db', 'bad2.db']
+    results = run_dismod_jobs([(dmdismod / name, ['init']) for name in names], max_workers=max_workers)
+
+    assert [r.dm_file.name for r in results] == names
+    assert [r.exit_status for r in results] == [1, 0, 1]
+    assert results[1].error is None
+    for result in [results[0], results[2]]:
+        assert f"can't run {result.dm_file.name}" in result.error
+    assert commands_run(dmdismod / 'a.db') == ['init']
+
+
+def test_missing_dmdismod(tmp_path, monkeypatch):
+    monkeypatch.setenv('PATH', str(tmp_path))
+    result = run_dismod_jobs([(tmp_path / 'a.db', ['init'])])[0]
+    assert result.exit_status == 127
+    assert result.failed_command == 'init'
+
+
+@pytest.mark.parametrize("line,expected", [
+    ("   1  9.8765432e+01 5.00e-01 1.00e+01  -1.0 4.00e-01    -  1.00e+00 1.00e+00f  1",
+     dict(iteration=1, restoration=False, objective=98.765432, inf_pr=0.5, inf_du=10.0)),
+    ("  12r 9.0000000e+01 1.00e-03 3.00e-02  -2.5 1.00e-01    -  9.00e-01 1.00e+00h  1",
+     dict(iteration=12, restoration=True, objective=90.0, inf_pr=1e-3, inf_du=0.03)),
+    ("iter    objective    inf_pr   inf_du lg(mu)  ||d||  lg(rg) alpha_du alpha_pr  ls", None),
+    ("Number of Iterations....: 2", None),
+    ("2020 fit_var rows", None),
+])
+def test_parse_ipopt_iteration(line, expected):
+    assert parse_ipopt_iteration(line) == expected
+
+
+def test_progress(dmdismod):
+    dm_file = dmdismod / 'a.db'
+    iterations = list()
+    info = run_dismod(dm_file=dm_file, command='fit both', progress=iterations.append, write_progress=True)
+    assert info.exit_status == 0
+    assert 'Number of Iterations....: 2' in info.stdout
+    assert [i.iteration for i in iterations] == [0, 1, 2]
+    assert [i.restoration for i in iterations] == [False, False, True]
+    assert all(i.command == 'fit both' and i.dm_file == dm_file for i in iterations)
+
+    run_dismod(dm_file=dm_file, command='fit both', write_progress=True)
+    written = pd.read_csv(progress_file(dm_file), float_precision='round_trip')
+    assert written.iteration.tolist() == [0, 1, 2, 0, 1, 2]
+    assert written.objective.tolist()[:3] == [123.45678, 98.765432, 90.0]
+
+
+def test_telemetry(dmdismod):
+    dm_file = dmdismod / 'a.db'
+    DismodIO(path=dm_file).age = pd.DataFrame({'age': [0.0, 1.0]})
+    telemetry_file = dmdismod / 'telemetry.csv'
+    results = run_dismod_jobs(
+        [(dm_file, ['init', 'fit both']), (dmdismod / 'bad.db', ['fit both'])],
+        max_workers=2, telemetry_file=telemetry_file
+    )
+    assert results[0].processes[0].seconds >= 0.2
+    assert results[0].processes[0].cpu_seconds >= 0
+    assert results[0].processes[0].max_rss_mb > 0
+
+    telemetry = read_telemetry(telemetry_file).sort_values(['dm_file', 'command'])
+    assert telemetry.command.tolist() == ['fit both', 'init', 'fit both']
+    assert telemetry.exit_status.tolist() == [0, 0, 3]
+    assert (telemetry.seconds >= 0.2).all()
+    assert (telemetry.max_rss_mb > 0).all()
+    assert (telemetry.size_after_mb.iloc[:2] == telemetry.size_before_mb.iloc[:2]).all()
+    assert telemetry.size_after_mb.iloc[2:].isna().all()
+    # Neither database has a data or var table.
+    assert telemetry.data_rows.isna().all()
+
+
+def test_timeout_falls_back(dmdismod):
+    dm_file = dmdismod / 'slow.db'
+    DismodIO(path=dm_file).age = pd.DataFrame({'age': [0.0]})
+    start = time.perf_counter()
+    info = run_dismod_job(
+        dm_file=dm_file, commands=['init', 'fit both', 'predict fit_var'],
+        timeouts={'fit both': 0.5}, fallbacks={'fit both': ['fit fixed']}
+    )
+    assert time.perf_counter() - start < 5
+    assert info.exit_status == 0
+    assert info.processes[1].timed_out
+    assert commands_run(dm_file) == ['init', 'fit both', 'fit fixed', 'predict fit_var']
+
+    db = DismodIO(path=dm_file)
+    outcome = db.command_outcome
+    assert outcome.requested.tolist() == ['init', 'fit both', 'fit both', 'predict fit_var']
+    assert outcome.outcome.tolist() == ['succeeded', 'timed_out', 'succeeded', 'succeeded']
+    assert db.fit_command() == 'fit fixed'
+
+
+def test_timeout_fails_the_job(dmdismod):
+    dm_file = dmdismod / 'polite.db'
+    info = run_dismod_job(dm_file=dm_file, commands=['init', 'fit both', 'predict fit_var'],
+                          timeouts={'fit both': 0.5})
+    assert info.processes[1].timed_out
+    assert info.processes[1].exit_status == 0
+    assert info.failed_command == 'fit both'
+    assert info.exit_status != 0
+    assert commands_run(dm_file) == ['init', 'fit both']
+
+    with pytest.raises(SystemExit) as exited:
+        run_dismod_commands(dm_file=dm_file, commands=['fit both'], timeouts={'fit both': 0.5})
+    assert exited.value.code != 0
+
+
+def test_reaper_signals_while_waiting():
+    reaper = _Reaper(subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)']))
+    waiting = threading.Thread(target=reaper.wait)
+    waiting.start()
+    time.sleep(0.2)
+    reaper.signal(signal.SIGTERM)
+    waiting.join(5)
+    assert not waiting.is_alive()
+    assert reaper.process.returncode == -signal.SIGTERM
+
+
+def test_reaper_doesnt_signal_after_reaping(monkeypatch):
+    reaper = _Reaper(subprocess.Popen([sys.executable, '-c', 'pass']))
+    reaper.wait()
+    assert reaper.process.returncode == 0
+    sent = []
+    monkeypatch.setattr(os, 'kill', lambda pid, signal_number: sent.append(pid))
+    reaper.signal(signal.SIGTERM)
+    assert sent == []
+
+
+def test_failures_fall_back(dmdismod):
+    dm_file = dmdismod / 'bad.db'
+    DismodIO(path=dm_file).age = pd.DataFrame({'age': [0.0]})
+    assert DismodIO(path=dm_file).fit_command() is None
+    info = run_dismod_job(dm_file=dm_file, commands=['fit both'], fallbacks={'fit both': ['fit both', 'fit fixed']})
+    assert info.exit_status == 0
+    assert [o['outcome'] for o in info.outcomes] == ['failed', 'failed', 'succeeded']
+
+    info = run_dismod_job(dm_file=dm_file, commands=['fit both', 'predict fit_var'],
+                          fallbacks={'fit both': ['fit both']})
+    assert info.exit_status == 3
+    assert info.failed_command == 'fit both'
+    db = DismodIO(path=dm_file)
+    assert len(db.command_outcome) == 5
+    assert db.fit_command() == 'fit fixed'
+
+
+@pytest.fixture
+def resumable(dmdismod, monkeypatch):
+    monkeypatch.setenv('LOG_COMMANDS', LOG_COMMANDS)
+    dm_file = dmdismod / 'a.db'
+    DismodIO(path=dm_file).age = pd.DataFrame({'age': [0.0, 1.0]})
+    return dm_file
+
+
+COMMANDS = ['init', 'fit fixed', 'fit both', 'predict fit_var']
+
+
+def test_resume_after_failure(resumable):
+    fail = resumable.with_name(resumable.name + '.fail')
+    fail.touch()
+    first = run_dismod_job(dm_file=resumable, commands=COMMANDS, resume=True)
+    assert first.failed_command == 'fit both'
+    assert commands_run(resumable) == ['init', 'fit fixed', 'fit both']
+
+    fail.unlink()
+    second = run_dismod_job(dm_file=resumable, commands=COMMANDS, resume=True)
+    assert second.exit_status == 0
+    assert second.skipped == ['init', 'fit fixed']
+    assert commands_run(resumable)[3:] == ['fit both', 'predict fit_var']
+
+    third = run_dismod_job(dm_file=resumable, commands=COMMANDS, resume=True)
+    assert third.skipped == COMMANDS
+    assert third.processes == []
+    assert len(commands_run(resumable)) == 5
+
+
+def test_resume_needs_unchanged_inputs(resumable):
+    run_dismod_job(dm_file=resumable, commands=COMMANDS, resume=True)
+    db = DismodIO(path=resumable)
+    assert completed_commands(db, sequence_key(COMMANDS), COMMANDS) == 4
+    # Another sequence doesn't use these markers.
+    assert completed_commands(db, sequence_key(COMMANDS[:2]), COMMANDS[:2]) == 0
+
+    db.age = pd.DataFrame({'age': [0.0, 5.0]})
+    info = run_dismod_job(dm_file=resumable, commands=COMMANDS, resume=True)
+    assert info.skipped == []
+    assert commands_run(resumable) == COMMANDS + COMMANDS
+
+
+def test_rerun_after_refill(resumable):
+    db = DismodIO(path=resumable)
+    # Nothing completed yet, so everything runs even though nothing changed.
+    assert commands_to_rerun(db, COMMANDS, changed_tables=[]) == COMMANDS
+
+    fail = resumable.with_name(resumable.name + '.fail')
+    fail.touch()
+    run_dismod_job(dm_file=resumable, commands=COMMANDS, resume=True)
+    fail.unlink()
+    assert commands_to_rerun(db, COMMANDS, changed_tables=[]) == ['fit both', 'predict fit_var']
+    run_dismod_job(dm_file=resumable, commands=COMMANDS, resume=True)
+    assert commands_to_rerun(db, COMMANDS, changed_tables=[]) == []
+
+    db.avgint = pd.DataFrame({'avgint_id': [0], 'integrand_id': [0], 'node_id': [0]})
+    assert commands_to_rerun(db, COMMANDS, changed_tables=['avgint']) == ['predict fit_var']
+    info = run_dismod_job(dm_file=resumable, commands=COMMANDS, resume=True)
+    assert info.skipped == COMMANDS[:3]
+    assert commands_run(resumable)[-1] == 'predict fit_var'
+
+    db.age = pd.DataFrame({'age': [0.0, 5.0]})
+    assert commands_to_rerun(db, COMMANDS, changed_tables=['age']) == COMMANDS
+    info = run_dismod_job(dm_file=resumable, commands=COMMANDS, resume=True)
+    assert info.skipped == []
+
+
+def test_resume_needs_logged_commands(dmdismod):
+    dm_file = dmdismod / 'a.db'
+    DismodIO(path=dm_file).age = pd.DataFrame({'age': [0.0, 1.0]})
+    run_dismod_job(dm_file=dm_file, commands=COMMANDS, resume=True)
+    info = run_dismod_job(dm_file=dm_file, commands=COMMANDS, resume=True)
+    assert info.skipped == []
+    assert commands_run(dm_file) == COMMANDS + COMMANDS
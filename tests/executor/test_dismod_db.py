@@ -0,0 +1,93 @@
+import os
+import stat
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+from cascade_at.context.model_context import Context
+from cascade_at.dismod.api.dismod_io import DismodIO
+from cascade_at.executor.configure_inputs import write_template_db
+from cascade_at.executor.dismod_db import main
+from cascade_at.settings.base_case import BASE_CASE
+
+LOG_COMMAND = """
+import sqlite3, sys, time
+connection = sqlite3.connect(sys.argv[1])
+connection.execute(
+    "CREATE TABLE IF NOT EXISTS log (log_id integer primary key, message_type text, "
+    "table_name text, row_id integer, unix_time integer, message text)"
+)
+for message in ["begin " + sys.argv[2], "end " + sys.argv[2]]:
+    connection.execute(
+        "INSERT INTO log (message_type, unix_time, message) VALUES ('command', ?, ?)",
+        (int(time.time()), message)
+    )
+connection.commit()
+"""
+
+COMMANDS = ['init', 'fit fixed', 'fit both']
+
+
+@pytest.fixture
+def dmdismod(tmp_path, monkeypatch):
+    """
+    A dmdismod on the path that appends each command to a file next to
+    the database and logs its end the way dmdismod does, but fails on
+    'fit both' if there's a file next to the database that ends in .fail.
+    """
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    script = bin_dir / 'dmdismod'
+    script.write_text(
+        '#!/bin/sh\n'
+        'db=$1\n'
+        'shift\n'
+        'echo "$@" >> "$db.commands"\n'
+        '[ "$*" = "fit both" ] && [ -e "$db.fail" ] && exit 4\n'
+        '"$PYTHON" -c "$LOG_COMMAND" "$db" "$*"\n'
+    )
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv('LOG_COMMAND', LOG_COMMAND)
+    monkeypatch.setenv('PYTHON', sys.executable)
+    monkeypatch.setenv('PATH', f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+
+
+def dismod_db_args(context, **kwargs):
+    args = dict(
+        model_version_id=context.model_version_id, parent_location_id=70, sex_id=2, options=dict(),
+        prior_parent=None, prior_sex=None, commands=COMMANDS, subtree_data=False, subtree_nodes=False,
+        index_tables=False, validate='off', in_memory=False, no_template=False, refill=False,
+        no_resume=False, timeouts=dict(), fallbacks=dict(), loglevel='info',
+        test_dir=str(context.root_directory)
+    )
+    args.update(kwargs)
+    return SimpleNamespace(**args)
+
+
+@pytest.mark.parametrize("in_memory", [False, True])
+def test_retry_skips_completed_commands(mi, settings, dmdismod, tmp_path, in_memory):
+    context = Context(model_version_id=0, make=True, configure_application=False, root_directory=tmp_path)
+    context.write_inputs(inputs=mi, settings=BASE_CASE)
+    write_template_db(context=context, settings=settings, inputs=mi)
+    assert context.template_db_file.exists()
+    dm_file = context.db_file(location_id=70, sex_id=2)
+    fail = dm_file.with_name(dm_file.name + '.fail')
+
+    def commands_run():
+        return dm_file.with_name(dm_file.name + '.commands').read_text().splitlines()
+
+    fail.touch()
+    with pytest.raises(SystemExit):
+        main(dismod_db_args(context, in_memory=in_memory))
+    assert commands_run() == COMMANDS
+    # A retry with the same arguments fills the database again, but keeps
+    # what the commands that completed wrote to it, so it skips them.
+    fail.unlink()
+    main(dismod_db_args(context, in_memory=in_memory))
+    assert commands_run() == COMMANDS + ['fit both']
+    outcomes = DismodIO(path=dm_file).command_outcome.outcome.tolist()
+    assert outcomes == ['succeeded', 'succeeded', 'failed', 'succeeded']
+
+    main(dismod_db_args(context, in_memory=in_memory, no_resume=True))
+    assert commands_run() == COMMANDS + ['fit both'] + COMMANDS
@@ -1,5 +1,11 @@
+import itertools
+
+import numpy as np
+import pandas as pd
 import pytest
 
+from cascade_at.inputs.covariate_data import CovariateData
+
 
 def test_complete_covariate_ages(covariate_data):
     df = covariate_data.complete_covariate_ages(cov_df=covariate_data.raw)
@@ -37,3 +43,45 @@ def test_all_columns(df_for_dismod, column, value):
         (df_for_dismod.age_group_id == 2) & (df_for_dismod.sex_id == 2)
     ].copy()
     assert df[column].iloc[0] == value
+
+
+@pytest.fixture
+def hierarchy():
+    loc_df = pd.DataFrame({
+        'location_id': [1, 2, 3, 4, 5, 6, 7],
+        'parent_id': [1, 1, 1, 2, 2, 3, 4],
+        'level': [0, 1, 1, 2, 2, 2, 3]
+    })
+    pop_df = pd.DataFrame(
+        list(itertools.product(loc_df.location_id, [1990, 1991], [2, 3], [1, 2])),
+        columns=['location_id', 'year_id', 'age_group_id', 'sex_id']
+    )
+    pop_df['population'] = np.arange(len(pop_df)) + 100.
+    # Location 6 is missing population for one of the years
+    pop_df = pop_df.loc[~((pop_df.location_id == 6) & (pop_df.year_id == 1991))]
+    cov_df = pop_df.loc[pop_df.location_id.isin([4, 5, 6]),
+                        ['location_id', 'year_id', 'age_group_id', 'sex_id']].copy()
+    cov_df['mean_value'] = np.linspace(0.1, 0.9, len(cov_df))
+    return cov_df, pop_df, loc_df
+
+
+def test_complete_covariate_locations_matches_merge(hierarchy):
+    cov_df, pop_df, loc_df = hierarchy
+    kwargs = dict(cov_df=cov_df, pop_df=pop_df, loc_df=loc_df, locations=loc_df.location_id.tolist())
+    arrays = CovariateData.complete_covariate_locations(**kwargs)
+    merges = CovariateData.complete_covariate_locations_by_merge(**kwargs)
+    assert set(arrays.location_id) == {1, 2, 3, 4, 5, 6}
+    # Appending the parents makes the merge's id columns floats on pandas 0.25.
+    pd.testing.assert_frame_equal(arrays.reset_index(drop=True), merges.reset_index(drop=True), check_dtype=False)
+
+
+def test_complete_covariate_locations_weighting(hierarchy):
+    cov_df, pop_df, loc_df = hierarchy
+    df = CovariateData.complete_covariate_locations(
+        cov_df=cov_df, pop_df=pop_df, loc_df=loc_df, locations=loc_df.location_id.tolist())
+    key = ['location_id', 'year_id', 'age_group_id', 'sex_id']
+    pop = pop_df.set_index(key).population
+    cov = cov_df.set_index(key).mean_value
+    expected = sum(cov[(c, 1990, 2, 1)] * pop[(c, 1990, 2, 1)] for c in [4, 5]) / pop[(2, 1990, 2, 1)]
+    value = df.set_index(key).mean_value[(2, 1990, 2, 1)]
+    assert np.isclose(value, expected)
@@ -0,0 +1,81 @@
+import pandas as pd
+import pytest
+
+from cascade_at.core.db import substitute_modules
+from cascade_at.inputs.input_store import InputStore
+from cascade_at.inputs.locations import LocationDAG
+from cascade_at.inputs.measurement_inputs import MeasurementInputsFromSettings
+from cascade_at.settings.base_case import BASE_CASE
+from cascade_at.settings.settings import load_settings
+
+
+@pytest.fixture
+def raw_inputs(stub_modules):
+    with substitute_modules(**stub_modules):
+        inputs = MeasurementInputsFromSettings(settings=load_settings(BASE_CASE))
+        inputs.get_raw_inputs()
+    inputs.dismod_data = pd.DataFrame({
+        'location_id': [70, 72], 'meas_value': [0.1, 0.2], 'measure': ['mtall', 'Tincidence']
+    })
+    inputs.country_covariate_data = {28: pd.DataFrame({'location_id': [70], 'mean_value': [0.5]})}
+    inputs.data_eta = {'mtall': 1e-5, 'Tincidence': 1e-5}
+    return inputs
+
+
+def test_store_round_trip(raw_inputs, tmp_path):
+    store = InputStore(tmp_path / 'store')
+    store.write(raw_inputs)
+    kinds = {name: c['kind'] for name, c in store.components.items()}
+    assert kinds['model_version_id'] == 'value'
+    assert kinds['data_eta'] == 'value'
+    assert kinds['dismod_data'] == 'frame'
+    assert kinds['country_covariate_data'] == 'frames'
+    assert kinds['location_dag'] == 'object'
+    assert kinds['covariate_data'] == 'object'
+
+    inputs = InputStore(tmp_path / 'store').read()
+    assert type(inputs) is type(raw_inputs)
+    assert inputs.model_version_id == raw_inputs.model_version_id
+    pd.testing.assert_frame_equal(inputs.dismod_data, raw_inputs.dismod_data)
+    assert list(inputs.country_covariate_data) == [28]
+    pd.testing.assert_frame_equal(inputs.country_covariate_data[28], raw_inputs.country_covariate_data[28])
+    assert isinstance(inputs.location_dag, LocationDAG)
+    pd.testing.assert_frame_equal(inputs.location_dag.df, raw_inputs.location_dag.df)
+    assert set(inputs.location_dag.dag.nodes) == set(raw_inputs.location_dag.dag.nodes)
+    assert inputs.location_dag.parent_children(70) == [70, 72]
+    for read, written in zip(inputs.covariate_data, raw_inputs.covariate_data):
+        assert read.covariate_id == written.covariate_id
+        pd.testing.assert_frame_equal(read.raw, written.raw)
+    pd.testing.assert_frame_equal(inputs.csmr.raw, raw_inputs.csmr.raw)
+    assert inputs.omega is None
+
+
+def test_store_loads_only_what_is_accessed(raw_inputs, tmp_path):
+    store = InputStore(tmp_path / 'store')
+    store.write(raw_inputs)
+    inputs = store.read()
+    assert 'population' not in vars(inputs)
+    assert 'dismod_data' not in vars(inputs)
+    inputs.dismod_data
+    assert 'dismod_data' in vars(inputs)
+    assert 'population' not in vars(inputs)
+    with pytest.raises(AttributeError):
+        inputs.not_a_component
+
+
+def test_store_rewrites_lazy_inputs(raw_inputs, tmp_path):
+    store = InputStore(tmp_path / 'store')
+    store.write(raw_inputs)
+    inputs = store.read()
+    inputs.dismod_data = inputs.dismod_data.iloc[:1]
+    store.write(inputs)
+    reread = InputStore(tmp_path / 'store').read()
+    assert len(reread.dismod_data) == 1
+    pd.testing.assert_frame_equal(reread.population.raw, raw_inputs.population.raw)
+
+
+def test_context_reads_store(raw_inputs, context):
+    context.write_inputs(inputs=raw_inputs, settings=BASE_CASE)
+    assert (context.input_store_dir / 'manifest.json').exists()
+    inputs = InputStore(context.input_store_dir).read()
+    pd.testing.assert_frame_equal(inputs.dismod_data, raw_inputs.dismod_data)
@@ -1,8 +1,10 @@
 import pytest
 import numpy as np
+import pandas as pd
 from copy import deepcopy
 from random import choice, sample, randint
 
+from cascade_at.core.db import substitute_modules
 from cascade_at.settings.base_case import BASE_CASE
 from cascade_at.settings.settings import load_settings
 from cascade_at.inputs.measurement_inputs import (
@@ -153,3 +155,36 @@ def test_no_drill(ihme):
     # to the entire hierarchy
     assert len(mi.demographics.location_id) == num_descendants + 1
     assert len(mi.demographics.mortality_rate_location_id) == num_descendants + 1
+
+
+def test_concurrent_raw_inputs_match_sequential(stub_modules):
+    settings = BASE_CASE.copy()
+    settings['country_covariate'] = settings['country_covariate'] + [
+        dict(settings['country_covariate'][0], country_covariate_id=33)]
+    with substitute_modules(**stub_modules):
+        sequential = MeasurementInputsFromSettings(settings=load_settings(settings))
+        sequential.get_raw_inputs()
+        concurrent = MeasurementInputsFromSettings(settings=load_settings(settings))
+        concurrent.get_raw_inputs(max_workers=4, retries=1, backoff=0.0)
+
+    for name in ['asdr', 'csmr', 'data', 'population']:
+        pd.testing.assert_frame_equal(
+            getattr(concurrent, name).raw, getattr(sequential, name).raw)
+    assert [c.covariate_id for c in concurrent.covariate_data] == [28, 33]
+    for c, s in zip(concurrent.covariate_data, sequential.covariate_data):
+        pd.testing.assert_frame_equal(c.raw, s.raw)
+    assert set(concurrent.pull_seconds) == {
+        'asdr', 'csmr', 'data', 'covariate_28', 'covariate_33', 'population'}
+
+
+def test_dismod_data_for_locations(stub_modules):
+    with substitute_modules(**stub_modules):
+        inputs = MeasurementInputsFromSettings(settings=load_settings(BASE_CASE))
+    inputs.dismod_data = pd.DataFrame({
+        'location_id': [72., 1., 70., 72., 70.],
+        'meas_value': [0.1, 0.2, 0.3, 0.4, 0.5]
+    })
+    subset = inputs.dismod_data_for_locations([70, 72, 555])
+    pd.testing.assert_frame_equal(subset, inputs.dismod_data.iloc[[0, 2, 3, 4]])
+    assert set(inputs.location_row_index) == {1, 70, 72}
+    assert inputs.dismod_data_for_locations([555]).empty
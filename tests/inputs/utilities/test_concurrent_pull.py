@@ -0,0 +1,47 @@
+import pytest
+
+from cascade_at.core.db import DatabaseSandboxViolation
+from cascade_at.inputs.utilities.concurrent_pull import call_with_retries, run_pulls
+
+
+class Flaky:
+    def __init__(self, failures, error=IOError):
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error("database went away")
+        return self.calls
+
+
+def test_call_with_retries_succeeds_after_failures():
+    pull = Flaky(failures=2)
+    info = call_with_retries(name='flaky', function=pull, retries=2, backoff=0.0)
+    assert info.result == 3
+    assert info.attempts == 3
+    assert info.seconds >= 0
+
+
+def test_call_with_retries_gives_up():
+    pull = Flaky(failures=3)
+    with pytest.raises(IOError):
+        call_with_retries(name='flaky', function=pull, retries=1, backoff=0.0)
+    assert pull.calls == 2
+
+
+def test_call_with_retries_does_not_retry_sandbox():
+    pull = Flaky(failures=1, error=DatabaseSandboxViolation)
+    with pytest.raises(DatabaseSandboxViolation):
+        call_with_retries(name='blocked', function=pull, retries=3, backoff=0.0)
+    assert pull.calls == 1
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_run_pulls_keeps_order(max_workers):
+    pulls = {f'pull_{i}': (lambda i=i: i * i) for i in range(10)}
+    pulled = run_pulls(pulls=pulls, max_workers=max_workers)
+    assert list(pulled) == list(pulls)
+    assert [info.result for info in pulled.values()] == [i * i for i in range(10)]
@@ -2,7 +2,10 @@ import pytest
 import numpy as np
 import pandas as pd
 
-from cascade_at.inputs.utilities.covariate_weighting import CovariateInterpolator
+from cascade_at.inputs.utilities.covariate_weighting import (
+    CovariateInterpolator, BatchCovariateInterpolator, get_interpolated_covariate_values,
+    interval_weighting, overlap_weights, PopulationWeights
+)
 
 
 @pytest.fixture
@@ -215,3 +218,126 @@ def test_covariate_interpolation_over_age_and_time(covariate_interpolator, y0, y
             float(data.time_upper)),
         weighted_cov, atol=1e-10, rtol=1e-10
     )
+
+
+@pytest.mark.parametrize("lower,upper", [
+    (87., 100.),
+    (90., 95.),
+    (90., 96.),
+    (80., 100.),
+    (90., 90.),
+    (91., 91.1)
+])
+def test_overlap_weights_match_interval_weighting(lower, upper):
+    intervals = ((85., 90., 31), (90., 95., 32), (95., 125., 235))
+    wts = overlap_weights(
+        lower=np.array([lower]), upper=np.array([upper]),
+        begin=np.array([i[0] for i in intervals]),
+        end=np.array([i[1] for i in intervals])
+    )
+    if lower == upper:
+        overlapping = tuple(i for i in intervals if i[0] <= lower < i[1])
+    else:
+        overlapping = tuple(i for i in intervals if i[0] < upper and i[1] > lower)
+    assert np.allclose(wts.data, interval_weighting(overlapping, lower, upper))
+
+
+@pytest.fixture
+def two_location_cov_pop(test_cov, test_pop):
+    cov = test_cov.copy()
+    pop = test_pop.copy()
+    cov_2 = cov.copy()
+    cov_2['location_id'] = 101
+    cov_2['mean_value'] = cov_2['mean_value'] * 2
+    pop_2 = pop.copy()
+    pop_2['location_id'] = 101
+    pop_2['population'] = pop_2['population'][::-1].values
+    return pd.concat([cov, cov_2]), pd.concat([pop, pop_2])
+
+
+@pytest.fixture
+def many_groups():
+    rows = list()
+    for location_id in [100, 101]:
+        for a0, a1 in [(87, 100), (90, 95), (90, 96), (80, 100), (85., 85.1), (95., 95.)]:
+            for y0, y1 in [(2010.0, 2011.0), (2010.0, 2011.5), (2010.1, 2011.5), (2011.0, 2011.)]:
+                rows.append(dict(location_id=location_id, sex_id=1, age_lower=a0, age_upper=a1,
+                                 time_lower=y0, time_upper=y1))
+    return pd.DataFrame(rows)
+
+
+def test_batch_interpolator_matches_per_group(two_location_cov_pop, many_groups):
+    cov, pop = two_location_cov_pop
+    per_group = CovariateInterpolator(covariate=cov, population=pop)
+    batch = BatchCovariateInterpolator(covariate=cov, population=pop).interpolate_groups(many_groups)
+    expected = [per_group.interpolate(
+        loc_id=r.location_id, sex_id=r.sex_id, age_lower=r.age_lower, age_upper=r.age_upper,
+        time_lower=r.time_lower, time_upper=r.time_upper
+    ) for r in many_groups.itertuples()]
+    assert np.allclose(batch, expected, atol=1e-14, rtol=1e-14)
+
+
+def test_batch_interpolator_missing_location(test_cov, test_pop, test_data):
+    data = test_data.copy()
+    data['location_id'] = 102
+    value = BatchCovariateInterpolator(covariate=test_cov, population=test_pop).interpolate_groups(data)
+    assert np.isnan(value).all()
+
+
+def test_get_interpolated_covariate_values_batch(two_location_cov_pop, many_groups):
+    cov, pop = two_location_cov_pop
+    data = pd.concat([many_groups, many_groups.iloc[::-1]]).reset_index(drop=True)
+    covariates = {'c_one': cov, 'c_two': cov.assign(mean_value=cov.mean_value ** 2)}
+    batch = get_interpolated_covariate_values(
+        data_df=data, covariate_dict=covariates, population_df=pop, batch=True)
+    per_group = get_interpolated_covariate_values(
+        data_df=data, covariate_dict=covariates, population_df=pop, batch=False)
+    for name in covariates:
+        assert np.allclose(batch[name].values, per_group[name].values.astype(float),
+                           atol=1e-14, rtol=1e-14)
+
+
+def test_population_weights_shared_across_covariates(two_location_cov_pop, many_groups):
+    cov, pop = two_location_cov_pop
+    population_weights = PopulationWeights(population=pop)
+    group_weights = population_weights.for_groups(many_groups)
+    for cov_df in [cov, cov.assign(mean_value=cov.mean_value ** 2)]:
+        shared = BatchCovariateInterpolator(
+            covariate=cov_df, population=population_weights
+        ).interpolate_groups(many_groups, group_weights=group_weights)
+        own = BatchCovariateInterpolator(covariate=cov_df, population=pop).interpolate_groups(many_groups)
+        assert np.allclose(shared, own, atol=1e-14, rtol=1e-14)
+    # Both covariates have the same ages and years so the weights are only computed once
+    assert len(group_weights._epoch_weights) == 1
+
+
+def test_standard_values_match_interpolation(two_location_cov_pop):
+    cov, pop = two_location_cov_pop
+    groups = pd.DataFrame({
+        'location_id': [100, 101, 100, 100, 100],
+        'sex_id': 1,
+        'age_lower': [85., 90., 95., 85., 90.],
+        'age_upper': [90., 95., 125., 95., 95.],
+        'time_lower': [2010., 2011., 2011., 2010., 2010.5],
+        'time_upper': [2011., 2012., 2012., 2011., 2011.5]
+    })
+    interpolator = BatchCovariateInterpolator(covariate=cov, population=pop)
+    standard, values = interpolator.standard_values(groups)
+    assert (standard == [True, True, True, False, False]).all()
+    interpolated = interpolator.interpolate_groups(groups)
+    assert np.allclose(values[standard], interpolated[standard], atol=1e-14, rtol=1e-14)
+    assert np.allclose(values[standard], [0.1, 0.8, 0.5])
+
+
+def test_get_interpolated_covariate_values_standard_and_not(two_location_cov_pop, many_groups):
+    cov, pop = two_location_cov_pop
+    standard = pd.DataFrame({
+        'location_id': 100, 'sex_id': 1, 'age_lower': [85., 90.], 'age_upper': [90., 95.],
+        'time_lower': [2010., 2011.], 'time_upper': [2011., 2012.]
+    })
+    data = pd.concat([standard, many_groups]).reset_index(drop=True)
+    batch = get_interpolated_covariate_values(
+        data_df=data, covariate_dict={'c_one': cov}, population_df=pop, batch=True)
+    per_group = get_interpolated_covariate_values(
+        data_df=data, covariate_dict={'c_one': cov}, population_df=pop, batch=False)
+    assert np.allclose(batch.c_one.values, per_group.c_one.values.astype(float), atol=1e-14, rtol=1e-14)
@@ -0,0 +1,107 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cascade_at.inputs.utilities.covariate_weighting import get_interpolated_covariate_values
+from cascade_at.inputs.utilities.interpolation_cache import (
+    DEFAULT_MAX_SIZE, CovariateInterpolationCache)
+
+
+@pytest.fixture
+def groups():
+    return pd.DataFrame({
+        'location_id': [100, 100, 101],
+        'sex_id': [1, 2, 1],
+        'age_lower': [0., 5., 10.],
+        'age_upper': [5., 10., 15.],
+        'time_lower': [2000., 2000., 2001.],
+        'time_upper': [2001., 2001., 2002.]
+    })
+
+
+def test_get_put(groups):
+    cache = CovariateInterpolationCache()
+    values, found = cache.get_many(1, groups)
+    assert not found.any()
+    cache.put_many(1, groups, np.array([0.1, 0.2, 0.3]))
+    values, found = cache.get_many(1, groups)
+    assert found.all()
+    assert np.allclose(values, [0.1, 0.2, 0.3])
+    values, found = cache.get_many(2, groups)
+    assert not found.any()
+    assert cache.hits == 3
+    assert cache.misses == 6
+
+
+def test_lru_eviction(groups):
+    cache = CovariateInterpolationCache(max_size=2)
+    cache.put_many(1, groups.iloc[:2], np.array([0.1, 0.2]))
+    # Touch the first one so that the second one is the least recently used
+    cache.get_many(1, groups.iloc[:1])
+    cache.put_many(1, groups.iloc[2:], np.array([0.3]))
+    assert len(cache) == 2
+    values, found = cache.get_many(1, groups)
+    assert (found == [True, False, True]).all()
+
+
+def test_pickle(groups):
+    cache = CovariateInterpolationCache()
+    cache.put_many(1, groups, np.array([0.1, 0.2, 0.3]))
+    loaded = pickle.loads(pickle.dumps(cache))
+    values, found = loaded.get_many(1, groups)
+    assert found.all()
+    assert np.allclose(values, [0.1, 0.2, 0.3])
+
+
+def test_interpolation_uses_cache(groups):
+    cov = pd.DataFrame({
+        'location_id': 100, 'sex_id': [1, 1, 2, 2], 'year_id': 2000,
+        'age_group_id': [1, 2, 1, 2], 'age_lower': [0., 5., 0., 5.],
+        'age_upper': [5., 10., 5., 10.], 'mean_value': [0.1, 0.2, 0.3, 0.4]
+    })
+    pop = cov.rename(columns={'mean_value': 'population'})
+    data = groups.iloc[:2].copy()
+    data['time_upper'] = 2000.
+
+    cache = CovariateInterpolationCache()
+    first = get_interpolated_covariate_values(
+        data_df=data, covariate_dict={'c_cov': cov}, population_df=pop,
+        cache=cache, covariate_ids={'c_cov': 5})
+    assert cache.misses == 2
+    # A different covariate frame with the same ID gets the values from the cache
+    second = get_interpolated_covariate_values(
+        data_df=data, covariate_dict={'c_cov': cov.assign(mean_value=0.)}, population_df=pop,
+        cache=cache, covariate_ids={'c_cov': 5})
+    assert cache.hits == 2
+    assert np.allclose(first.c_cov, [0.1, 0.4])
+    assert np.allclose(second.c_cov, first.c_cov)
+
+
+def test_bounded_by_default(groups):
+    assert CovariateInterpolationCache().max_size == DEFAULT_MAX_SIZE
+
+
+def test_clear_resets_counts(groups):
+    cache = CovariateInterpolationCache()
+    cache.put_many(1, groups, np.array([0.1, 0.2, 0.3]))
+    cache.get_many(1, groups)
+    cache.get_many(2, groups)
+    cache.clear()
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (0, 0)
+
+
+def test_unbounded(groups):
+    cache = CovariateInterpolationCache(max_size=None)
+    many = pd.concat([groups.assign(location_id=i) for i in range(1000)], ignore_index=True)
+    cache.put_many(1, many, np.arange(len(many), dtype=float))
+    cache.put_many(2, many, np.arange(len(many), dtype=float))
+    assert len(cache) == 2 * len(many)
+    # Storing the same windows again replaces them rather than adding rows
+    cache.put_many(1, many.iloc[::-1], np.zeros(len(many)))
+    assert len(cache) == 2 * len(many)
+    values, found = cache.get_many(1, many)
+    assert found.all()
+    assert np.allclose(values, 0.)
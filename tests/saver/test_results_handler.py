@@ -0,0 +1,24 @@
+import pandas as pd
+
+from cascade_at.saver.results_handler import ResultsHandler
+
+
+def draws(location_id, sex_id, values):
+    return pd.DataFrame({
+        'location_id': location_id, 'sex_id': sex_id, 'age_group_id': 2, 'year_id': 1990,
+        'measure_id': 41, 'draw_0': values
+    })
+
+
+def test_save_draw_chunks_matches_save_draw_files(tmp_path):
+    chunks = [draws(70, 1, [0.1, 0.2]), draws(72, 2, [0.3]), draws(70, 1, [0.4])]
+    rh = ResultsHandler(model_version_id=1)
+    rh.save_draw_chunks(chunks=[c.copy() for c in chunks], directory=tmp_path / 'chunks')
+    rh.save_draw_files(df=pd.concat(chunks, ignore_index=True), directory=tmp_path / 'whole')
+
+    for loc, sex in [(70, 1), (72, 2)]:
+        name = f'{loc}/{loc}_{sex}.csv'
+        chunked = pd.read_csv(tmp_path / 'chunks' / name, index_col=0)
+        whole = pd.read_csv(tmp_path / 'whole' / name, index_col=0)
+        pd.testing.assert_frame_equal(chunked.reset_index(drop=True), whole.reset_index(drop=True))
+    assert pd.read_csv(tmp_path / 'chunks' / '70' / '70_1.csv').draw_0.tolist() == [0.1, 0.2, 0.4]